@@ -1,41 +1,63 @@
 
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, session, flash, jsonify, abort, send_from_directory, \
+    Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-from flask_migrate import Migrate
-from authlib.integrations.flask_client import OAuth
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
 import os
 from werkzeug.utils import secure_filename
-import shutil
+import tempfile
+import csv
+import io
+import queue
+import gzip
+import json
+import mimetypes
+import subprocess
+import sys
 import uuid # Importación de módulos necesarios para la aplicación Flask
+import re
+import time
+import hashlib
+import importlib
+import threading
+import unicodedata
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
-from datetime import datetime
+from urllib.parse import quote, unquote
+from datetime import datetime, date, timedelta
 from dotenv import load_dotenv
+from markupsafe import Markup, escape
+from PIL import Image, ImageOps
+import click
+import datos_iniciales
 
-# Creación de la instancia de la aplicación Flask
-app = Flask(__name__)
-# Configuración de la clave secreta para sesiones, generada aleatoriamente
-app.secret_key = os.urandom(24)
-
-
-# Clave secreta para acceso a finanzas (cámbiala por una segura)
-FINANZAS_KEY = "root10"  # Cambia esto en producción
+try:
+    import brotli  # Opcional: sin él `flask construir-estaticos` solo genera .gz
+except ImportError:
+    brotli = None
 
 
+class ImportacionDiferida:
+    """Módulo que se importa la primera vez que se usa uno de sus atributos."""
 
-load_dotenv()
+    def __init__(self, nombre):
+        self._nombre = nombre
 
-database_url = os.environ.get('DATABASE_URL')
-if not database_url:
-    raise ValueError("No se encontró la variable DATABASE_URL. Verifica las variables de entorno en Railway.")
+    def __getattr__(self, atributo):
+        return getattr(importlib.import_module(self._nombre), atributo)
 
-# Railway ya te da la URL con postgresql://, pero por si acaso
-if database_url.startswith('postgres://'):
-    database_url = database_url.replace('postgres://', 'postgresql://', 1)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Dependencias pesadas que solo usan algunas rutas o comandos: se importan al primer uso
+# para no sumar su carga (~250 ms entre las cuatro) al arranque de cada worker
+np = ImportacionDiferida('numpy')  # Cálculos de /admin/finanzas
+openpyxl = ImportacionDiferida('openpyxl')  # Exportaciones con ?formato=xlsx
+flask_migrate = ImportacionDiferida('flask_migrate')  # Comandos `flask db` y `flask seed`
+flask_client = ImportacionDiferida('authlib.integrations.flask_client')  # Inicio de sesión con Google
 
+# Clave secreta para acceso a finanzas (cámbiala por una segura)
+FINANZAS_KEY = "root10"  # Cambia esto en producción
 
 
 # === FUNCIÓN PARA CALCULAR TOTAL AGRÍCOLA ===
@@ -49,7 +71,7 @@ def login_required_or_guest(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' in session or 'guest' in session:
             return f(*args, **kwargs)
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return decorated_function
 
 
@@ -57,22 +79,14 @@ def login_required_or_guest(f):
 
 # Configuración de la carpeta para subir imágenes
 UPLOAD_FOLDER = 'static/uploads'
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 # Extensiones de archivo permitidas para las imágenes
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-
-# Creación de la carpeta de subidas si no existe
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'jfif', 'gif'}
 
-# Inicialización de SQLAlchemy para la gestión de la base de datos
-db = SQLAlchemy(app)
-# Inicialización de Flask-Migrate para manejar migraciones de la base de datos
-migrate = Migrate(app, db)
+# Extensiones sin aplicación: se enlazan en create_app (inicialización diferida)
+db = SQLAlchemy()
 
-# Configuración de OAuth para autenticación con Google
-oauth = OAuth(app)
-google = oauth.register(
+# Configuración de OAuth para autenticación con Google (ver cliente_google)
+GOOGLE_OAUTH = dict(
     name='google',
     client_id='TU_CLIENT_ID',  # ID del cliente de Google OAuth
     client_secret='TU_CLIENT_SECRET',  # Secreto del cliente de Google OAuth
@@ -83,6 +97,48 @@ google = oauth.register(
     jwks_uri='https://www.googleapis.com/oauth2/v3/certs'  # URI para las claves públicas de Google
 )
 
+# Rutas y comandos de la aplicación; los comandos quedan en el nivel superior (`flask seed`)
+bp = Blueprint('main', __name__, cli_group=None)
+
+
+def create_app(config=None):
+    """Crea y configura la aplicación.
+
+    No toca la base de datos: el esquema se crea con las migraciones (`flask db upgrade`
+    o `flask seed`), así el arranque de cada worker es rápido.
+    """
+    load_dotenv()
+    app = Flask(__name__)
+    # Configuración de la clave secreta para sesiones, generada aleatoriamente
+    app.secret_key = os.urandom(24)
+
+    database_url = os.environ.get('DATABASE_URL')
+    if config and 'SQLALCHEMY_DATABASE_URI' in config:
+        database_url = config['SQLALCHEMY_DATABASE_URI']
+    if not database_url:
+        raise ValueError("No se encontró la variable DATABASE_URL. Verifica las variables de entorno en Railway.")
+
+    # Railway ya te da la URL con postgresql://, pero por si acaso
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    app.config.update(config or {})
+
+    # Creación de la carpeta de subidas si no existe
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    db.init_app(app)
+    # Flask-Migrate (migraciones y `flask db`) solo en la línea de comandos, no en los workers
+    if app.config.get('MIGRACIONES', os.environ.get('FLASK_RUN_FROM_CLI') == 'true'):
+        flask_migrate.Migrate(app, db, directory=os.path.join(app.root_path, 'migrations'))
+    app.register_blueprint(bp)
+    app.view_functions['static'] = servir_estatico
+    return app
+
+
 # Definición del modelo Usuario para la base de datos
 class Usuario(db.Model):
     __tablename__ = 'usuarios'
@@ -112,6 +168,8 @@ class Menu(db.Model):
     precio = db.Column(db.Float, nullable=False)  # Precio del menú
     categoria = db.Column(db.String(100), nullable=False)  # Categoría del menú
     imagen = db.Column(db.String(255), nullable=True)  # Ruta de la imagen del menú
+    # Menús de un restaurante ordenados por id (catálogo y paginación de la API)
+    __table_args__ = (db.Index('ix_menus_restaurante_id', 'restaurante_id', 'id'),)
 
 
 
@@ -119,10 +177,12 @@ class Menu(db.Model):
 class PedidoItem(db.Model):
     __tablename__ = 'pedidos_items'
     id = db.Column(db.Integer, primary_key=True)
-    pedido_id = db.Column(db.Integer, db.ForeignKey('pedidos.id'), nullable=False)
-    menu_id = db.Column(db.Integer, db.ForeignKey('menus.id'), nullable=False)
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedidos.id'), nullable=False, index=True)
+    menu_id = db.Column(db.Integer, db.ForeignKey('menus.id'), nullable=False, index=True)
     cantidad = db.Column(db.Integer, nullable=False)
     precio = db.Column(db.Float, nullable=False)
+    # Copia de Pedido.fecha: clave de partición en Postgres (ver `flask mantener-particiones`)
+    fecha = db.Column(db.DateTime, nullable=False)
     
     # Relación opcional con menú
     menu = db.relationship('Menu', backref='items_pedido')
@@ -150,10 +210,11 @@ class Pedido(db.Model):
     hora_reserva = db.Column(db.Time)
     fecha_reserva = db.Column(db.Date)
     estado = db.Column(db.String(20), default='pendiente')
-    fecha = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     
     # NUEVA COLUMNA
-    codigo_pedido = db.Column(db.String(20), unique=True, nullable=False)
+    # Único junto con la fecha (clave de partición); codigos_pedido lo hace único en todos los meses
+    codigo_pedido = db.Column(db.String(20), nullable=False)
 
     # RELACIONES
     usuario = db.relationship('Usuario', backref='pedidos')
@@ -162,8 +223,25 @@ class Pedido(db.Model):
     # restaurante = db.relationship('Restaurante', backref='pedidos')
     
     # MANTÉN SOLO LOS ITEMS
-    items = db.relationship('PedidoItem', backref='pedido', lazy=True, cascade='all, delete-orphan')
+    # La fecha forma parte del join: los ítems nuevos la heredan y las lecturas podan particiones
+    items = db.relationship(
+        'PedidoItem', backref='pedido', lazy=True, cascade='all, delete-orphan',
+        primaryjoin='and_(Pedido.id == foreign(PedidoItem.pedido_id), Pedido.fecha == foreign(PedidoItem.fecha))'
+    )
+
+    # Pedidos de un restaurante o de un usuario por rango de fechas
+    __table_args__ = (
+        db.UniqueConstraint('codigo_pedido', 'fecha', name='pedidos_codigo_pedido_key'),
+        db.Index('ix_pedidos_restaurante_fecha', 'restaurante_id', 'fecha'),
+        db.Index('ix_pedidos_usuario_fecha', 'usuario_id', 'fecha'),
+    )
+
 
+# Códigos de pedido emitidos. Sin particionar, a diferencia de pedidos: su clave primaria
+# mantiene cada código único aunque su pedido esté en otro mes o ya archivado.
+class CodigoPedido(db.Model):
+    __tablename__ = 'codigos_pedido'
+    codigo = db.Column(db.String(20), primary_key=True)
 
 
 
@@ -178,6 +256,11 @@ class ProductoAgricola(db.Model):
     precio_venta = db.Column(db.Float, nullable=False)   # Precio al vender
     stock = db.Column(db.Integer, default=0)
     imagen = db.Column(db.String(255))
+    # Índice parcial: agricola_market() solo lista productos con stock, en orden de id
+    __table_args__ = (
+        db.Index('ix_productos_agricolas_con_stock', 'id',
+                 postgresql_where=db.text('stock > 0'), sqlite_where=db.text('stock > 0')),
+    )
 
 # === MODELOS PARA PEDIDOS AGRÍCOLAS ===
 class PedidoAgricola(db.Model):
@@ -196,15 +279,712 @@ class PedidoAgricola(db.Model):
 class DetallePedidoAgricola(db.Model):
     __tablename__ = 'detalles_pedido_agricola'
     id = db.Column(db.Integer, primary_key=True)
-    pedido_id = db.Column(db.Integer, db.ForeignKey('pedidos_agricolas.id'))
-    producto_id = db.Column(db.Integer, db.ForeignKey('productos_agricolas.id'))
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedidos_agricolas.id'), index=True)
+    producto_id = db.Column(db.Integer, db.ForeignKey('productos_agricolas.id'), index=True)
     cantidad = db.Column(db.Integer, nullable=False)
     precio_unitario = db.Column(db.Float, nullable=False)
     producto = db.relationship('ProductoAgricola', backref='detalles_pedido')
 
+# === RESERVAS DE STOCK AGRÍCOLA ===
+# Unidades apartadas por un carrito hasta `expira`. El stock de ProductoAgricola solo
+# baja al confirmar; lo disponible para los demás es stock - reservas vigentes.
+class ReservaAgricola(db.Model):
+    __tablename__ = 'reservas_agricolas'
+    carrito_id = db.Column(db.String(32), primary_key=True)  # Carrito.id de la sesión
+    producto_id = db.Column(db.Integer, db.ForeignKey('productos_agricolas.id', ondelete='CASCADE'), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False)
+    expira = db.Column(db.DateTime, nullable=False, index=True)
+    __table_args__ = (db.Index('ix_reservas_producto_expira', 'producto_id', 'expira'),)
+
+# === CLAVES DE IDEMPOTENCIA ===
+# Cada formulario de confirmación lleva una clave única. La primera petición la registra
+# en la misma transacción que el pedido y guarda la factura ya renderizada; los reenvíos
+# (doble clic, recargar la factura) devuelven esa respuesta sin volver a escribir.
+class ClaveIdempotencia(db.Model):
+    __tablename__ = 'claves_idempotencia'
+    clave = db.Column(db.String(64), primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)  # 'restaurante' o 'agricola'
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
+    pedido_id = db.Column(db.Integer)  # Pedido.id o PedidoAgricola.id según `tipo`
+    respuesta = db.Column(db.Text)  # Factura renderizada
+    creada = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+# === IMÁGENES PROCESADAS ===
+# Una fila por archivo servido: el original (formato 'original') y sus miniaturas de
+# ancho fijo en JPEG y WebP, con sus dimensiones para width/height/srcset.
+class Imagen(db.Model):
+    __tablename__ = 'imagenes'
+    ruta = db.Column(db.String(255), primary_key=True)  # Relativa a static/
+    original = db.Column(db.String(255), nullable=False, index=True)
+    formato = db.Column(db.String(10), nullable=False)  # 'original', 'jpeg' o 'webp'
+    ancho = db.Column(db.Integer, nullable=False)
+    alto = db.Column(db.Integer, nullable=False)
+
+
+# === CARRITO DEL LADO DEL SERVIDOR ===
+# La cookie de sesión solo guarda `carrito_id`; los ítems viven en la base de datos,
+# indexados por (carrito, menú), así cada operación toca una sola fila.
+class Carrito(db.Model):
+    __tablename__ = 'carritos'
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 en hexadecimal
+    actualizado = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    items = db.relationship('CarritoItem', backref='carrito', lazy=True, cascade='all, delete-orphan')
+
+    @classmethod
+    def actual(cls, crear=False):
+        """Carrito de la sesión actual; lo crea si `crear` y aún no existe."""
+        carrito_id = session.get('carrito_id')
+        if carrito_id:
+            carrito = db.session.get(cls, carrito_id)
+            if carrito:
+                if crear:
+                    carrito.actualizado = datetime.utcnow()  # Actividad reciente: no es abandonado
+                return carrito
+        if not crear:
+            return None
+        carrito = cls(id=uuid.uuid4().hex)
+        db.session.add(carrito)
+        db.session.flush()
+        session['carrito_id'] = carrito.id
+        return carrito
+
+    def _items(self):
+        return CarritoItem.query.filter_by(carrito_id=self.id)
+
+    def item(self, menu_id):
+        return db.session.get(CarritoItem, (self.id, menu_id))
+
+    def items_de(self, restaurante_id):
+        """Ítems del carrito para un restaurante, en orden de llegada."""
+        return self._items().filter_by(restaurante_id=restaurante_id)\
+            .order_by(CarritoItem.agregado, CarritoItem.menu_id)\
+            .all()
+
+    def agregar(self, restaurante_id, menu_id, cantidad):
+        """Suma `cantidad` al ítem; si no existía lo crea con los datos del menú.
+
+        Devuelve False si el menú no existe o no pertenece al restaurante.
+        """
+        actualizados = self._items().filter_by(menu_id=menu_id, restaurante_id=restaurante_id)\
+            .update({CarritoItem.cantidad: CarritoItem.cantidad + cantidad}, synchronize_session=False)
+        if actualizados:
+            return True
+        menu = Menu.query.filter_by(id=menu_id, restaurante_id=restaurante_id).first()
+        if not menu:
+            return False
+        db.session.add(CarritoItem(
+            carrito_id=self.id,
+            menu_id=menu.id,
+            restaurante_id=restaurante_id,
+            nombre=menu.nombre,
+            precio=float(menu.precio),
+            cantidad=cantidad
+        ))
+        return True
+
+    def establecer_cantidad(self, restaurante_id, menu_id, cantidad):
+        """Fija la cantidad de un ítem; con 0 o menos lo elimina. Devuelve filas afectadas."""
+        if cantidad <= 0:
+            return self.eliminar(restaurante_id, menu_id)
+        return self._items().filter_by(menu_id=menu_id, restaurante_id=restaurante_id)\
+            .update({CarritoItem.cantidad: cantidad}, synchronize_session=False)
+
+    def eliminar(self, restaurante_id, menu_id):
+        return self._items().filter_by(menu_id=menu_id, restaurante_id=restaurante_id)\
+            .delete(synchronize_session=False)
+
+    def aplicar_lote(self, operaciones):
+        """Aplica una lista de operaciones {op, menu_id, cantidad} (add/set/remove).
+
+        Valida todos los menús con una sola consulta IN y carga los ítems existentes
+        con otra; devuelve la lista de errores (índice, mensaje, estado HTTP): 404 si el
+        menú o el restaurante no existen, 422 si el menú es de otro restaurante. No hace
+        commit: si hay errores el llamador debe hacer rollback.
+        """
+        errores = []
+        ids = {op['menu_id'] for op in operaciones}
+        menus = {m.id: m for m in Menu.query.filter(Menu.id.in_(ids))} if ids else {}
+        ids_restaurantes = {op['restaurante_id'] for op in operaciones if op.get('restaurante_id') is not None}
+        restaurantes = {rid for (rid,) in db.session.query(Restaurante.id).filter(Restaurante.id.in_(ids_restaurantes))}\
+            if ids_restaurantes else set()
+        items = {i.menu_id: i for i in self._items().filter(CarritoItem.menu_id.in_(ids))} if ids else {}
+
+        for indice, op in enumerate(operaciones):
+            menu = menus.get(op['menu_id'])
+            if not menu:
+                errores.append((indice, 'Menú no encontrado', 404))
+                continue
+            if op.get('restaurante_id') not in (None, menu.restaurante_id):
+                if op['restaurante_id'] not in restaurantes:
+                    errores.append((indice, 'Restaurante no encontrado', 404))
+                else:
+                    errores.append((indice, 'El menú no pertenece al restaurante', 422))
+                continue
+            item = items.get(menu.id)
+            actual = item.cantidad if item else 0
+            if op['op'] == 'add':
+                nueva = actual + op['cantidad']
+            elif op['op'] == 'set':
+                nueva = op['cantidad']
+            else:
+                nueva = 0
+
+            if nueva <= 0:
+                if item:
+                    db.session.delete(item)
+                    del items[menu.id]
+            elif item:
+                item.cantidad = nueva
+            else:
+                items[menu.id] = CarritoItem(
+                    carrito_id=self.id,
+                    menu_id=menu.id,
+                    restaurante_id=menu.restaurante_id,
+                    nombre=menu.nombre,
+                    precio=float(menu.precio),
+                    cantidad=nueva
+                )
+                db.session.add(items[menu.id])
+        return errores
+
+    def vaciar(self, restaurante_id=None):
+        consulta = self._items()
+        if restaurante_id is not None:
+            consulta = consulta.filter_by(restaurante_id=restaurante_id)
+        return consulta.delete(synchronize_session=False)
+
+    def resumen(self):
+        """Lista de {restaurante_id, total_items} con una consulta agrupada."""
+        filas = db.session.query(CarritoItem.restaurante_id, db.func.sum(CarritoItem.cantidad))\
+            .filter(CarritoItem.carrito_id == self.id)\
+            .group_by(CarritoItem.restaurante_id)\
+            .order_by(db.func.min(CarritoItem.agregado))\
+            .all()
+        return [{'restaurante_id': rid, 'total_items': int(total)} for rid, total in filas]
+
+    def por_restaurante(self):
+        """Lista de (restaurante, ítems) para mostrar el carrito completo."""
+        grupos = {}
+        filas = db.session.query(CarritoItem, Restaurante)\
+            .join(Restaurante, CarritoItem.restaurante_id == Restaurante.id)\
+            .filter(CarritoItem.carrito_id == self.id)\
+            .order_by(CarritoItem.agregado, CarritoItem.menu_id)
+        for item, restaurante in filas:
+            grupos.setdefault(restaurante.id, (restaurante, []))[1].append(item)
+        return list(grupos.values())
+
+
+class CarritoItem(db.Model):
+    __tablename__ = 'carrito_items'
+    carrito_id = db.Column(db.String(32), db.ForeignKey('carritos.id'), primary_key=True)
+    # Si se borra el menú o el restaurante, la línea desaparece de los carritos
+    menu_id = db.Column(db.Integer, db.ForeignKey('menus.id', ondelete='CASCADE'), primary_key=True)
+    restaurante_id = db.Column(db.Integer, db.ForeignKey('restaurantes.id', ondelete='CASCADE'), nullable=False)
+    nombre = db.Column(db.String(100), nullable=False)
+    precio = db.Column(db.Float, nullable=False)
+    cantidad = db.Column(db.Integer, nullable=False)
+    agregado = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_carrito_items_carrito_restaurante', 'carrito_id', 'restaurante_id'),
+    )
+
+# === CONTADOR DE PEDIDOS POR RESTAURANTE ===
+# Se actualiza en la misma transacción que confirma el pedido, así la página de
+# restaurantes no necesita agregar toda la tabla pedidos para saber los populares.
+class ContadorRestaurante(db.Model):
+    __tablename__ = 'contadores_restaurante'
+    restaurante_id = db.Column(db.Integer, db.ForeignKey('restaurantes.id'), primary_key=True)
+    total_pedidos = db.Column(db.Integer, nullable=False, default=0, index=True)
+    archivados = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Parte de total_pedidos ya archivada
+    restaurante = db.relationship('Restaurante', backref=db.backref('contador', uselist=False, cascade='all, delete-orphan'))
+
+# === POPULARIDAD DE MENÚS POR RESTAURANTE ===
+# `puntaje` acumula 2^(t / vida media) por cada venta. Ordenar por ese valor es lo mismo
+# que ordenar por un puntaje con decaimiento exponencial ("popular esta semana"),
+# sin tener que reescribir las filas antiguas. Como 2^(t / vida media) crece sin límite,
+# `flask rebasar-popularidad` (cron) mueve la época a hoy y reescala los puntajes.
+POPULARIDAD_EPOCA = datetime(2025, 1, 1)  # Época inicial, mientras no haya fila en epoca_popularidad
+POPULARIDAD_VIDA_MEDIA_DIAS = 7
+
+class PopularidadMenu(db.Model):
+    __tablename__ = 'popularidad_menus'
+    menu_id = db.Column(db.Integer, db.ForeignKey('menus.id'), primary_key=True)
+    restaurante_id = db.Column(db.Integer, db.ForeignKey('restaurantes.id'), nullable=False)
+    total_pedidos = db.Column(db.Integer, nullable=False, default=0)  # Líneas de pedido históricas
+    archivados = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Parte de total_pedidos ya archivada
+    puntaje = db.Column(db.Float, nullable=False, default=0)  # Puntaje con decaimiento temporal
+    menu = db.relationship('Menu', backref=db.backref('popularidad', uselist=False, cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.Index('ix_popularidad_menus_restaurante_total', 'restaurante_id', 'total_pedidos'),
+        db.Index('ix_popularidad_menus_restaurante_puntaje', 'restaurante_id', 'puntaje'),
+    )
+
+class EpocaPopularidad(db.Model):
+    __tablename__ = 'epoca_popularidad'
+    id = db.Column(db.Integer, primary_key=True)  # Fila única (id 1)
+    epoca = db.Column(db.DateTime, nullable=False)  # Instante en que una venta pesa 1
+
+# === VENTAS DIARIAS (ROLLUP RESTAURANTE x DÍA) ===
+# Base del reporte financiero: una fila por restaurante y día en lugar de leer cada pedido.
+class VentaDiaria(db.Model):
+    __tablename__ = 'ventas_diarias'
+    restaurante_id = db.Column(db.Integer, db.ForeignKey('restaurantes.id'), primary_key=True)
+    dia = db.Column(db.Date, primary_key=True)
+    pedidos = db.Column(db.Integer, nullable=False, default=0)  # Número de pedidos del día
+    ingresos = db.Column(db.Float, nullable=False, default=0)  # Suma de Pedido.total del día
+    restaurante = db.relationship('Restaurante', backref=db.backref('ventas_diarias', cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.Index('ix_ventas_diarias_dia', 'dia'),
+    )
+
+# === PARÁMETROS FINANCIEROS POR RESTAURANTE ===
+# Proporciones del balance simplificado de /admin/finanzas. Un restaurante sin fila usa
+# PARAMETROS_FINANCIEROS_DEFECTO; la parte no corriente es el complemento de cada una.
+PARAMETROS_FINANCIEROS_DEFECTO = {
+    'proporcion_costo': 0.60,              # Costo operativo sobre ingresos (el resto es ganancia)
+    'proporcion_activo_corriente': 0.75,   # Activo corriente sobre ingresos
+    'proporcion_pasivo_corriente': 0.85,   # Pasivo corriente sobre costo
+}
+
+
+class ParametroFinanciero(db.Model):
+    __tablename__ = 'parametros_financieros'
+    restaurante_id = db.Column(db.Integer, db.ForeignKey('restaurantes.id'), primary_key=True)
+    proporcion_costo = db.Column(db.Float, nullable=False)
+    proporcion_activo_corriente = db.Column(db.Float, nullable=False)
+    proporcion_pasivo_corriente = db.Column(db.Float, nullable=False)
+    restaurante = db.relationship('Restaurante', backref=db.backref(
+        'parametros_financieros', uselist=False, cascade='all, delete-orphan'))
+
+    __table_args__ = tuple(
+        db.CheckConstraint(f'{columna} BETWEEN 0 AND 1', name=f'ck_parametros_financieros_{columna}')
+        for columna in PARAMETROS_FINANCIEROS_DEFECTO
+    )
+
+# === VERSIONES DEL CATÁLOGO ===
+# Una fila por dominio (CATALOGO_DOMINIOS); cada edición incrementa la `version` de su
+# dominio e invalida solo esas cachés en todos los procesos (que la releen cada
+# CATALOGO_VERSION_TTL segundos).
+class VersionCatalogo(db.Model):
+    __tablename__ = 'version_catalogo'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# === ÍNDICE DE BÚSQUEDA ===
+# Un documento por restaurante o menú con el texto ya normalizado (minúsculas, sin
+# acentos). En PostgreSQL se indexa con trigramas (pg_trgm) para búsquedas por
+# subcadena y por similitud sin recorrer las tablas del catálogo.
+class DocumentoBusqueda(db.Model):
+    __tablename__ = 'indice_busqueda'
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)  # 'restaurante' o 'menu'
+    ref_id = db.Column(db.Integer, nullable=False)  # ID del restaurante o menú
+    restaurante_id = db.Column(db.Integer, index=True)  # Restaurante al que pertenece
+    nombre = db.Column(db.String(200), nullable=False)  # Nombre normalizado
+    texto = db.Column(db.Text, nullable=False)  # Nombre + descripción + categoría normalizados
+
+    __table_args__ = (
+        db.UniqueConstraint('tipo', 'ref_id', name='uq_indice_busqueda_tipo_ref'),
+        db.Index('ix_indice_busqueda_texto_trgm', 'texto',
+                 postgresql_using='gin', postgresql_ops={'texto': 'gin_trgm_ops'}),
+    )
+
+db.event.listen(
+    DocumentoBusqueda.__table__, 'before_create',
+    db.DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
+
+
 
 
 
+# === CACHÉ DEL CATÁLOGO ===
+CATALOGO_VERSION_TTL = 5  # Segundos entre relecturas de las versiones
+# Dominios del catálogo (id de su fila en version_catalogo)
+CATALOGO_RESTAURANTES = 1  # Restaurantes, menús, búsqueda, alias del chatbot y API
+CATALOGO_AGRICOLA = 2      # Datos de los productos agrícolas (el stock se lee aparte)
+CATALOGO_IMAGENES = 3      # Metadatos de las imágenes procesadas
+CATALOGO_DOMINIOS = (CATALOGO_RESTAURANTES, CATALOGO_AGRICOLA, CATALOGO_IMAGENES)
+
+
+class CacheLRU:
+    """Caché en memoria con tamaño máximo (LRU) y contadores de aciertos/fallos."""
+
+    def __init__(self, capacidad=512):
+        self.capacidad = capacidad
+        self.aciertos = 0
+        self.fallos = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, cargar):
+        """Devuelve el valor de `clave`; si no está, lo calcula con `cargar()` y lo guarda."""
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return self._datos[clave]
+            self.fallos += 1
+        valor = cargar()
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'capacidad': self.capacidad,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / total, 3) if total else 0.0
+            }
+
+
+cache_catalogo = CacheLRU(capacidad=512)
+_version_local = {'valores': None, 'leida': 0.0}
+
+
+def version_catalogo(dominio=CATALOGO_RESTAURANTES):
+    """Versión de un dominio del catálogo; todas se releen juntas como mucho cada pocos segundos."""
+    ahora = time.monotonic()
+    if _version_local['valores'] is None or ahora - _version_local['leida'] > CATALOGO_VERSION_TTL:
+        _version_local['valores'] = dict(db.session.query(VersionCatalogo.id, VersionCatalogo.version))
+        _version_local['leida'] = ahora
+    return _version_local['valores'].get(dominio, 0)
+
+
+def invalidar_catalogo(*dominios):
+    """Incrementa la versión de `dominios`; se confirma con el commit de la ruta que edita."""
+    for dominio in dominios:
+        incrementar_contador(VersionCatalogo, {'id': dominio}, {'version': 1})
+    _version_local['valores'] = None  # Este proceso las relee en la próxima consulta
+
+
+def _fila_restaurante(r):
+    return {'id': r.id, 'nombre': r.nombre, 'descripcion': r.descripcion,
+            'categoria': r.categoria, 'imagen': r.imagen}
+
+
+def _fila_menu(m):
+    return {'id': m.id, 'restaurante_id': m.restaurante_id, 'nombre': m.nombre, 'descripcion': m.descripcion,
+            'precio': m.precio, 'categoria': m.categoria, 'imagen': m.imagen}
+
+
+def _fila_producto(p):
+    return {'id': p.id, 'nombre': p.nombre, 'descripcion': p.descripcion, 'precio_venta': p.precio_venta,
+            'imagen': p.imagen}
+
+
+def catalogo_restaurantes():
+    """Todos los restaurantes como diccionarios (cacheado por versión del catálogo)."""
+    return cache_catalogo.obtener(
+        ('restaurantes', version_catalogo()),
+        lambda: [_fila_restaurante(r) for r in Restaurante.query.order_by(Restaurante.id).all()]
+    )
+
+
+def catalogo_restaurante(restaurante_id):
+    por_id = cache_catalogo.obtener(
+        ('restaurantes_por_id', version_catalogo()),
+        lambda: {r['id']: r for r in catalogo_restaurantes()}
+    )
+    return por_id.get(restaurante_id)
+
+
+def catalogo_menus(restaurante_id):
+    """Menús de un restaurante como diccionarios (cacheado por versión del catálogo)."""
+    return cache_catalogo.obtener(
+        ('menus', restaurante_id, version_catalogo()),
+        lambda: [_fila_menu(m) for m in Menu.query.filter_by(restaurante_id=restaurante_id).order_by(Menu.id).all()]
+    )
+
+
+def catalogo_agricola():
+    """Productos agrícolas con stock.
+
+    Los datos fijos están cacheados por versión del dominio agrícola; el stock cambia con
+    cada compra, así que se lee aparte en una consulta de (id, stock) sin invalidar nada.
+    """
+    productos = cache_catalogo.obtener(
+        ('agricola', version_catalogo(CATALOGO_AGRICOLA)),
+        lambda: [_fila_producto(p) for p in ProductoAgricola.query.order_by(ProductoAgricola.id).all()]
+    )
+    stock = dict(db.session.query(ProductoAgricola.id, ProductoAgricola.stock).filter(ProductoAgricola.stock > 0))
+    return [dict(p, stock=stock[p['id']]) for p in productos if p['id'] in stock]
+
+
+# === BÚSQUEDA EN EL CATÁLOGO ===
+BUSQUEDA_UMBRAL = 0.6  # Igual al umbral por defecto de word_similarity en pg_trgm
+
+
+def normalizar_texto(texto):
+    """Minúsculas, sin acentos y solo letras/números: "Champiñones" -> "champinones"."""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'[a-z0-9]+', sin_acentos.lower()))
+
+
+def trigramas(texto):
+    """Trigramas de cada palabra, con el mismo relleno que usa pg_trgm."""
+    resultado = set()
+    for palabra in texto.split():
+        relleno = f'  {palabra} '
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return resultado
+
+
+def _indexar(tipo, ref_id, restaurante_id, nombre, extras):
+    documento = DocumentoBusqueda.query.filter_by(tipo=tipo, ref_id=ref_id).first()
+    if not documento:
+        documento = DocumentoBusqueda(tipo=tipo, ref_id=ref_id)
+        db.session.add(documento)
+    documento.restaurante_id = restaurante_id
+    documento.nombre = normalizar_texto(nombre)
+    documento.texto = normalizar_texto(' '.join([nombre or ''] + [e or '' for e in extras]))
+    invalidar_indice_memoria()
+
+
+def indexar_restaurante(restaurante):
+    _indexar('restaurante', restaurante.id, restaurante.id, restaurante.nombre,
+             [restaurante.descripcion, restaurante.categoria])
+
+
+def indexar_menu(menu):
+    _indexar('menu', menu.id, menu.restaurante_id, menu.nombre, [menu.descripcion, menu.categoria])
+
+
+def desindexar(tipo, ref_id):
+    DocumentoBusqueda.query.filter_by(tipo=tipo, ref_id=ref_id).delete(synchronize_session=False)
+    invalidar_indice_memoria()
+
+
+def reindexar_busqueda():
+    """Reconstruye el índice de búsqueda completo desde restaurantes y menús."""
+    DocumentoBusqueda.query.delete()
+    documentos = []
+    for r in Restaurante.query.all():
+        documentos.append({
+            'tipo': 'restaurante', 'ref_id': r.id, 'restaurante_id': r.id,
+            'nombre': normalizar_texto(r.nombre),
+            'texto': normalizar_texto(' '.join(filter(None, [r.nombre, r.descripcion, r.categoria])))
+        })
+    for m in Menu.query.all():
+        documentos.append({
+            'tipo': 'menu', 'ref_id': m.id, 'restaurante_id': m.restaurante_id,
+            'nombre': normalizar_texto(m.nombre),
+            'texto': normalizar_texto(' '.join(filter(None, [m.nombre, m.descripcion, m.categoria])))
+        })
+    db.session.bulk_insert_mappings(DocumentoBusqueda, documentos)
+    invalidar_indice_memoria()
+    return len(documentos)
+
+
+class IndiceInvertido:
+    """Índice invertido de trigramas en memoria (respaldo cuando no hay PostgreSQL)."""
+
+    def __init__(self, documentos):
+        # documentos: iterable de (tipo, ref_id, restaurante_id, nombre, texto) ya normalizados
+        self.documentos = {}
+        self.postings = defaultdict(set)
+        for tipo, ref_id, restaurante_id, nombre, texto in documentos:
+            clave = (tipo, ref_id)
+            self.documentos[clave] = (restaurante_id, nombre, texto, trigramas(nombre), trigramas(texto))
+            for trigrama in self.documentos[clave][4]:
+                self.postings[trigrama].add(clave)
+
+    def buscar(self, consulta, restaurante_id=None, tipos=None, limite=20):
+        tq = trigramas(consulta)
+        if not tq:
+            return []
+        coincidencias = defaultdict(int)
+        for trigrama in tq:
+            for clave in self.postings.get(trigrama, ()):
+                coincidencias[clave] += 1
+
+        resultados = []
+        for (tipo, ref_id), comunes in coincidencias.items():
+            rid, nombre, texto, tg_nombre, _ = self.documentos[(tipo, ref_id)]
+            if tipos and tipo not in tipos:
+                continue
+            if restaurante_id is not None and rid != restaurante_id:
+                continue
+            similitud = comunes / len(tq)
+            if consulta not in texto and similitud < BUSQUEDA_UMBRAL:
+                continue
+            puntaje = 2 * len(tq & tg_nombre) / len(tq) + similitud
+            resultados.append((tipo, ref_id, rid, puntaje))
+        resultados.sort(key=lambda r: (-r[3], r[0], r[1]))
+        return resultados[:limite]
+
+
+_indice_memoria = None
+
+
+def invalidar_indice_memoria():
+    global _indice_memoria
+    _indice_memoria = None
+
+
+def obtener_indice_memoria():
+    """Índice invertido construido desde el catálogo; se reconstruye al cambiar su versión."""
+    global _indice_memoria
+    version = version_catalogo()
+    if _indice_memoria is None or _indice_memoria[0] != version:
+        documentos = [
+            ('restaurante', r.id, r.id, normalizar_texto(r.nombre),
+             normalizar_texto(' '.join(filter(None, [r.nombre, r.descripcion, r.categoria]))))
+            for r in Restaurante.query.all()
+        ] + [
+            ('menu', m.id, m.restaurante_id, normalizar_texto(m.nombre),
+             normalizar_texto(' '.join(filter(None, [m.nombre, m.descripcion, m.categoria]))))
+            for m in Menu.query.all()
+        ]
+        _indice_memoria = (version, IndiceInvertido(documentos))
+    return _indice_memoria[1]
+
+
+def buscar_catalogo(consulta, restaurante_id=None, tipos=None, limite=20):
+    """Busca en restaurantes y menús; devuelve [(tipo, ref_id, restaurante_id, puntaje)] por relevancia."""
+    q = normalizar_texto(consulta)
+    if not q:
+        return []
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return obtener_indice_memoria().buscar(q, restaurante_id, tipos, limite)
+
+    # El texto normalizado solo contiene [a-z0-9 ], así que no hay comodines que escapar en LIKE
+    puntaje = db.func.word_similarity(q, DocumentoBusqueda.nombre) * 2 + \
+        db.func.word_similarity(q, DocumentoBusqueda.texto)
+    consulta_sql = db.session.query(
+        DocumentoBusqueda.tipo, DocumentoBusqueda.ref_id, DocumentoBusqueda.restaurante_id, puntaje
+    ).filter(db.or_(
+        DocumentoBusqueda.texto.like(f'%{q}%'),
+        DocumentoBusqueda.texto.op('%>')(q)
+    ))
+    if tipos:
+        consulta_sql = consulta_sql.filter(DocumentoBusqueda.tipo.in_(tipos))
+    if restaurante_id is not None:
+        consulta_sql = consulta_sql.filter(DocumentoBusqueda.restaurante_id == restaurante_id)
+    return [tuple(fila) for fila in consulta_sql.order_by(puntaje.desc()).limit(limite).all()]
+
+
+# === ÍNDICE DE ALIAS PARA EL CHATBOT ===
+NUMEROS_TEXTO = {
+    'un': 1, 'una': 1, 'uno': 1, 'dos': 2, 'tres': 3, 'cuatro': 4, 'cinco': 5,
+    'seis': 6, 'siete': 7, 'ocho': 8, 'nueve': 9, 'diez': 10, 'docena': 12
+}
+PALABRAS_VACIAS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los', 'me', 'para', 'por',
+    'quiero', 'dame', 'favor', 'porfa', 'unidad', 'unidades', 'x', 'y'
+}
+_SEPARADOR_PEDIDOS = re.compile(r',|\by\b(?=\s+(?:\d+|' + '|'.join(NUMEROS_TEXTO) + r')\b)')
+
+
+def singular(palabra):
+    """Singular aproximado en español: "pizzas" -> "pizza", "champinones" -> "champinon"."""
+    if len(palabra) > 4 and palabra.endswith('es') and palabra[-3] not in 'aeiou':
+        return palabra[:-2]
+    if len(palabra) > 3 and palabra.endswith('s'):
+        return palabra[:-1]
+    return palabra
+
+
+def tokens_alias(texto):
+    return {singular(t) for t in normalizar_texto(texto).split() if t not in PALABRAS_VACIAS}
+
+
+def indice_alias():
+    """Índice token -> menús de todo el catálogo (cacheado por versión del catálogo)."""
+    def construir():
+        menus = {}
+        postings = defaultdict(set)
+        filas = db.session.query(Menu.id, Menu.nombre, Menu.precio, Menu.restaurante_id, Restaurante.nombre)\
+            .join(Restaurante, Menu.restaurante_id == Restaurante.id)
+        for menu_id, nombre, precio, restaurante_id, restaurante in filas:
+            tokens = tokens_alias(nombre)
+            tokens_rest = tokens_alias(restaurante)
+            menus[menu_id] = {
+                'menu_id': menu_id, 'nombre': nombre, 'precio': precio,
+                'restaurante_id': restaurante_id, 'restaurante': restaurante,
+                'tokens': tokens, 'tokens_restaurante': tokens_rest
+            }
+            for token in tokens | tokens_rest:
+                postings[token].add(menu_id)
+        return {'menus': menus, 'postings': dict(postings)}
+    return cache_catalogo.obtener(('alias', version_catalogo()), construir)
+
+
+def interpretar_pedido(texto):
+    """Divide "2 pizzas hawaianas y 1 edamame" en [(2, {'pizza', 'hawaiana'}), (1, {'edamame'})]."""
+    pedidos = []
+    for segmento in _SEPARADOR_PEDIDOS.split(normalizar_texto(texto)):
+        cantidad = None
+        tokens = set()
+        for palabra in segmento.split():
+            if cantidad is None and palabra.isdigit():
+                cantidad = int(palabra)
+            elif cantidad is None and palabra in NUMEROS_TEXTO:
+                cantidad = NUMEROS_TEXTO[palabra]
+            elif palabra not in PALABRAS_VACIAS:
+                tokens.add(singular(palabra))
+        if tokens:
+            pedidos.append((segmento.strip(), max(cantidad or 1, 1), tokens))
+    return pedidos
+
+
+def candidatos_alias(tokens, restaurante_id=None, limite=5):
+    """Menús que mejor cubren los `tokens` del cliente, con su puntaje (0 a 1)."""
+    indice = indice_alias()
+    vocabulario = indice['postings']
+    expandidos = {}
+    for token in tokens:
+        if token in vocabulario:
+            expandidos[token] = {token}
+        elif len(token) >= 4:
+            # Prefijos: "hawai" encuentra "hawaiana"
+            expandidos[token] = {v for v in vocabulario if v.startswith(token)}
+        else:
+            expandidos[token] = set()
+
+    ids = set()
+    for variantes in expandidos.values():
+        for v in variantes:
+            ids |= vocabulario[v]
+
+    resultados = []
+    for menu_id in ids:
+        menu = indice['menus'][menu_id]
+        if restaurante_id is not None and menu['restaurante_id'] != restaurante_id:
+            continue
+        en_nombre = sum(1 for variantes in expandidos.values() if variantes & menu['tokens'])
+        en_restaurante = sum(1 for variantes in expandidos.values()
+                             if not variantes & menu['tokens'] and variantes & menu['tokens_restaurante'])
+        puntaje = (en_nombre + 0.5 * en_restaurante) / len(tokens)
+        if en_nombre and puntaje >= 0.5:
+            # Desempate: platos cuyo nombre no tiene palabras de más
+            precision = en_nombre / len(menu['tokens']) if menu['tokens'] else 0
+            resultados.append((puntaje, precision, menu))
+    resultados.sort(key=lambda r: (-r[0], -r[1], r[2]['menu_id']))
+    return [(round(puntaje, 3), menu) for puntaje, _, menu in resultados[:limite]]
+
+
+def cargar_en_orden(modelo, ids):
+    """Carga filas de `modelo` con un IN y las devuelve en el orden de `ids`."""
+    if not ids:
+        return []
+    por_id = {obj.id: obj for obj in modelo.query.filter(modelo.id.in_(ids)).all()}
+    return [por_id[i] for i in ids if i in por_id]
 
 
 # Función para verificar si la extensión del archivo es permitida
@@ -215,10 +995,301 @@ def allowed_file(filename):
 def copy_image_from_path(source_path, destination_dir):
     if not os.path.exists(source_path):
         return None
-    filename = secure_filename(os.path.basename(source_path))  # Obtener nombre seguro del archivo
-    destination_path = os.path.join(destination_dir, filename)  # Ruta de destino
-    shutil.copy2(source_path, destination_path)  # Copiar archivo
-    return os.path.join('uploads', filename)  # Retornar ruta relativa
+    with open(source_path, 'rb') as origen:
+        return guardar_contenido(origen, source_path, destination_dir)
+
+
+# === ALMACENAMIENTO DIRECCIONADO POR CONTENIDO ===
+# Cada subida se guarda como uploads/<sha256>.<ext>: la misma foto subida dos veces ocupa
+# un solo archivo, dos fotos con el mismo nombre no se pisan y la URL nunca cambia de
+# contenido (se puede cachear para siempre). Los archivos se cuentan por referencias
+# desde Restaurante/Menu/ProductoAgricola.imagen y los huérfanos se borran.
+SUBIDA_HASH = re.compile(r'^uploads/[0-9a-f]{64}\.[a-z0-9]+$')
+SUBIDAS_PROTEGIDAS = {'uploads/default.jpg', 'uploads/agricola_default.jpg'}  # Valores por defecto
+SUBIDAS_GRACIA_SEGUNDOS = 600  # Un archivo recién escrito puede no estar referenciado todavía
+SUBIDAS_BLOQUE = 64 * 1024
+EXTENSIONES_EQUIVALENTES = {'jpeg': 'jpg', 'jfif': 'jpg'}
+
+
+def guardar_contenido(flujo, nombre, carpeta=None):
+    """Copia `flujo` a la carpeta de subidas calculando el SHA-256 en el mismo recorrido.
+
+    Devuelve la ruta relativa a static/ (`uploads/<hash>.<ext>`). Si el contenido ya
+    existía se descarta la copia y se reutiliza el archivo.
+    """
+    carpeta = carpeta or current_app.config['UPLOAD_FOLDER']
+    extension = os.path.splitext(secure_filename(nombre))[1].lstrip('.').lower() or 'bin'
+    extension = EXTENSIONES_EQUIVALENTES.get(extension, extension)
+    resumen = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=carpeta, prefix='.subida-', delete=False) as temporal:
+        for bloque in iter(lambda: flujo.read(SUBIDAS_BLOQUE), b''):
+            resumen.update(bloque)
+            temporal.write(bloque)
+    nombre_final = f'{resumen.hexdigest()}.{extension}'
+    destino = os.path.join(carpeta, nombre_final)
+    if os.path.exists(destino):
+        os.remove(temporal.name)
+        os.utime(destino)  # Renueva el periodo de gracia frente a un borrado concurrente
+    else:
+        os.chmod(temporal.name, 0o644)
+        os.replace(temporal.name, destino)
+    return f'uploads/{nombre_final}'
+
+
+def guardar_subida(archivo):
+    """Guarda un FileStorage de la petición; None si no hay archivo o la extensión no vale."""
+    if not archivo or not allowed_file(archivo.filename):
+        return None
+    return guardar_contenido(archivo.stream, archivo.filename)
+
+
+def importar_subida(ruta):
+    """Pasa un archivo existente de static/ (p. ej. de los datos iniciales) al almacenamiento por hash.
+
+    Devuelve la ruta nueva, o la misma si ya estaba direccionada o el archivo no existe.
+    """
+    origen = os.path.join(current_app.static_folder, ruta or '')
+    if not ruta or SUBIDA_HASH.match(ruta) or not os.path.isfile(origen):
+        return ruta
+    with open(origen, 'rb') as flujo:
+        return guardar_contenido(flujo, ruta)
+
+
+def referencias_subidas(rutas=None):
+    """{ruta: filas que la usan} sumando Restaurante, Menu y ProductoAgricola."""
+    cuenta = defaultdict(int)
+    for modelo in (Restaurante, Menu, ProductoAgricola):
+        consulta = db.session.query(modelo.imagen, db.func.count()).group_by(modelo.imagen)
+        if rutas is not None:
+            consulta = consulta.filter(modelo.imagen.in_(list(rutas)))
+        for ruta, n in consulta:
+            if ruta:
+                cuenta[ruta] += n
+    return cuenta
+
+
+def _antiguedad_subida(ruta):
+    try:
+        return time.time() - os.path.getmtime(os.path.join(current_app.static_folder, ruta))
+    except OSError:
+        return float('inf')
+
+
+def borrar_subidas(rutas):
+    """Borra los archivos de `rutas`, sus variantes y sus metadatos. Hace commit."""
+    rutas = list(rutas)
+    if not rutas:
+        return 0
+    variantes = [r for (r,) in db.session.query(Imagen.ruta)
+                 .filter(Imagen.original.in_(rutas), Imagen.formato != 'original')]
+    if Imagen.query.filter(Imagen.original.in_(rutas)).delete(synchronize_session=False):
+        invalidar_catalogo(CATALOGO_IMAGENES)
+    db.session.commit()  # Primero los metadatos: nunca quedan filas apuntando a archivos borrados
+    for ruta in variantes + rutas:
+        try:
+            os.remove(os.path.join(current_app.static_folder, ruta))
+        except FileNotFoundError:
+            pass
+    return len(rutas)
+
+
+def liberar_subidas(rutas):
+    """Tras un commit, borra las subidas direccionadas de `rutas` que ya nadie referencia.
+
+    Las escritas hace poco se dejan para `flask limpiar-subidas`: pueden pertenecer a
+    una subida concurrente del mismo contenido que todavía no hizo commit.
+    """
+    candidatas = {r for r in rutas if r and SUBIDA_HASH.match(r)}
+    if not candidatas:
+        return 0
+    usadas = referencias_subidas(candidatas)
+    huerfanas = [r for r in candidatas
+                 if not usadas.get(r) and _antiguedad_subida(r) > SUBIDAS_GRACIA_SEGUNDOS]
+    return borrar_subidas(huerfanas)
+
+
+def estatico_inmutable(filename):
+    """True si el contenido de la URL nunca cambia (subida por hash o archivo de static/dist)."""
+    if filename.startswith(ESTATICOS_DIST + '/'):
+        return filename != ESTATICOS_MANIFIESTO
+    return bool(SUBIDA_HASH.match(filename))
+
+
+@bp.after_app_request
+def cache_subidas_inmutables(respuesta):
+    """Las URLs con huella no cambian nunca: caché de un año sin revalidar."""
+    if (request.endpoint == 'static' and respuesta.status_code in (200, 304)
+            and estatico_inmutable((request.view_args or {}).get('filename', ''))):
+        respuesta.cache_control.no_cache = None
+        respuesta.cache_control.public = True
+        respuesta.cache_control.max_age = 31536000
+        respuesta.cache_control.immutable = True
+    return respuesta
+
+
+# === ESTÁTICOS CON HUELLA Y PRECOMPRIMIDOS ===
+# `flask construir-estaticos` copia cada archivo a static/dist con el hash del contenido
+# en el nombre, genera .gz (y .br si está instalado `brotli`) y escribe un manifiesto.
+# url_for('static', ...) emite el nombre con huella y la vista `static` entrega la
+# versión precomprimida que acepte el navegador.
+ESTATICOS_DIST = 'dist'  # Relativa a static/
+ESTATICOS_MANIFIESTO = 'dist/manifest.json'
+ESTATICOS_EXTENSIONES = {'css', 'js', 'svg', 'ico', 'png', 'jpg', 'jpeg', 'jfif', 'gif', 'webp'}
+ESTATICOS_COMPRIMIBLES = {'css', 'js', 'svg', 'ico'}  # Las imágenes ya vienen comprimidas
+CSS_URL_ESTATICA = re.compile(r"""url\((['"]?)/static/([^'")]+)\1\)""")
+
+_manifiesto_estaticos = {'mtime': None, 'rutas': {}}
+
+
+def manifiesto_estaticos():
+    """{ruta lógica: ruta con huella}; se relee si el manifiesto cambia en disco."""
+    ruta = os.path.join(current_app.static_folder, ESTATICOS_MANIFIESTO)
+    try:
+        mtime = os.path.getmtime(ruta)
+    except OSError:
+        return {}
+    if mtime != _manifiesto_estaticos['mtime']:
+        with open(ruta, encoding='utf-8') as archivo:
+            _manifiesto_estaticos.update(mtime=mtime, rutas=json.load(archivo))
+    return _manifiesto_estaticos['rutas']
+
+
+@bp.app_url_defaults
+def estatico_con_huella(endpoint, values):
+    # En modo debug se sirven los archivos tal cual para ver los cambios al momento
+    if endpoint == 'static' and 'filename' in values and not current_app.debug:
+        values['filename'] = manifiesto_estaticos().get(values['filename'], values['filename'])
+
+
+def servir_estatico(filename):
+    """Vista `static`: entrega el .br/.gz de static/dist si el navegador lo acepta."""
+    if filename.startswith(ESTATICOS_DIST + '/'):
+        static = current_app.static_folder
+        for codificacion, extension in (('br', '.br'), ('gzip', '.gz')):
+            comprimido = filename + extension
+            if request.accept_encodings[codificacion] and os.path.isfile(os.path.join(static, comprimido)):
+                respuesta = send_from_directory(static, comprimido, mimetype=mimetypes.guess_type(filename)[0])
+                respuesta.headers['Content-Encoding'] = codificacion
+                respuesta.vary.add('Accept-Encoding')
+                return respuesta
+        respuesta = current_app.send_static_file(filename)
+        respuesta.vary.add('Accept-Encoding')
+        return respuesta
+    return current_app.send_static_file(filename)
+
+
+# === PROCESAMIENTO DE IMÁGENES ===
+# Tras cada subida se generan en segundo plano miniaturas de ancho fijo (JPEG y WebP) y
+# se guardan las dimensiones, para que las plantillas emitan srcset/width/height.
+IMAGEN_ANCHOS = (320, 640)  # Tarjetas de ~300 px a 1x y 2x
+IMAGEN_CALIDAD = 80
+IMAGEN_VARIANTES = 'uploads/variantes'  # Relativa a static/
+IMAGEN_SIZES = '(max-width: 600px) 100vw, 320px'
+
+_procesador_imagenes = None
+
+
+def _ejecutor_imagenes():
+    global _procesador_imagenes
+    if _procesador_imagenes is None:
+        _procesador_imagenes = ThreadPoolExecutor(max_workers=2, thread_name_prefix='imagenes')
+    return _procesador_imagenes
+
+
+def procesar_imagen(ruta):
+    """Genera las variantes de `ruta` (relativa a static/) y registra sus dimensiones.
+
+    Devuelve cuántos archivos quedaron registrados; 0 si la imagen no se puede abrir
+    (se sigue sirviendo el original).
+    """
+    static = current_app.static_folder
+    try:
+        with Image.open(os.path.join(static, ruta)) as original:
+            imagen = ImageOps.exif_transpose(original)
+            imagen.load()
+    except (OSError, ValueError):
+        current_app.logger.warning('No se pudo abrir la imagen %s', ruta)
+        return 0
+
+    ancho, alto = imagen.size
+    filas = [{'ruta': ruta, 'original': ruta, 'formato': 'original', 'ancho': ancho, 'alto': alto}]
+    if imagen.mode != 'RGB':
+        imagen = imagen.convert('RGB')
+
+    os.makedirs(os.path.join(static, IMAGEN_VARIANTES), exist_ok=True)
+    base = secure_filename(os.path.splitext(os.path.basename(ruta))[0]) or 'imagen'
+    base = f'{base}-{hashlib.sha1(ruta.encode()).hexdigest()[:8]}'
+    for w in sorted({w for w in IMAGEN_ANCHOS if w < ancho} | {ancho}):
+        h = max(round(alto * w / ancho), 1)
+        variante = imagen if w == ancho else imagen.resize((w, h), Image.LANCZOS)
+        # JPEG solo para las miniaturas (el original ya existe); WebP en todos los anchos
+        formatos = [('webp', 'webp')] if w == ancho else [('jpeg', 'jpg'), ('webp', 'webp')]
+        for formato, extension in formatos:
+            destino = f'{IMAGEN_VARIANTES}/{base}-{w}.{extension}'
+            variante.save(os.path.join(static, destino), formato.upper(), quality=IMAGEN_CALIDAD)
+            filas.append({'ruta': destino, 'original': ruta, 'formato': formato, 'ancho': w, 'alto': h})
+
+    Imagen.query.filter_by(original=ruta).delete(synchronize_session=False)
+    db.session.execute(db.insert(Imagen), filas)
+    invalidar_catalogo(CATALOGO_IMAGENES)  # Las plantillas leen los metadatos cacheados por versión
+    db.session.commit()
+    return len(filas)
+
+
+def encolar_imagen(ruta):
+    """Procesa `ruta` en el pool de imágenes, fuera del ciclo de la petición."""
+    if not ruta:
+        return None
+    app = current_app._get_current_object()
+
+    def tarea():
+        with app.app_context():
+            try:
+                return procesar_imagen(ruta)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Error procesando la imagen %s', ruta)
+                return 0
+
+    return _ejecutor_imagenes().submit(tarea)
+
+
+def metadatos_imagenes():
+    """{original: {'ancho', 'alto', 'jpeg': [(ancho, ruta)], 'webp': [...]}} cacheado por versión."""
+    def cargar():
+        datos = {}
+        for img in Imagen.query.order_by(Imagen.original, Imagen.ancho):
+            meta = datos.setdefault(img.original, {'jpeg': [], 'webp': []})
+            if img.formato == 'original':
+                meta.update(ancho=img.ancho, alto=img.alto)
+            else:
+                meta[img.formato].append((img.ancho, img.ruta))
+        return datos
+    return cache_catalogo.obtener(('imagenes', version_catalogo(CATALOGO_IMAGENES)), cargar)
+
+
+@bp.app_template_global()
+def imagen_responsive(ruta, alt='', clase=None, sizes=IMAGEN_SIZES):
+    """<picture> con WebP, srcset, width/height y carga diferida para una imagen de static/."""
+    src = url_for('static', filename=ruta)
+    extra = f' class="{escape(clase)}"' if clase else ''
+    meta = metadatos_imagenes().get(ruta)
+    if not meta or 'ancho' not in meta:
+        return Markup(f'<img src="{escape(src)}" alt="{escape(alt)}"{extra} loading="lazy" decoding="async">')
+
+    def srcset(variantes):
+        return ', '.join(f"{escape(url_for('static', filename=r))} {w}w" for w, r in variantes)
+
+    jpeg = meta['jpeg'] + [(meta['ancho'], ruta)]
+    fuente_webp = ''
+    if meta['webp']:
+        fuente_webp = f'<source type="image/webp" srcset="{srcset(meta["webp"])}" sizes="{sizes}">'
+    return Markup(
+        f'<picture>{fuente_webp}'
+        f'<img src="{escape(src)}" srcset="{srcset(jpeg)}" sizes="{sizes}" '
+        f'width="{meta["ancho"]}" height="{meta["alto"]}" alt="{escape(alt)}"{extra} '
+        f'loading="lazy" decoding="async"></picture>'
+    )
 
 
 
@@ -228,17 +1299,183 @@ def calc_total_agricola(carrito_agricola):
     return sum(item.get('subtotal', 0) for item in carrito_agricola)
 
 
+# === CONTADORES INCREMENTALES ===
+def incrementar_contador(modelo, claves, incrementos, valores=None):
+    """Suma `incrementos` a la fila de `modelo` identificada por `claves` (UPSERT atómico).
+
+    `valores` solo se usan si la fila todavía no existe.
+    """
+    incrementar_contadores(modelo, list(claves), list(incrementos),
+                           [{**claves, **(valores or {}), **incrementos}])
+
+
+def incrementar_contadores(modelo, claves, incrementos, filas):
+    """Versión por lotes de incrementar_contador: un solo UPSERT de varias filas.
+
+    Cada fila trae las columnas `claves`, las columnas `incrementos` y, opcionalmente,
+    valores para insertar. Las claves no deben repetirse dentro del lote.
+    """
+    if not filas:
+        return
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialecto == 'postgresql' else sqlite.insert
+        stmt = insert(modelo).values(filas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=claves,
+            set_={col: getattr(modelo, col) + stmt.excluded[col] for col in incrementos}
+        )
+        db.session.execute(stmt)
+        return
+
+    # Otros motores: UPDATE y, si no existía la fila, INSERT
+    for fila in filas:
+        actualizados = modelo.query.filter_by(**{col: fila[col] for col in claves}).update(
+            {getattr(modelo, col): getattr(modelo, col) + fila[col] for col in incrementos},
+            synchronize_session=False
+        )
+        if not actualizados:
+            db.session.add(modelo(**fila))
+
+
+def descontar_stock(cantidades):
+    """Resta `cantidades` ({producto_id: cantidad}) del stock con un solo UPDATE condicional.
+
+    Solo se descuentan las filas con `stock >= cantidad`; la condición se evalúa sobre la
+    fila bloqueada, así que dos compras concurrentes no pueden sobrevender. Devuelve el
+    conjunto de ids descontados: si no coincide con `cantidades`, el llamador debe hacer
+    rollback.
+    """
+    if not cantidades:
+        return set()
+    pedida = db.case(cantidades, value=ProductoAgricola.id)
+    stmt = db.update(ProductoAgricola)\
+        .where(ProductoAgricola.id.in_(list(cantidades)), ProductoAgricola.stock >= pedida)\
+        .values(stock=ProductoAgricola.stock - pedida)\
+        .execution_options(synchronize_session=False)
+    if db.session.get_bind().dialect.update_returning:
+        return set(db.session.execute(stmt.returning(ProductoAgricola.id)).scalars())
+
+    # Motores sin UPDATE ... RETURNING: una sentencia condicional por producto
+    descontados = set()
+    for producto_id, cantidad in cantidades.items():
+        resultado = db.session.execute(
+            db.update(ProductoAgricola)
+            .where(ProductoAgricola.id == producto_id, ProductoAgricola.stock >= cantidad)
+            .values(stock=ProductoAgricola.stock - cantidad)
+            .execution_options(synchronize_session=False)
+        )
+        if resultado.rowcount:
+            descontados.add(producto_id)
+    return descontados
+
+
+# === RESERVAS DE STOCK ===
+RESERVA_TTL = timedelta(minutes=15)
+
+
+def stock_reservado(producto_ids=None, excluir_carrito=None):
+    """{producto_id: unidades reservadas vigentes} con una consulta agrupada."""
+    consulta = db.session.query(ReservaAgricola.producto_id, db.func.sum(ReservaAgricola.cantidad))\
+        .filter(ReservaAgricola.expira > datetime.utcnow())
+    if producto_ids is not None:
+        consulta = consulta.filter(ReservaAgricola.producto_id.in_(list(producto_ids)))
+    if excluir_carrito:
+        consulta = consulta.filter(ReservaAgricola.carrito_id != excluir_carrito)
+    return {pid: int(total) for pid, total in consulta.group_by(ReservaAgricola.producto_id)}
+
+
+def reservar_stock(carrito_id, producto_id, cantidad):
+    """Deja reservadas `cantidad` unidades en total para el carrito y renueva el vencimiento.
+
+    Bloquea la fila del producto para que dos reservas concurrentes no superen el stock.
+    Devuelve (ok, disponible): `disponible` es el máximo que el carrito puede tener reservado.
+    """
+    producto = db.session.query(ProductoAgricola).filter_by(id=producto_id).with_for_update().first()
+    if not producto:
+        return False, 0
+    disponible = (producto.stock or 0) - stock_reservado([producto_id], excluir_carrito=carrito_id).get(producto_id, 0)
+    if cantidad > disponible:
+        return False, max(disponible, 0)
+    expira = datetime.utcnow() + RESERVA_TTL
+    reserva = db.session.get(ReservaAgricola, (carrito_id, producto_id))
+    if reserva:
+        reserva.cantidad = cantidad
+        reserva.expira = expira
+    else:
+        db.session.add(ReservaAgricola(carrito_id=carrito_id, producto_id=producto_id,
+                                       cantidad=cantidad, expira=expira))
+    return True, disponible
+
+
+def liberar_reservas(carrito_id, producto_id=None):
+    consulta = ReservaAgricola.query.filter_by(carrito_id=carrito_id)
+    if producto_id is not None:
+        consulta = consulta.filter_by(producto_id=producto_id)
+    return consulta.delete(synchronize_session=False)
+
+
+def liberar_reservas_vencidas():
+    """Borra en bloque las reservas vencidas. Devuelve cuántas se liberaron.
+
+    Las vencidas ya no cuentan en stock_reservado(); esto solo limpia la tabla y se
+    ejecuta con `flask liberar-reservas` desde cron, no desde los workers.
+    """
+    return ReservaAgricola.query.filter(ReservaAgricola.expira <= datetime.utcnow())\
+        .delete(synchronize_session=False)
+
+
+def obtener_restaurantes_populares(limite=3):
+    """Top de restaurantes por número de pedidos, leído de los contadores."""
+    total = db.func.coalesce(ContadorRestaurante.total_pedidos, 0)
+    return db.session.query(Restaurante, total.label('total_pedidos'))\
+        .outerjoin(ContadorRestaurante, ContadorRestaurante.restaurante_id == Restaurante.id)\
+        .order_by(total.desc(), Restaurante.id)\
+        .limit(limite)\
+        .all()
+
+
+def epoca_popularidad(bloquear=False):
+    """Época vigente del puntaje de popularidad.
+
+    Con `bloquear` la fila queda bloqueada en modo compartido hasta el commit, para que
+    `rebasar-popularidad` no reescale los puntajes entre la lectura y el UPSERT.
+    """
+    consulta = db.session.query(EpocaPopularidad.epoca).filter_by(id=1)
+    if bloquear:
+        consulta = consulta.with_for_update(read=True)
+    return consulta.scalar() or POPULARIDAD_EPOCA
+
+
+def peso_popularidad(fecha, epoca):
+    """Peso de una venta en `fecha` para el puntaje con decaimiento (ver PopularidadMenu)."""
+    dias = (fecha - epoca).total_seconds() / 86400
+    return 2 ** (dias / POPULARIDAD_VIDA_MEDIA_DIAS)
+
+
+def obtener_menus_populares(restaurante_id, limite=3, recientes=False):
+    """Top de menús de un restaurante: históricos o, con `recientes`, de los últimos días."""
+    orden = PopularidadMenu.puntaje if recientes else PopularidadMenu.total_pedidos
+    return db.session.query(Menu, PopularidadMenu.total_pedidos, Restaurante)\
+        .join(PopularidadMenu, PopularidadMenu.menu_id == Menu.id)\
+        .join(Restaurante, PopularidadMenu.restaurante_id == Restaurante.id)\
+        .filter(PopularidadMenu.restaurante_id == restaurante_id)\
+        .order_by(orden.desc(), Menu.id)\
+        .limit(limite)\
+        .all()
+
+
 
 
 # Ruta principal: redirige a restaurantes si hay sesión activa, o a login si no
-@app.route('/')
+@bp.route('/')
 def index():
     if 'user_id' in session or 'guest' in session:
-        return redirect(url_for('restaurantes'))
-    return redirect(url_for('login'))
+        return redirect(url_for('main.restaurantes'))
+    return redirect(url_for('main.login'))
 
 # Ruta para el inicio de sesión
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form['email']  # Obtener correo del formulario
@@ -247,23 +1484,23 @@ def login():
         is_client = email.endswith('@gmail.com')  # Verificar si es cliente
         if not (is_admin or is_client):
             flash('Debes usar un correo @gmail.com para clientes o @admin.saboresexpress.com para administradores.')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         usuario = Usuario.query.filter_by(email=email, password=password).first()  # Buscar usuario
         if usuario:
             if is_admin:
                 session['admin_id'] = usuario.id  # Guardar ID de administrador en la sesión
                 flash('Inicio de sesión de administrador exitoso.')
-                return redirect(url_for('admin'))
+                return redirect(url_for('main.admin'))
             else:
                 session['user_id'] = usuario.id  # Guardar ID de usuario en la sesión
                 session.pop('guest', None)  # Eliminar modo invitado
                 flash('Inicio de sesión exitoso.')
-                return redirect(url_for('restaurantes'))
+                return redirect(url_for('main.restaurantes'))
         flash('Correo o contraseña incorrectos.')
     return render_template('login.html')
 
 # Ruta para el registro de usuarios
-@app.route('/registro', methods=['GET', 'POST'])
+@bp.route('/registro', methods=['GET', 'POST'])
 def registro():
     if request.method == 'POST':
         nombre = request.form['nombre']  # Obtener nombre del formulario
@@ -273,37 +1510,46 @@ def registro():
         is_client = email.endswith('@gmail.com')  # Verificar si es cliente
         if not (is_admin or is_client):
             flash('Debes usar un correo @gmail.com para clientes o @admin.saboresexpress.com para administradores.')
-            return redirect(url_for('registro'))
+            return redirect(url_for('main.registro'))
         if Usuario.query.filter_by(email=email).first():
             flash('El correo ya está registrado.')
-            return redirect(url_for('registro'))
+            return redirect(url_for('main.registro'))
         usuario = Usuario(nombre=nombre, email=email, password=password)  # Crear nuevo usuario
         db.session.add(usuario)
         db.session.commit()
         flash('Registro exitoso. Por favor, inicia sesión.')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('registro.html')
 
+def cliente_google():
+    """Cliente OAuth de Google; authlib se enlaza a la aplicación en el primer inicio de sesión."""
+    oauth = current_app.extensions.get('authlib.integrations.flask_client')
+    if oauth is None:
+        oauth = flask_client.OAuth(current_app)
+    return oauth.create_client('google') or oauth.register(**GOOGLE_OAUTH)
+
+
 # Ruta para iniciar sesión con Google
-@app.route('/login/google')
+@bp.route('/login/google')
 def login_google():
-    redirect_uri = url_for('authorize', _external=True)  # Obtener URI de redirección
-    return google.authorize_redirect(redirect_uri)  # Redirigir a Google para autenticación
+    redirect_uri = url_for('main.authorize', _external=True)  # Obtener URI de redirección
+    return cliente_google().authorize_redirect(redirect_uri)  # Redirigir a Google para autenticación
 
 # Ruta para manejar la autorización de Google
-@app.route('/authorize')
+@bp.route('/authorize')
 def authorize():
     try:
+        google = cliente_google()
         token = google.authorize_access_token()  # Obtener token de acceso
         user_info = google.parse_id_token(token, nonce=None)  # Obtener información del usuario
         email = user_info['email']
         nombre = user_info['name']
         if email.endswith('@admin.saboresexpress.com'):
             flash('Los administradores deben usar la página de inicio de sesión.')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         if not email.endswith('@gmail.com'):
             flash('Los clientes deben usar un correo @gmail.com.')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         usuario = Usuario.query.filter_by(email=email).first()
         if not usuario:
             usuario = Usuario(nombre=nombre, email=email, password='')  # Crear usuario si no existe
@@ -312,102 +1558,105 @@ def authorize():
         session['user_id'] = usuario.id  # Guardar ID de usuario en la sesión
         session.pop('guest', None)  # Eliminar modo invitado
         flash('Inicio de sesión con Google exitoso.')
-        return redirect(url_for('restaurantes'))
+        return redirect(url_for('main.restaurantes'))
     except Exception as e:
         flash(f'Error al autenticar con Google: {str(e)}')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
 # Ruta para entrar como invitado
-@app.route('/guest')
+@bp.route('/guest')
 def guest():
     session['guest'] = True  # Establecer modo invitado
     flash('Has entrado como invitado.')
-    return redirect(url_for('restaurantes'))
+    return redirect(url_for('main.restaurantes'))
 
 # Ruta para cerrar sesión
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.pop('user_id', None)  # Eliminar ID de usuario
     session.pop('admin_id', None)  # Eliminar ID de administrador
     session.pop('guest', None)  # Eliminar modo invitado
-    session.pop('carrito', None)  # Eliminar carrito
+    carrito = Carrito.actual()
+    if carrito:
+        liberar_reservas(carrito.id)
+        db.session.delete(carrito)  # Eliminar carrito (y sus ítems)
+        db.session.commit()
+    session.pop('carrito_id', None)
     flash('Sesión cerrada.')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 # Ruta para mostrar los restaurantes
-@app.route('/restaurantes')
+@bp.route('/restaurantes')
 def restaurantes():
     if 'user_id' not in session and 'guest' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     # === BUSCAR RESTAURANTES ===
     busqueda = request.args.get('busqueda', '').strip()
-    query = Restaurante.query
     if busqueda:
-        query = query.filter(Restaurante.nombre.ilike(f'%{busqueda}%'))
-    restaurantes = query.all()
+        resultados = buscar_catalogo(busqueda, tipos=('restaurante',), limite=100)
+        restaurantes = cargar_en_orden(Restaurante, [ref_id for _, ref_id, _, _ in resultados])
+    else:
+        restaurantes = catalogo_restaurantes()
 
     # === PRODUCTOS AGRÍCOLAS (solo con stock) ===
-    # MOSTRAR TODOS (para probar)
-    productos_agricolas = ProductoAgricola.query.all()
-
-    # === RESTAURANTES POPULARES (basado en pedidos) ===
-    restaurantes_populares = db.session.query(
-        Restaurante, 
-        db.func.count(Pedido.id).label('total_pedidos')
-    ).join(Pedido, isouter=True)\
-     .group_by(Restaurante.id)\
-     .order_by(db.desc('total_pedidos'))\
-     .limit(3)\
-     .all()
+    productos_agricolas = catalogo_agricola()
 
-    # Convertir a lista de tuplas: (restaurante, count)
-    restaurantes_populares = [(r, count) for r, count in restaurantes_populares]
+    # === RESTAURANTES POPULARES (contadores precalculados) ===
+    restaurantes_populares = [(r, count) for r, count in obtener_restaurantes_populares(3)]
+
+    # === CARRITO (todos los restaurantes) ===
+    carrito = Carrito.actual()
+    carrito_por_restaurante = carrito.por_restaurante() if carrito else []
+    total_carrito = sum(i.precio * i.cantidad for _, items in carrito_por_restaurante for i in items)
 
     return render_template(
         'restaurantes.html',
         restaurantes=restaurantes,
         productos_agricolas=productos_agricolas,
         restaurantes_populares=restaurantes_populares,
+        carrito_por_restaurante=carrito_por_restaurante,
+        total_carrito=total_carrito,
         busqueda=busqueda
     )
 
 # Ruta para mostrar el menú de un restaurante
-@app.route('/menu/<int:restaurante_id>')
+@bp.route('/menu/<int:restaurante_id>')
 def menu(restaurante_id):
     if 'user_id' not in session and 'guest' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
-    # Obtener restaurante
-    restaurante = Restaurante.query.get_or_404(restaurante_id)
+    # Obtener restaurante (desde la caché del catálogo)
+    restaurante = catalogo_restaurante(restaurante_id)
+    if restaurante is None:
+        abort(404)
 
     # Búsqueda
     busqueda = request.args.get('busqueda', '')
     if busqueda:
-        menus = Menu.query.filter_by(restaurante_id=restaurante_id)\
-            .filter(Menu.nombre.ilike(f'%{busqueda}%'))\
-            .all()
+        resultados = buscar_catalogo(busqueda, restaurante_id=restaurante_id, tipos=('menu',), limite=100)
+        menus = cargar_en_orden(Menu, [ref_id for _, ref_id, _, _ in resultados])
     else:
-        menus = Menu.query.filter_by(restaurante_id=restaurante_id).all()
-
-    # Menús populares (3 más pedidos)
-    menus_populares = db.session.query(Menu, db.func.count(PedidoItem.id), Restaurante)\
-        .join(PedidoItem, isouter=True)\
-        .join(Restaurante, Menu.restaurante_id == Restaurante.id)\
-        .group_by(Menu.id, Restaurante.id)\
-        .order_by(db.func.count(PedidoItem.id).desc())\
-        .limit(3)\
-        .all()
-
-    # === CARRITO: Asegurar formato de diccionario ===
-    if 'carrito' not in session or not isinstance(session['carrito'], dict):
-        session['carrito'] = {}
-
-    restaurante_id_str = str(restaurante_id)
-    carrito_items = session['carrito'].get(restaurante_id_str, [])
+        menus = catalogo_menus(restaurante_id)
+
+    # Menús populares del restaurante (3 más pedidos, o de esta semana)
+    populares = request.args.get('populares', '')
+    menus_populares = obtener_menus_populares(restaurante_id, 3, recientes=(populares == 'semana'))
+    if len(menus_populares) < 3:
+        # Completar con platos aún sin pedidos, como hacía el LEFT JOIN original
+        vistos = {m.id for m, _, _ in menus_populares}
+        for m in catalogo_menus(restaurante_id):
+            if len(menus_populares) >= 3:
+                break
+            if m['id'] not in vistos:
+                menus_populares.append((m, 0, restaurante))
+
+    # === CARRITO DEL RESTAURANTE ===
+    carrito = Carrito.actual()
+    carrito_items = carrito.items_de(restaurante_id) if carrito else []
 
     # Calcular total
-    total = sum(item['precio'] * item['cantidad'] for item in carrito_items)
+    total = sum(item.precio * item.cantidad for item in carrito_items)
 
     return render_template(
         'menu.html',
@@ -415,6 +1664,7 @@ def menu(restaurante_id):
         menus=menus,
         busqueda=busqueda,
         menus_populares=menus_populares,
+        populares=populares,
         carrito_items=carrito_items,
         total=total,
         current_date=datetime.now().strftime('%Y-%m-%d')  # Añadido si usas fecha mínima
@@ -422,65 +1672,37 @@ def menu(restaurante_id):
 
 
 # Ruta para agregar ítems al carrito (botón normal)
-@app.route('/agregar_carrito/<int:restaurante_id>/<int:menu_id>', methods=['POST'])
+@bp.route('/agregar_carrito/<int:restaurante_id>/<int:menu_id>', methods=['POST'])
 def agregar_carrito(restaurante_id, menu_id):
     if 'user_id' not in session:
         flash('Debes iniciar sesión para agregar al carrito.')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     cantidad = int(request.form.get('cantidad', 1))
-    restaurante_id_str = str(restaurante_id)
-
-    # Asegurar formato de diccionario
-    if 'carrito' not in session or not isinstance(session['carrito'], dict):
-        session['carrito'] = {}
-
-    if restaurante_id_str not in session['carrito']:
-        session['carrito'][restaurante_id_str] = []
-
-    carrito_restaurante = session['carrito'][restaurante_id_str]
-
-    # Buscar si ya existe
-    for item in carrito_restaurante:
-        if item['menu_id'] == menu_id:
-            item['cantidad'] += cantidad
-            session.modified = True
-            return redirect(url_for('menu', restaurante_id=restaurante_id))
-
-    # Agregar nuevo ítem
-    menu = Menu.query.get(menu_id)
-    if menu:
-        nuevo_item = {
-            'menu_id': menu_id,
-            'nombre': menu.nombre,
-            'precio': float(menu.precio),
-            'cantidad': cantidad,
-            'restaurante_id': restaurante_id
-        }
-        carrito_restaurante.append(nuevo_item)
-        session['carrito'][restaurante_id_str] = carrito_restaurante
-        session.modified = True
 
-    return redirect(url_for('menu', restaurante_id=restaurante_id))
+    # Suma al ítem existente o lo crea con los datos del menú
+    carrito = Carrito.actual(crear=True)
+    if carrito.agregar(restaurante_id, menu_id, cantidad):
+        db.session.commit()
+
+    return redirect(url_for('main.menu', restaurante_id=restaurante_id))
 
 # Ruta para eliminar ítems del carrito
-@app.route('/eliminar_carrito/<int:restaurante_id>/<int:menu_id>', methods=['POST'])
+@bp.route('/eliminar_carrito/<int:restaurante_id>/<int:menu_id>', methods=['POST'])
 def eliminar_carrito(restaurante_id, menu_id):
     if 'user_id' not in session and 'guest' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     if 'guest' in session:
         flash('Los invitados no pueden modificar el carrito. Por favor, inicia sesión.')
-        return redirect(url_for('menu', restaurante_id=restaurante_id))
-    if 'carrito' not in session or str(restaurante_id) not in session['carrito']:
+        return redirect(url_for('main.menu', restaurante_id=restaurante_id))
+    carrito = Carrito.actual()
+    if not carrito:
         flash('El carrito está vacío.')
-        return redirect(url_for('menu', restaurante_id=restaurante_id))
-    carrito = session['carrito'][str(restaurante_id)]
-    session['carrito'][str(restaurante_id)] = [item for item in carrito if item['menu_id'] != menu_id]  # Eliminar ítem
-    if not session['carrito'][str(restaurante_id)]:
-        session['carrito'].pop(str(restaurante_id), None)  # Eliminar carrito si está vacío
-    session.modified = True  # Marcar la sesión como modificada
+        return redirect(url_for('main.menu', restaurante_id=restaurante_id))
+    carrito.eliminar(restaurante_id, menu_id)  # Eliminar ítem
+    db.session.commit()
     flash('Ítem eliminado del carrito.')
-    return redirect(url_for('menu', restaurante_id=restaurante_id))
+    return redirect(url_for('main.menu', restaurante_id=restaurante_id))
 
 
 
@@ -490,14 +1712,15 @@ def eliminar_carrito(restaurante_id, menu_id):
 #  RUTAS DE MERCADO AGRÍCOLA
 # -------------------------------------------------
 # Ruta del mercado agrícola
-@app.route('/agricola')
+@bp.route('/agricola')
 @login_required_or_guest
 def agricola_market():
-    productos = ProductoAgricola.query.filter(ProductoAgricola.stock > 0).all()
-    print(f"DEBUG: Productos encontrados: {len(productos)}")
-    for p in productos:
-        print(f"DEBUG: - {p.nombre} (Stock: {p.stock})")
-    
+    # El catálogo está cacheado; lo disponible (stock - reservas vigentes, incluidas las de
+    # este carrito) se calcula aparte con una consulta agrupada sobre las reservas
+    reservado = stock_reservado()
+    productos = [dict(p, disponible=max(p['stock'] - reservado.get(p['id'], 0), 0))
+                 for p in catalogo_agricola()]
+
     return render_template('agricola_market.html',
                            productos=productos,
                            carrito_agricola=session.get('carrito_agricola', []),
@@ -505,29 +1728,37 @@ def agricola_market():
 
 
 # Añadir al carrito agrícola
-@app.route('/agricola/add/<int:agricola_id>', methods=['POST'])
+@bp.route('/agricola/add/<int:agricola_id>', methods=['POST'])
 def agregar_carrito_agricola(agricola_id):
-    prod = ProductoAgricola.query.get_or_404(agricola_id)
     cant = int(request.form['cantidad'])
-    
-    if cant > prod.stock:
-        flash('No hay suficiente stock disponible')
-        return redirect(url_for('agricola_market'))
+    if cant < 1:
+        flash('La cantidad debe ser al menos 1')
+        return redirect(url_for('main.agricola_market'))
 
     carrito = session.get('carrito_agricola', [])
     
     # Buscar si el producto ya está en el carrito
     item_existente = None
     for item in carrito:
-        if item['id'] == prod.id:
+        if item['id'] == agricola_id:
             item_existente = item
             break
-    
+
+    # Reservar el total del carrito para este producto (bloquea la fila del producto)
+    carrito_sesion = Carrito.actual(crear=True)
+    total = cant + (item_existente['cantidad'] if item_existente else 0)
+    ok, disponible = reservar_stock(carrito_sesion.id, agricola_id, total)
+    prod = db.session.get(ProductoAgricola, agricola_id)  # Ya cargado por reservar_stock
+    if not prod:
+        db.session.rollback()
+        abort(404)
+    if not ok:
+        db.session.rollback()
+        flash(f'No hay suficiente stock disponible (puedes reservar hasta {disponible} en total)')
+        return redirect(url_for('main.agricola_market'))
+    db.session.commit()
+
     if item_existente:
-        # Verificar que no exceda el stock al actualizar
-        if item_existente['cantidad'] + cant > prod.stock:
-            flash('No hay suficiente stock disponible')
-            return redirect(url_for('agricola_market'))
         item_existente['cantidad'] += cant
         item_existente['subtotal'] = item_existente['cantidad'] * prod.precio_venta
     else:
@@ -541,35 +1772,65 @@ def agregar_carrito_agricola(agricola_id):
     
     session['carrito_agricola'] = carrito
     flash('Producto añadido al carrito')
-    return redirect(url_for('agricola_market'))
+    return redirect(url_for('main.agricola_market'))
 
 # Eliminar del carrito agrícola
-@app.route('/agricola/remove/<int:agricola_id>', methods=['POST'])
+@bp.route('/agricola/remove/<int:agricola_id>', methods=['POST'])
 def eliminar_carrito_agricola(agricola_id):
     carrito = session.get('carrito_agricola', [])
     session['carrito_agricola'] = [i for i in carrito if i['id'] != agricola_id]
+    carrito_sesion = Carrito.actual()
+    if carrito_sesion:
+        liberar_reservas(carrito_sesion.id, agricola_id)
+        db.session.commit()
     flash('Producto eliminado del carrito')
-    return redirect(url_for('agricola_market'))
+    return redirect(url_for('main.agricola_market'))
 
 # Confirmar pedido agrícola
-@app.route('/agricola/confirmar', methods=['POST'])
+@bp.route('/agricola/confirmar', methods=['POST'])
 def confirmar_pedido_agricola():
+    clave, previa = reclamar_clave('agricola')
+    if previa:
+        flash('¡Pedido agrícola confirmado! Te contactaremos pronto.')
+        return redirect(url_for('main.restaurantes'))
     carrito = session.get('carrito_agricola', [])
     if not carrito:
         flash('Carrito vacío')
-        return redirect(url_for('agricola_market'))
+        return redirect(url_for('main.agricola_market'))
 
-    # Verificar stock antes de procesar
+    cantidades = defaultdict(int)
     for item in carrito:
-        producto = ProductoAgricola.query.get(item['id'])
-        if producto.stock < item['cantidad']:
-            flash(f'Stock insuficiente para {producto.nombre}')
-            return redirect(url_for('agricola_market'))
-
-    # Restar stock y crear pedido
-    for item in carrito:
-        producto = ProductoAgricola.query.get(item['id'])
-        producto.stock -= item['cantidad']
+        cantidades[item['id']] += item['cantidad']
+
+    # Las reservas vigentes del carrito se convierten en venta; solo las líneas cuya
+    # reserva venció (o falta) se vuelven a reservar contra el stock actual
+    carrito_sesion = Carrito.actual(crear=True)
+    reservas = dict(db.session.query(ReservaAgricola.producto_id, ReservaAgricola.cantidad)
+                    .filter(ReservaAgricola.carrito_id == carrito_sesion.id,
+                            ReservaAgricola.expira > datetime.utcnow(),
+                            ReservaAgricola.producto_id.in_(list(cantidades))))
+    disponibles = {}
+    for producto_id, cantidad in cantidades.items():
+        if reservas.get(producto_id, 0) < cantidad:
+            ok, disponible = reservar_stock(carrito_sesion.id, producto_id, cantidad)
+            if not ok:
+                disponibles[producto_id] = disponible
+
+    # Restar el stock de todas las líneas en una sola sentencia
+    if not disponibles:
+        faltantes = set(cantidades) - descontar_stock(cantidades)
+        if faltantes:
+            disponibles = dict(db.session.query(ProductoAgricola.id, ProductoAgricola.stock)
+                               .filter(ProductoAgricola.id.in_(faltantes)))
+            disponibles.update({pid: 0 for pid in faltantes if pid not in disponibles})
+    if disponibles:
+        db.session.rollback()
+        nombres = {item['id']: item['nombre'] for item in carrito}
+        for producto_id, disponible in disponibles.items():
+            flash(f'Stock insuficiente para {nombres[producto_id]}: '
+                  f'pediste {cantidades[producto_id]}, quedan {disponible or 0}')
+        return redirect(url_for('main.agricola_market'))
+    liberar_reservas(carrito_sesion.id)
 
     # Crear pedido agrícola
     pedido = PedidoAgricola(
@@ -594,10 +1855,12 @@ def confirmar_pedido_agricola():
         )
         db.session.add(detalle)
 
+    if clave:
+        clave.pedido_id = pedido.id
     db.session.commit()
     session.pop('carrito_agricola', None)
     flash('¡Pedido agrícola confirmado! Te contactaremos pronto.')
-    return redirect(url_for('restaurantes'))
+    return redirect(url_for('main.restaurantes'))
 
 
 
@@ -605,18 +1868,18 @@ def confirmar_pedido_agricola():
 
 
 # Ruta para seleccionar método de pago
-@app.route('/seleccionar_pago', methods=['POST'])
+@bp.route('/seleccionar_pago', methods=['POST'])
 def seleccionar_pago():
     if 'user_id' not in session and 'guest' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     if 'guest' in session:
         flash('Los invitados no pueden seleccionar método de pago. Por favor, inicia sesión.')
-        return redirect(url_for('restaurantes'))
+        return redirect(url_for('main.restaurantes'))
     
     metodo_pago = request.form.get('metodo_pago')
     if metodo_pago not in ['tarjeta', 'banca_movil', 'transferencia']:
         flash('Método de pago inválido.')
-        return redirect(url_for('restaurantes'))
+        return redirect(url_for('main.restaurantes'))
     
     # === GUARDAR DETALLES ===
     if metodo_pago == 'tarjeta':
@@ -625,21 +1888,21 @@ def seleccionar_pago():
         cvv = request.form.get('cvv')
         if not (numero_tarjeta and fecha_vencimiento and cvv):
             flash('Por favor completa todos los datos de la tarjeta.')
-            return redirect(url_for('restaurantes'))
+            return redirect(url_for('main.restaurantes'))
         session['metodo_pago_detalle'] = f"Número: {numero_tarjeta[-4:]} **** **** ****"
     elif metodo_pago == 'banca_movil':
         numero_celular = request.form.get('numero_celular')
         nombre_titular = request.form.get('nombre_titular')
         if not (numero_celular and nombre_titular):
             flash('Por favor completa todos los datos de banca móvil.')
-            return redirect(url_for('restaurantes'))
+            return redirect(url_for('main.restaurantes'))
         session['metodo_pago_detalle'] = f"Celular: {numero_celular}"
     elif metodo_pago == 'transferencia':
         numero_cuenta = request.form.get('numero_cuenta')
         nombre_titular = request.form.get('nombre_titular')
         if not (numero_cuenta and nombre_titular):
             flash('Por favor completa todos los datos de la transferencia.')
-            return redirect(url_for('restaurantes'))
+            return redirect(url_for('main.restaurantes'))
         session['metodo_pago_detalle'] = f"Cuenta: {numero_cuenta[-4:]} ****"
 
     session['metodo_pago'] = metodo_pago
@@ -648,13 +1911,13 @@ def seleccionar_pago():
     # OBTENER RESTAURANTE_ID DEL FORMULARIO
     restaurante_id = request.form.get('restaurante_id')
     if restaurante_id:
-        return redirect(url_for('menu', restaurante_id=restaurante_id))
+        return redirect(url_for('main.menu', restaurante_id=restaurante_id))
     else:
-        return redirect(url_for('restaurantes'))
+        return redirect(url_for('main.restaurantes'))
     
 
 
-@app.route('/detalle_pago', methods=['GET', 'POST'])
+@bp.route('/detalle_pago', methods=['GET', 'POST'])
 @login_required_or_guest
 def detalle_pago():
     """Muestra y procesa los detalles de pago"""
@@ -668,143 +1931,365 @@ def detalle_pago():
         session['metodo_pago_detalle'] = metodo_pago_detalle
         
         flash('Método de pago guardado correctamente.')
-        return redirect(url_for('agricola_market'))
+        return redirect(url_for('main.agricola_market'))
     
     return render_template('detalle_pago.html')
 
 
 
-@app.route('/confirmar_pedido/<int:restaurante_id>', methods=['POST'])
-def confirmar_pedido(restaurante_id):
-    # === VALIDACIONES ===
-    if 'user_id' not in session and 'guest' not in session:
-        flash('Debes iniciar sesión.')
-        return redirect(url_for('login'))
-    if 'guest' in session:
-        flash('Los invitados no pueden confirmar pedidos.')
-        return redirect(url_for('menu', restaurante_id=restaurante_id))
-    if 'carrito' not in session or str(restaurante_id) not in session['carrito']:
-        flash('El carrito está vacío.')
-        return redirect(url_for('menu', restaurante_id=restaurante_id))
+# === IDEMPOTENCIA DE CONFIRMACIONES ===
+@bp.app_template_global()
+def clave_idempotencia():
+    """Clave nueva para el campo oculto de los formularios de confirmación."""
+    return uuid.uuid4().hex
+
+
+def reclamar_clave(tipo):
+    """Registra la clave del formulario en la transacción actual.
+
+    Devuelve (fila, previa): `fila` si es el primer envío con esa clave; `previa` si ya
+    existía, también cuando otra petición concurrente con la misma clave se confirma
+    primero (el INSERT espera a esa transacción y falla por clave duplicada). Sin clave
+    en el formulario devuelve (None, None) y el pedido se procesa como antes.
+    """
+    clave = (request.form.get('clave_idempotencia') or '')[:64]
+    if not clave:
+        return None, None
+    previa = db.session.get(ClaveIdempotencia, clave)
+    if previa is None:
+        fila = ClaveIdempotencia(clave=clave, tipo=tipo, usuario_id=session.get('user_id'))
+        db.session.add(fila)
+        try:
+            db.session.flush()
+            return fila, None
+        except IntegrityError:
+            db.session.rollback()
+            previa = db.session.get(ClaveIdempotencia, clave)
+    if previa.tipo != tipo or previa.usuario_id != session.get('user_id'):
+        abort(409)
+    return None, previa
+
+
+IVA = 0.16
+CODIGO_PEDIDO_INTENTOS = 5  # Códigos a probar antes de rendirse si todos colisionan
+
+
+def generar_codigo_pedido():
+    return str(uuid.uuid4())[:8].upper()
+
+
+def reservar_codigos_pedido(partes):
+    """Registra en codigos_pedido los códigos de un pedido de `partes` restaurantes.
+
+    Con varios restaurantes cada pedido lleva el mismo código con un sufijo (-1, -2...).
+    Si alguno ya existía se descartan los insertados y se prueba con un código nuevo.
+    Devuelve la lista de códigos, uno por parte.
+    """
+    dialecto = db.session.get_bind().dialect.name
+    for _ in range(CODIGO_PEDIDO_INTENTOS):
+        codigo = generar_codigo_pedido()
+        codigos = [codigo] if partes == 1 else [f'{codigo}-{n}' for n in range(1, partes + 1)]
+        if dialecto in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialecto == 'postgresql' else sqlite.insert
+            stmt = insert(CodigoPedido).values([{'codigo': c} for c in codigos])\
+                .on_conflict_do_nothing().returning(CodigoPedido.codigo)
+            nuevos = db.session.execute(stmt).scalars().all()
+            if len(nuevos) == len(codigos):
+                return codigos
+            if nuevos:
+                db.session.execute(db.delete(CodigoPedido).where(CodigoPedido.codigo.in_(nuevos)))
+            continue
+
+        # Otros motores: INSERT dentro de un SAVEPOINT
+        try:
+            with db.session.begin_nested():
+                db.session.add_all(CodigoPedido(codigo=c) for c in codigos)
+            return codigos
+        except IntegrityError:
+            pass
+    raise RuntimeError('No se encontró un código de pedido libre')
+
+
+def registrar_pedidos(carrito_sesion, items, datos):
+    """Crea un pedido por restaurante con los ítems del carrito, sin hacer commit.
+
+    Los precios de todos los restaurantes se validan contra el menú con una sola
+    consulta IN; los pedidos se insertan en un lote y sus líneas con un único INSERT de
+    varias filas, así el número de consultas no crece con el tamaño del carrito.
+    Los códigos se reservan con reservar_codigos_pedido; con varios restaurantes
+    comparten la base y llevan un sufijo (-1, -2...).
+
+    Devuelve (pedidos, resumenes, errores): listas paralelas de Pedido y de
+    {restaurante_id, items, subtotal, iva, total}. Si hay errores (precio cambiado o
+    plato retirado) no se escribe nada y los ítems del carrito quedan corregidos para
+    que el cliente los revise.
+    """
+    actuales = {
+        m.id: (m.restaurante_id, float(m.precio))
+        for m in db.session.query(Menu.id, Menu.restaurante_id, Menu.precio)
+                   .filter(Menu.id.in_([i.menu_id for i in items]))
+    }
+    errores = []
+    grupos = {}
+    for item in items:
+        restaurante_id, precio = actuales.get(item.menu_id, (None, None))
+        if restaurante_id != item.restaurante_id:
+            errores.append(f'{item.nombre} ya no está disponible y se quitó del carrito.')
+            db.session.delete(item)
+        elif abs(precio - item.precio) >= 0.005:
+            errores.append(f'El precio de {item.nombre} cambió de ${item.precio:.2f} a ${precio:.2f}.')
+            item.precio = precio
+        grupos.setdefault(item.restaurante_id, []).append({
+            'menu_id': item.menu_id,
+            'nombre': item.nombre,
+            'cantidad': item.cantidad,
+            'precio': item.precio,
+            'subtotal': item.cantidad * item.precio
+        })
+    if errores:
+        return [], [], errores
+
+    codigos = reservar_codigos_pedido(len(grupos))
+    resumenes = []
+    pedidos = []
+    for codigo, (restaurante_id, lineas) in zip(codigos, grupos.items()):
+        subtotal = sum(linea['subtotal'] for linea in lineas)
+        iva = round(subtotal * IVA, 2)
+        resumenes.append({'restaurante_id': restaurante_id, 'items': lineas,
+                          'subtotal': subtotal, 'iva': iva, 'total': subtotal + iva})
+        pedidos.append(Pedido(
+            restaurante_id=restaurante_id,
+            total=subtotal + iva,
+            codigo_pedido=codigo,
+            **datos
+        ))
+    db.session.add_all(pedidos)
+    db.session.flush()  # Un INSERT por lotes que devuelve los ids
+
+    db.session.execute(db.insert(PedidoItem).values([
+        {'pedido_id': pedido.id, 'fecha': pedido.fecha, 'menu_id': l['menu_id'],
+         'cantidad': l['cantidad'], 'precio': l['precio']}
+        for pedido, resumen in zip(pedidos, resumenes) for l in resumen['items']
+    ]))
+
+    # Contadores en la misma transacción, un UPSERT por tabla
+    epoca = epoca_popularidad(bloquear=True)
+    incrementar_contadores(ContadorRestaurante, ['restaurante_id'], ['total_pedidos'], [
+        {'restaurante_id': p.restaurante_id, 'total_pedidos': 1} for p in pedidos
+    ])
+    # Cada pedido cuenta en el día de su propia fecha (un lote puede cruzar la medianoche)
+    ventas = {}
+    for p in pedidos:
+        venta = ventas.setdefault((p.restaurante_id, p.fecha.date()), {
+            'restaurante_id': p.restaurante_id, 'dia': p.fecha.date(), 'pedidos': 0, 'ingresos': 0
+        })
+        venta['pedidos'] += 1
+        venta['ingresos'] += p.total
+    incrementar_contadores(VentaDiaria, ['restaurante_id', 'dia'], ['pedidos', 'ingresos'], list(ventas.values()))
+    incrementar_contadores(PopularidadMenu, ['menu_id'], ['total_pedidos', 'puntaje'], [
+        {'menu_id': l['menu_id'], 'restaurante_id': r['restaurante_id'], 'total_pedidos': 1,
+         'puntaje': peso_popularidad(p.fecha, epoca)}
+        for p, r in zip(pedidos, resumenes) for l in r['items']
+    ])
+
+    if len(grupos) == 1:
+        carrito_sesion.vaciar(next(iter(grupos)))
+    else:
+        CarritoItem.query.filter(CarritoItem.carrito_id == carrito_sesion.id,
+                                 CarritoItem.restaurante_id.in_(list(grupos)))\
+            .delete(synchronize_session=False)
+    return pedidos, resumenes, []
+
+
+def registrar_pedido(carrito_sesion, restaurante_id, items, datos):
+    """registrar_pedidos para un solo restaurante: devuelve (pedido, resumen, errores)."""
+    pedidos, resumenes, errores = registrar_pedidos(carrito_sesion, items, datos)
+    if errores:
+        return None, None, errores
+    return pedidos[0], resumenes[0], []
+
+
+def leer_datos_entrega():
+    """Valida los datos de entrega del formulario de confirmación.
+
+    Devuelve (datos, error): `datos` son las columnas de Pedido que vienen del
+    formulario y de la sesión; `error` es el mensaje a mostrar si falta algo.
+    """
     metodo_pago = session.get('metodo_pago')
     if not metodo_pago:
-        flash('Selecciona un método de pago.')
-        return redirect(url_for('menu', restaurante_id=restaurante_id))
+        return None, 'Selecciona un método de pago.'
 
     tipo_entrega = request.form.get('tipo_entrega')
     if tipo_entrega not in ['domicilio', 'reserva']:
-        flash('Tipo de entrega inválido.')
-        return redirect(url_for('menu', restaurante_id=restaurante_id))
+        return None, 'Tipo de entrega inválido.'
 
     nombre_cliente = request.form.get('nombre_cliente')
     if not nombre_cliente:
-        flash('El nombre es obligatorio.')
-        return redirect(url_for('menu', restaurante_id=restaurante_id))
+        return None, 'El nombre es obligatorio.'
 
-    # === DATOS SEGÚN TIPO ===
     if tipo_entrega == 'domicilio':
         direccion = request.form.get('direccion')
         numero_celular = request.form.get('numero_celular')
         if not direccion or not numero_celular:
-            flash('Completa dirección y celular.')
-            return redirect(url_for('menu', restaurante_id=restaurante_id))
+            return None, 'Completa dirección y celular.'
         hora_reserva = fecha_reserva = None
     else:
         hora_reserva = request.form.get('hora_reserva')
         fecha_reserva = request.form.get('fecha_reserva')
         if not hora_reserva or not fecha_reserva:
-            flash('Completa fecha y hora de reserva.')
-            return redirect(url_for('menu', restaurante_id=restaurante_id))
+            return None, 'Completa fecha y hora de reserva.'
         direccion = numero_celular = None
 
-    # === CARRITO Y CÁLCULOS ===
-    carrito = session['carrito'][str(restaurante_id)]
-    items = []
-    subtotal = 0
-    for item in carrito:
-        item_subtotal = item['cantidad'] * item['precio']
-        items.append({
-            'nombre': item['nombre'],
-            'cantidad': item['cantidad'],
-            'precio': item['precio'],
-            'subtotal': item_subtotal
-        })
-        subtotal += item_subtotal
-
-    iva = round(subtotal * 0.16, 2)
-    total = subtotal + iva
+    return {
+        'usuario_id': session['user_id'],
+        'metodo_pago': metodo_pago,
+        'metodo_pago_detalle': session.get('metodo_pago_detalle'),
+        'direccion_entrega': direccion,
+        'numero_celular': numero_celular,
+        'nombre_cliente': nombre_cliente,
+        'tipo_entrega': tipo_entrega,
+        'hora_reserva': hora_reserva,
+        'fecha_reserva': fecha_reserva
+    }, None
 
-    # === GENERAR CÓDIGO ÚNICO ===
-    import uuid
-    from datetime import datetime
-    pedido_codigo = str(uuid.uuid4())[:8].upper()
-    fecha_pedido = datetime.now().strftime("%d/%m/%Y %H:%M")
 
-    # === GUARDAR PEDIDO ===
-    pedido = Pedido(
-        usuario_id=session['user_id'],
-        restaurante_id=restaurante_id,
-        total=total,
-        metodo_pago=metodo_pago,
-        metodo_pago_detalle=session.get('metodo_pago_detalle'),
-        direccion_entrega=direccion,
-        numero_celular=numero_celular,
-        nombre_cliente=nombre_cliente,
-        tipo_entrega=tipo_entrega,
-        hora_reserva=hora_reserva,
-        fecha_reserva=fecha_reserva,
-        codigo_pedido=pedido_codigo  # AQUÍ SE GUARDA
+@bp.route('/confirmar_pedido/<int:restaurante_id>', methods=['POST'])
+def confirmar_pedido(restaurante_id):
+    # === VALIDACIONES ===
+    if 'user_id' not in session and 'guest' not in session:
+        flash('Debes iniciar sesión.')
+        return redirect(url_for('main.login'))
+    if 'guest' in session:
+        flash('Los invitados no pueden confirmar pedidos.')
+        return redirect(url_for('main.menu', restaurante_id=restaurante_id))
+    clave, previa = reclamar_clave('restaurante')
+    if previa:
+        if previa.respuesta:
+            return previa.respuesta  # Reenvío: la factura ya emitida
+        flash('Este pedido ya fue registrado.')
+        return redirect(url_for('main.menu', restaurante_id=restaurante_id))
+    carrito_sesion = Carrito.actual()
+    carrito = carrito_sesion.items_de(restaurante_id) if carrito_sesion else []
+    if not carrito:
+        flash('El carrito está vacío.')
+        return redirect(url_for('main.menu', restaurante_id=restaurante_id))
+    datos, error = leer_datos_entrega()
+    if error:
+        flash(error)
+        return redirect(url_for('main.menu', restaurante_id=restaurante_id))
+
+    # === RESTAURANTE (antes de escribir nada) ===
+    restaurante = db.session.get(Restaurante, restaurante_id)
+    if not restaurante:
+        abort(404)
+
+    # === GUARDAR PEDIDO, ÍTEMS Y CONTADORES (una transacción) ===
+    pedido, resumen, errores = registrar_pedido(carrito_sesion, restaurante_id, carrito, datos)
+    if errores:
+        if clave:
+            db.session.delete(clave)  # El formulario podrá reenviarse tras revisar el carrito
+        db.session.commit()  # Guarda los precios corregidos del carrito
+        for error in errores:
+            flash(error)
+        flash('Revisa tu carrito antes de confirmar.')
+        return redirect(url_for('main.menu', restaurante_id=restaurante_id))
+
+    # === RENDERIZAR FACTURA (se guarda con la clave antes del commit) ===
+    factura = render_template(
+        'factura.html',
+        pedido_id=pedido.codigo_pedido,
+        fecha_pedido=datetime.now().strftime("%d/%m/%Y %H:%M"),
+        numero_pedido=pedido.id,
+        nombre_cliente=datos['nombre_cliente'],
+        tipo_entrega=datos['tipo_entrega'],
+        direccion=datos['direccion_entrega'],
+        numero_celular=datos['numero_celular'],
+        hora_reserva=datos['hora_reserva'],
+        fecha_reserva=datos['fecha_reserva'],
+        items=resumen['items'],
+        subtotal=resumen['subtotal'],
+        iva=resumen['iva'],
+        total=resumen['total'],
+        metodo_pago=datos['metodo_pago'],
+        restaurante=restaurante
     )
-    db.session.add(pedido)
-    db.session.flush()
-
-    # === GUARDAR ÍTEMS ===
-    for item in carrito:
-        item_pedido = PedidoItem(
-            pedido_id=pedido.id,
-            menu_id=item['menu_id'],
-            cantidad=item['cantidad'],
-            precio=item['precio']
-        )
-        db.session.add(item_pedido)
-
+    if clave:
+        clave.pedido_id = pedido.id
+        clave.respuesta = factura
     db.session.commit()
+    return factura
 
-    # === LIMPIAR CARRITO DEL RESTAURANTE ===
-    if 'carrito' in session and str(restaurante_id) in session['carrito']:
-        session['carrito'].pop(str(restaurante_id), None)
-        if not session['carrito']:
-            session.pop('carrito', None)
-    session.modified = True
-
-    # === OBTENER RESTAURANTE ===
-    restaurante = Restaurante.query.get_or_404(restaurante_id)
 
-    # === RENDERIZAR FACTURA ===
-    return render_template(
-        'factura.html',
-        pedido_id=pedido_codigo,
-        fecha_pedido=fecha_pedido,
-        numero_pedido=pedido.id,
-        nombre_cliente=nombre_cliente,
-        tipo_entrega=tipo_entrega,
-        direccion=direccion,
-        numero_celular=numero_celular,
-        hora_reserva=hora_reserva,
-        fecha_reserva=fecha_reserva,
-        items=items,
+@bp.route('/confirmar_pedido', methods=['POST'])
+def confirmar_pedido_carrito():
+    """Confirma en una sola transacción los pedidos de todos los restaurantes del carrito."""
+    if 'user_id' not in session and 'guest' not in session:
+        flash('Debes iniciar sesión.')
+        return redirect(url_for('main.login'))
+    if 'guest' in session:
+        flash('Los invitados no pueden confirmar pedidos.')
+        return redirect(url_for('main.restaurantes'))
+    clave, previa = reclamar_clave('carrito')
+    if previa:
+        if previa.respuesta:
+            return previa.respuesta  # Reenvío: la factura ya emitida
+        flash('Este pedido ya fue registrado.')
+        return redirect(url_for('main.restaurantes'))
+    carrito_sesion = Carrito.actual()
+    items = carrito_sesion._items().order_by(CarritoItem.agregado, CarritoItem.menu_id).all() if carrito_sesion else []
+    if not items:
+        flash('El carrito está vacío.')
+        return redirect(url_for('main.restaurantes'))
+    datos, error = leer_datos_entrega()
+    if error:
+        flash(error)
+        return redirect(url_for('main.restaurantes'))
+
+    restaurantes_por_id = {r.id: r for r in Restaurante.query.filter(
+        Restaurante.id.in_({item.restaurante_id for item in items}))}
+
+    pedidos, resumenes, errores = registrar_pedidos(carrito_sesion, items, datos)
+    if errores:
+        if clave:
+            db.session.delete(clave)
+        db.session.commit()  # Guarda los precios corregidos del carrito
+        for error in errores:
+            flash(error)
+        flash('Revisa tu carrito antes de confirmar.')
+        return redirect(url_for('main.restaurantes'))
+
+    for pedido, resumen in zip(pedidos, resumenes):
+        resumen.update(pedido=pedido, restaurante=restaurantes_por_id[resumen['restaurante_id']])
+    codigo = pedidos[0].codigo_pedido.rpartition('-')[0] or pedidos[0].codigo_pedido  # Sin el sufijo
+    subtotal = sum(r['subtotal'] for r in resumenes)
+    iva = sum(r['iva'] for r in resumenes)
+    factura = render_template(
+        'factura_consolidada.html',
+        codigo=codigo,
+        fecha_pedido=datetime.now().strftime("%d/%m/%Y %H:%M"),
+        nombre_cliente=datos['nombre_cliente'],
+        tipo_entrega=datos['tipo_entrega'],
+        direccion=datos['direccion_entrega'],
+        numero_celular=datos['numero_celular'],
+        hora_reserva=datos['hora_reserva'],
+        fecha_reserva=datos['fecha_reserva'],
+        metodo_pago=datos['metodo_pago'],
+        pedidos=resumenes,
         subtotal=subtotal,
         iva=iva,
-        total=total,
-        metodo_pago=metodo_pago,
-        restaurante=restaurante
+        total=subtotal + iva
     )
+    if clave:
+        clave.pedido_id = pedidos[0].id
+        clave.respuesta = factura
+    db.session.commit()
+    return factura
 
 # Ruta para el panel de administración
-@app.route('/admin', methods=['GET', 'POST'])
+@bp.route('/admin', methods=['GET', 'POST'])
 def admin():
     if 'admin_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     if request.method == 'POST':
         if 'restaurante' in request.form:
             nombre = request.form['nombre']
@@ -812,15 +2297,10 @@ def admin():
             categoria = request.form['categoria']
             imagen_file = request.files.get('imagen')
             
-            imagen_path = None
-            if imagen_file and allowed_file(imagen_file.filename):
-                filename = secure_filename(imagen_file.filename)
-                imagen_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                imagen_file.save(imagen_path)  # Guardar imagen
-                imagen_path = imagen_path.replace('static/', '')
-            else:
+            imagen_path = guardar_subida(imagen_file)  # Guardar imagen (por hash)
+            if not imagen_path:
                 local_image_path = 'C:/Users/ASUS/Pictures/imagen.jpg'
-                imagen_path = copy_image_from_path(local_image_path, app.config['UPLOAD_FOLDER'])
+                imagen_path = copy_image_from_path(local_image_path, current_app.config['UPLOAD_FOLDER'])
             
             restaurante = Restaurante(
                 nombre=nombre,
@@ -829,7 +2309,11 @@ def admin():
                 imagen=imagen_path if imagen_path else 'uploads/default.jpg'
             )  # Crear nuevo restaurante
             db.session.add(restaurante)
+            db.session.flush()
+            indexar_restaurante(restaurante)
+            invalidar_catalogo(CATALOGO_RESTAURANTES)
             db.session.commit()
+            encolar_imagen(imagen_path)  # Miniaturas y WebP en segundo plano
             flash('Restaurante añadido.')
         elif 'menu' in request.form:
             restaurante_id = request.form['restaurante_id']
@@ -839,15 +2323,10 @@ def admin():
             categoria = request.form['categoria']
             imagen_file = request.files.get('imagen')
             
-            imagen_path = None
-            if imagen_file and allowed_file(imagen_file.filename):
-                filename = secure_filename(imagen_file.filename)
-                imagen_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                imagen_file.save(imagen_path)
-                imagen_path = imagen_path.replace('static/', '')
-            else:
+            imagen_path = guardar_subida(imagen_file)
+            if not imagen_path:
                 local_image_path = 'C:/Users/ASUS/Pictures/imagen_menu.jpg'
-                imagen_path = copy_image_from_path(local_image_path, app.config['UPLOAD_FOLDER'])
+                imagen_path = copy_image_from_path(local_image_path, current_app.config['UPLOAD_FOLDER'])
             
             menu = Menu(
                 restaurante_id=restaurante_id,
@@ -858,19 +2337,485 @@ def admin():
                 imagen=imagen_path if imagen_path else 'uploads/default.jpg'
             )  # Crear nuevo menú
             db.session.add(menu)
+            db.session.flush()
+            indexar_menu(menu)
+            invalidar_catalogo(CATALOGO_RESTAURANTES)
             db.session.commit()
+            encolar_imagen(imagen_path)  # Miniaturas y WebP en segundo plano
             flash('Menú añadido.')
     restaurantes = Restaurante.query.all()
     menus = Menu.query.all()
     return render_template('admin.html', restaurantes=restaurantes, menus=menus)
 
 
-@app.route('/admin/finanzas', methods=['GET', 'POST'])
+# === RANGOS DE FECHAS SEMIABIERTOS ===
+# Todo filtro por fecha es [desde, hasta): comparaciones directas sobre la columna, que
+# usan el índice (extract()/date() sobre la columna obligan a recorrer la tabla).
+def rango_mes(año, mes):
+    inicio = date(año, mes, 1)
+    return inicio, date(año + 1, 1, 1) if mes == 12 else date(año, mes + 1, 1)
+
+
+def rango_año(año):
+    return date(año, 1, 1), date(año + 1, 1, 1)
+
+
+def leer_rango_fechas(dias_defecto):
+    """Lee `desde` y `hasta` (excluido, AAAA-MM-DD) de la petición; por defecto los últimos días.
+
+    Lanza ValueError si el formato es inválido o el rango está vacío.
+    """
+    try:
+        hasta = date.fromisoformat(request.args['hasta']) if request.args.get('hasta') \
+            else date.today() + timedelta(days=1)
+        desde = date.fromisoformat(request.args['desde']) if request.args.get('desde') \
+            else hasta - timedelta(days=dias_defecto)
+    except ValueError:
+        raise ValueError('desde y hasta deben tener formato AAAA-MM-DD')
+    if desde >= hasta:
+        raise ValueError('desde debe ser anterior a hasta')
+    return desde, hasta
+
+
+def en_rango(columna, desde, hasta):
+    """Predicado `desde <= columna < hasta`; cualquiera de los extremos puede ser None."""
+    condiciones = []
+    if desde is not None:
+        condiciones.append(columna >= desde)
+    if hasta is not None:
+        condiciones.append(columna < hasta)
+    return db.and_(db.true(), *condiciones)
+
+
+# === SERIES DE VENTAS ===
+SERIE_AGRUPACIONES = {'dia': 'day', 'semana': 'week', 'mes': 'month'}  # -> date_trunc
+SERIE_DIAS_DEFECTO = 30
+SERIE_MAXIMO_PERIODOS = 1000
+
+
+def inicio_periodo(dia, agrupar):
+    if agrupar == 'semana':
+        return dia - timedelta(days=dia.weekday())  # Lunes, como date_trunc('week')
+    if agrupar == 'mes':
+        return dia.replace(day=1)
+    return dia
+
+
+def siguiente_periodo(inicio, agrupar):
+    if agrupar == 'semana':
+        return inicio + timedelta(days=7)
+    if agrupar == 'mes':
+        return rango_mes(inicio.year, inicio.month)[1]
+    return inicio + timedelta(days=1)
+
+
+def periodo_sql(columna, agrupar):
+    """Inicio del periodo de `columna` (Date): date_trunc en Postgres, equivalente en SQLite."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return db.cast(db.func.date_trunc(SERIE_AGRUPACIONES[agrupar], columna), db.Date)
+    if agrupar == 'semana':
+        dias_desde_lunes = (db.cast(db.func.strftime('%w', columna), db.Integer) + 6) % 7
+        return db.func.date(columna, db.func.printf('-%d days', dias_desde_lunes))
+    if agrupar == 'mes':
+        return db.func.strftime('%Y-%m-01', columna)
+    return db.func.date(columna)
+
+
+def serie_ventas(desde, hasta, agrupar='dia', restaurante_id=None):
+    """Pedidos e ingresos por periodo en [desde, hasta), con los periodos vacíos en cero.
+
+    Una sola consulta agrupada sobre el rollup ventas_diarias.
+    """
+    periodo = periodo_sql(VentaDiaria.dia, agrupar).label('periodo')
+    consulta = db.session.query(
+        periodo, db.func.sum(VentaDiaria.pedidos), db.func.sum(VentaDiaria.ingresos)
+    ).filter(en_rango(VentaDiaria.dia, desde, hasta))
+    if restaurante_id is not None:
+        consulta = consulta.filter(VentaDiaria.restaurante_id == restaurante_id)
+    filas = {
+        date.fromisoformat(str(p)[:10]): (int(pedidos or 0), float(ingresos or 0))
+        for p, pedidos, ingresos in consulta.group_by(periodo)
+    }
+
+    serie = []
+    actual = inicio_periodo(desde, agrupar)
+    while actual < hasta:
+        pedidos, ingresos = filas.get(actual, (0, 0.0))
+        serie.append({'periodo': actual.isoformat(), 'pedidos': pedidos, 'ingresos': round(ingresos, 2)})
+        actual = siguiente_periodo(actual, agrupar)
+    return serie
+
+
+@bp.route('/admin/finanzas/serie')
+def admin_finanzas_serie():
+    """Serie temporal de ingresos: ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD (excluido)&agrupar=dia|semana|mes."""
+    if 'admin_id' not in session:
+        return redirect(url_for('main.login'))
+    if not session.get('finanzas_auth'):
+        return jsonify({'error': 'Se requiere la clave de finanzas'}), 403
+
+    agrupar = request.args.get('agrupar', 'dia')
+    if agrupar not in SERIE_AGRUPACIONES:
+        return jsonify({'error': f'agrupar debe ser uno de: {", ".join(SERIE_AGRUPACIONES)}'}), 400
+    try:
+        desde, hasta = leer_rango_fechas(SERIE_DIAS_DEFECTO)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    restaurante_id = request.args.get('restaurante_id', type=int)
+    dias_por_periodo = {'dia': 1, 'semana': 7, 'mes': 28}[agrupar]
+    if (hasta - desde).days / dias_por_periodo > SERIE_MAXIMO_PERIODOS:
+        return jsonify({'error': f'Máximo {SERIE_MAXIMO_PERIODOS} periodos por consulta'}), 400
+
+    serie = serie_ventas(desde, hasta, agrupar, restaurante_id)
+    return jsonify({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'agrupar': agrupar,
+        'restaurante_id': restaurante_id,
+        'serie': serie,
+        'total': {
+            'pedidos': sum(p['pedidos'] for p in serie),
+            'ingresos': round(sum(p['ingresos'] for p in serie), 2),
+        },
+    })
+
+
+# === EXPORTACIÓN DE PEDIDOS (CSV / XLSX EN STREAMING) ===
+# Una fila por línea de pedido, de restaurantes y agrícolas, ordenadas por fecha. Las
+# filas se leen por lotes y se envían a medida que salen: memoria constante.
+EXPORTACION_COLUMNAS = ['origen', 'pedido', 'fecha', 'cliente', 'restaurante', 'estado', 'metodo_pago',
+                        'tipo_entrega', 'total_pedido', 'producto', 'cantidad', 'precio_unitario', 'subtotal']
+EXPORTACION_LOTE = 2000  # Filas por lote del cursor del servidor
+EXPORTACION_BLOQUE = 64 * 1024  # Bytes por bloque enviado
+EXPORTACION_COLA = 16  # Bloques en vuelo entre COPY y la respuesta
+EXPORTACION_DIAS_DEFECTO = 31
+
+
+def consulta_exportacion(desde, hasta):
+    """SELECT ... UNION ALL con las líneas de pedidos de restaurantes y agrícolas en [desde, hasta)."""
+    restaurantes = db.select(
+        db.literal('restaurante').label('origen'),
+        Pedido.codigo_pedido.label('pedido'),
+        Pedido.fecha.label('fecha'),
+        db.func.coalesce(Pedido.nombre_cliente, Usuario.nombre).label('cliente'),
+        Restaurante.nombre.label('restaurante'),
+        Pedido.estado.label('estado'),
+        Pedido.metodo_pago.label('metodo_pago'),
+        Pedido.tipo_entrega.label('tipo_entrega'),
+        Pedido.total.label('total_pedido'),
+        Menu.nombre.label('producto'),
+        PedidoItem.cantidad.label('cantidad'),
+        PedidoItem.precio.label('precio_unitario'),
+        (PedidoItem.cantidad * PedidoItem.precio).label('subtotal'),
+    ).select_from(Pedido)\
+     .join(PedidoItem, db.and_(PedidoItem.pedido_id == Pedido.id, PedidoItem.fecha == Pedido.fecha))\
+     .join(Menu, Menu.id == PedidoItem.menu_id)\
+     .join(Restaurante, Restaurante.id == Pedido.restaurante_id)\
+     .outerjoin(Usuario, Usuario.id == Pedido.usuario_id)\
+     .where(en_rango(Pedido.fecha, desde, hasta), en_rango(PedidoItem.fecha, desde, hasta))
+
+    agricolas = db.select(
+        db.literal('agricola'),
+        db.literal('AGR-') + db.cast(PedidoAgricola.id, db.String),
+        PedidoAgricola.fecha,
+        Usuario.nombre,
+        db.null(),
+        PedidoAgricola.estado,
+        db.null(),
+        PedidoAgricola.tipo_entrega,
+        PedidoAgricola.total,
+        ProductoAgricola.nombre,
+        DetallePedidoAgricola.cantidad,
+        DetallePedidoAgricola.precio_unitario,
+        DetallePedidoAgricola.cantidad * DetallePedidoAgricola.precio_unitario,
+    ).select_from(PedidoAgricola)\
+     .join(DetallePedidoAgricola, DetallePedidoAgricola.pedido_id == PedidoAgricola.id)\
+     .outerjoin(ProductoAgricola, ProductoAgricola.id == DetallePedidoAgricola.producto_id)\
+     .outerjoin(Usuario, Usuario.id == PedidoAgricola.user_id)\
+     .where(en_rango(PedidoAgricola.fecha, desde, hasta))
+
+    return db.union_all(restaurantes, agricolas).order_by('fecha', 'pedido')
+
+
+def lotes_exportacion(consulta):
+    """Filas de `consulta` por lotes, con un cursor del lado del servidor."""
+    resultado = db.session.execute(consulta, execution_options={'stream_results': True})
+    yield from resultado.partitions(EXPORTACION_LOTE)
+
+
+def exportar_csv(consulta):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')  # BOM: Excel abre el UTF-8 con tildes correctas
+    escritor.writerow(EXPORTACION_COLUMNAS)
+    for lote in lotes_exportacion(consulta):
+        escritor.writerows(lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def exportar_csv_copy(consulta):
+    """CSV con COPY ... TO STDOUT (Postgres). COPY corre en un hilo con su propia conexión
+    y entrega bloques por una cola acotada; si el cliente corta, COPY se cancela.
+    """
+    motor = db.engine
+    sql = str(consulta.compile(motor, compile_kwargs={'literal_binds': True}))
+    cola = queue.Queue(maxsize=EXPORTACION_COLA)
+    cancelado = threading.Event()
+    fin = object()
+
+    def entregar(elemento):
+        # Nunca se bloquea para siempre: si el cliente se fue, nadie vacía la cola
+        while not cancelado.is_set():
+            try:
+                cola.put(elemento, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    class Escritor:
+        def __init__(self):
+            self.pendiente = []
+            self.tamano = 0
+
+        def write(self, datos):
+            self.pendiente.append(datos)
+            self.tamano += len(datos)
+            if self.tamano >= EXPORTACION_BLOQUE:
+                self.flush()
+
+        def flush(self):
+            bloque, self.pendiente, self.tamano = b''.join(self.pendiente), [], 0
+            if bloque and not entregar(bloque):
+                raise RuntimeError('Exportación cancelada por el cliente')  # Aborta COPY
+
+    def copiar():
+        conexion = motor.raw_connection()
+        try:
+            escritor = Escritor()
+            with conexion.cursor() as cursor:
+                cursor.copy_expert(f'COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)', escritor)
+            escritor.flush()
+            conexion.rollback()
+        except Exception as e:  # Se relanza en el hilo de la respuesta
+            entregar(e)
+        finally:
+            conexion.close()
+            entregar(fin)
+
+    hilo = threading.Thread(target=copiar, name='exportacion-copy', daemon=True)
+    hilo.start()
+    try:
+        yield '\ufeff'.encode()
+        while True:
+            bloque = cola.get()
+            if bloque is fin:
+                break
+            if isinstance(bloque, Exception):
+                raise bloque
+            yield bloque
+    finally:
+        cancelado.set()
+
+
+def exportar_xlsx(consulta):
+    """XLSX con openpyxl en modo write_only: las filas van a disco, no a memoria."""
+    libro = openpyxl.Workbook(write_only=True)
+    hoja = libro.create_sheet('Pedidos')
+    hoja.append(EXPORTACION_COLUMNAS)
+    for lote in lotes_exportacion(consulta):
+        for fila in lote:
+            hoja.append(list(fila))
+    # Un .xlsx es un zip: solo puede enviarse una vez cerrado
+    with tempfile.TemporaryFile() as archivo:
+        libro.save(archivo)
+        archivo.seek(0)
+        yield from iter(lambda: archivo.read(EXPORTACION_BLOQUE), b'')
+
+
+@bp.route('/admin/finanzas/export')
+def admin_finanzas_export():
+    """Descarga las líneas de pedidos de [desde, hasta) como CSV o XLSX: ?formato=csv|xlsx."""
+    if 'admin_id' not in session:
+        return redirect(url_for('main.login'))
+    if not session.get('finanzas_auth'):
+        return jsonify({'error': 'Se requiere la clave de finanzas'}), 403
+
+    formato = request.args.get('formato', 'csv')
+    if formato not in ('csv', 'xlsx'):
+        return jsonify({'error': 'formato debe ser csv o xlsx'}), 400
+    try:
+        desde, hasta = leer_rango_fechas(EXPORTACION_DIAS_DEFECTO)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    consulta = consulta_exportacion(desde, hasta)
+    if formato == 'xlsx':
+        cuerpo = exportar_xlsx(consulta)
+        tipo = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    elif db.engine.dialect.name == 'postgresql':
+        cuerpo, tipo = exportar_csv_copy(consulta), 'text/csv; charset=utf-8'
+    else:
+        cuerpo, tipo = exportar_csv(consulta), 'text/csv; charset=utf-8'
+
+    nombre = f'pedidos_{desde.isoformat()}_{(hasta - timedelta(days=1)).isoformat()}.{formato}'
+    return Response(stream_with_context(cuerpo), mimetype=tipo, headers={
+        'Content-Disposition': f'attachment; filename="{nombre}"',
+        'X-Accel-Buffering': 'no',  # Que el proxy no acumule la respuesta
+    })
+
+
+# === BALANCE POR RESTAURANTE (VECTORIZADO) ===
+BALANCE_COLUMNAS = ('ingresos', 'costo', 'ganancia', 'activo_corriente', 'activo_no_corriente', 'total_activos',
+                    'pasivo_corriente', 'pasivo_no_corriente', 'total_pasivos', 'patrimonio')
+
+
+def columnas_finanzas(inicio_mes, fin_mes, inicio_año, fin_año):
+    """Una sola consulta agrupada: (restaurantes con id y nombre, matriz) en orden de id.
+
+    Columnas de la matriz: ingresos históricos, del mes y del año, y las tres proporciones
+    de PARAMETROS_FINANCIEROS_DEFECTO (las del restaurante o las por defecto).
+    """
+    def suma_entre(desde, hasta):
+        condicion = en_rango(VentaDiaria.dia, desde, hasta)
+        return db.func.coalesce(db.func.sum(db.case((condicion, VentaDiaria.ingresos), else_=0)), 0)
+
+    # Agregar primero y unir después: los parámetros no se repiten por cada día de ventas
+    ventas = db.select(
+        VentaDiaria.restaurante_id,
+        db.func.sum(VentaDiaria.ingresos).label('ingresos'),
+        suma_entre(inicio_mes, fin_mes).label('mes'),
+        suma_entre(inicio_año, fin_año).label('año')
+    ).group_by(VentaDiaria.restaurante_id).subquery()
+
+    proporciones = [
+        db.func.coalesce(getattr(ParametroFinanciero, columna), valor)
+        for columna, valor in PARAMETROS_FINANCIEROS_DEFECTO.items()
+    ]
+    filas = db.session.execute(
+        db.select(
+            Restaurante.id, Restaurante.nombre,
+            db.func.coalesce(ventas.c.ingresos, 0), db.func.coalesce(ventas.c.mes, 0), db.func.coalesce(ventas.c['año'], 0),
+            *proporciones
+        ).outerjoin(ventas, ventas.c.restaurante_id == Restaurante.id)
+         .outerjoin(ParametroFinanciero, ParametroFinanciero.restaurante_id == Restaurante.id)
+         .order_by(Restaurante.id)
+    ).all()
+    matriz = np.array([fila[2:] for fila in filas], dtype=float).reshape(len(filas), 6)
+    return filas, matriz
+
+
+def calcular_balance(matriz):
+    """Balance simplificado de todos los restaurantes a la vez.
+
+    Devuelve ({columna de BALANCE_COLUMNAS: arreglo}, ganancia del mes, ganancia del año).
+    """
+    ingresos, ingresos_mes, ingresos_año, p_costo, p_activo, p_pasivo = matriz.T
+    costo = ingresos * p_costo
+    activo_corriente = ingresos * p_activo
+    activo_no_corriente = ingresos * (1 - p_activo)
+    pasivo_corriente = costo * p_pasivo
+    pasivo_no_corriente = costo * (1 - p_pasivo)
+    total_activos = activo_corriente + activo_no_corriente
+    total_pasivos = pasivo_corriente + pasivo_no_corriente
+    balance = {
+        'ingresos': ingresos,
+        'costo': costo,
+        'ganancia': ingresos * (1 - p_costo),
+        'activo_corriente': activo_corriente,
+        'activo_no_corriente': activo_no_corriente,
+        'total_activos': total_activos,
+        'pasivo_corriente': pasivo_corriente,
+        'pasivo_no_corriente': pasivo_no_corriente,
+        'total_pasivos': total_pasivos,
+        'patrimonio': total_activos - total_pasivos,
+    }
+    margen = 1 - p_costo
+    return balance, float(ingresos_mes @ margen), float(ingresos_año @ margen)
+
+
+def filas_balance(restaurantes, balance):
+    """Filas del template: un solo redondeo para toda la tabla, en floats de Python."""
+    redondeado = np.round(np.column_stack([balance[c] for c in BALANCE_COLUMNAS]), 2).tolist()
+    return [
+        dict(zip(BALANCE_COLUMNAS, valores), restaurante=restaurante)
+        for restaurante, valores in zip(restaurantes, redondeado)
+    ]
+
+
+def totales_balance(balance):
+    """{columna de BALANCE_COLUMNAS: suma de todos los restaurantes}, redondeada."""
+    return dict(zip(BALANCE_COLUMNAS, np.round([balance[c].sum() for c in BALANCE_COLUMNAS], 2).tolist()))
+
+
+# === RESULTADOS DEL NEGOCIO AGRÍCOLA ===
+AGRICOLA_DIAS_DEFECTO = 30  # Ventana del reporte si no se indica desde/hasta
+AGRICOLA_TOTALES = ('unidades', 'ingresos', 'costo', 'margen', 'inventario')
+
+
+def consulta_resultados_agricolas(desde, hasta):
+    """Una fila por producto: ventas en [desde, hasta), costo de lo vendido, margen e inventario.
+
+    El costo usa el precio_compra actual del producto (no hay costo histórico por venta).
+    """
+    vendidos = db.select(
+        DetallePedidoAgricola.producto_id,
+        db.func.sum(DetallePedidoAgricola.cantidad).label('unidades'),
+        db.func.sum(DetallePedidoAgricola.cantidad * DetallePedidoAgricola.precio_unitario).label('ingresos')
+    ).join(PedidoAgricola, PedidoAgricola.id == DetallePedidoAgricola.pedido_id)\
+     .where(en_rango(PedidoAgricola.fecha, desde, hasta))\
+     .group_by(DetallePedidoAgricola.producto_id)\
+     .subquery()
+
+    unidades = db.func.coalesce(vendidos.c.unidades, 0)
+    ingresos = db.func.coalesce(vendidos.c.ingresos, 0)
+    costo = unidades * ProductoAgricola.precio_compra
+    stock = db.func.coalesce(ProductoAgricola.stock, 0)
+    return db.select(
+        ProductoAgricola.id, ProductoAgricola.nombre, ProductoAgricola.precio_compra, ProductoAgricola.precio_venta,
+        stock.label('stock'),
+        unidades.label('unidades'),
+        ingresos.label('ingresos'),
+        costo.label('costo'),
+        (ingresos - costo).label('margen'),
+        db.case((ingresos > 0, (ingresos - costo) * 100.0 / ingresos), else_=None).label('margen_porcentaje'),
+        (stock * ProductoAgricola.precio_compra).label('inventario'),
+    ).outerjoin(vendidos, vendidos.c.producto_id == ProductoAgricola.id)
+
+
+def resultados_agricolas(desde, hasta):
+    """(productos, totales) del negocio agrícola en [desde, hasta).
+
+    Cacheado por ventana, versión del dominio agrícola (precios y productos) y último
+    pedido agrícola (ventas y stock): una ventana solo se recalcula si algo cambió.
+    """
+    def cargar():
+        por_producto = consulta_resultados_agricolas(desde, hasta).subquery()
+        productos = db.session.execute(
+            db.select(por_producto).order_by(por_producto.c.ingresos.desc(), por_producto.c.id)
+        ).all()
+        sumas = {c: db.func.coalesce(db.func.sum(por_producto.c[c]), 0) for c in AGRICOLA_TOTALES}
+        totales = db.session.execute(db.select(
+            *(suma.label(c) for c, suma in sumas.items()),
+            db.case((sumas['ingresos'] > 0, sumas['margen'] * 100.0 / sumas['ingresos']), else_=None)
+              .label('margen_porcentaje')
+        )).one()
+        return productos, totales
+
+    ultimo_pedido = db.session.query(db.func.max(PedidoAgricola.id)).scalar()
+    clave = ('resultados_agricolas', desde, hasta, version_catalogo(CATALOGO_AGRICOLA), ultimo_pedido)
+    return cache_catalogo.obtener(clave, cargar)
+
+
+@bp.route('/admin/finanzas', methods=['GET', 'POST'])
 def admin_finanzas():
     # 1. Verificar que sea administrador
     if 'admin_id' not in session:
         flash('Acceso denegado. Debes ser administrador.', 'danger')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     # 2. Verificación de la clave secreta (doble autenticación)
     if request.method == 'POST':
@@ -886,83 +2831,44 @@ def admin_finanzas():
         return render_template('finanzas_login.html')
 
     # 4. === CÁLCULO DE DATOS FINANCIEROS ===
-    from datetime import datetime
-    from sqlalchemy import extract
-
     hoy = datetime.now()
-    mes_actual_num = hoy.month
     año_actual = hoy.year
+    inicio_mes, fin_mes = rango_mes(hoy.year, hoy.month)
+    inicio_año, fin_año = rango_año(año_actual)
 
-    # Todos los restaurantes
-    restaurantes = Restaurante.query.all()
-
-    reporte_restaurantes = []
-    total_ingresos = total_costos = total_ganancia = 0
-
-    for rest in restaurantes:
-        # Sumar ingresos del restaurante
-        pedidos = Pedido.query.filter_by(restaurante_id=rest.id).all()
-        ingresos = sum(p.total for p in pedidos if p.total)
-
-        # Estimaciones realistas (puedes ajustar estos porcentajes)
-        costo = ingresos * 0.60                    # 60% costo operativo
-        ganancia = ingresos * 0.40                  # 40% ganancia neta
-
-        # Balance simplificado
-        activo_corriente = ingresos * 0.75
-        activo_no_corriente = ingresos * 0.25
-        total_activos = activo_corriente + activo_no_corriente
-
-        pasivo_corriente = costo * 0.85
-        pasivo_no_corriente = costo * 0.15
-        total_pasivos = pasivo_corriente + pasivo_no_corriente
-
-        patrimonio = total_activos - total_pasivos
-
-        reporte_restaurantes.append({
-            'restaurante': rest,
-            'ingresos': round(ingresos, 2),
-            'costo': round(costo, 2),
-            'ganancia': round(ganancia, 2),
-            'activo_corriente': round(activo_corriente, 2),
-            'activo_no_corriente': round(activo_no_corriente, 2),
-            'total_activos': round(total_activos, 2),
-            'pasivo_corriente': round(pasivo_corriente, 2),
-            'pasivo_no_corriente': round(pasivo_no_corriente, 2),
-            'total_pasivos': round(total_pasivos, 2),
-            'patrimonio': round(patrimonio, 2)
-        })
-
-        total_ingresos += ingresos
-        total_costos += costo
-        total_ganancia += ganancia
-
-    # === RESUMEN MENSUAL Y ANUAL ===
-    pedidos_mes = Pedido.query.filter(
-        extract('month', Pedido.fecha) == mes_actual_num,
-        extract('year', Pedido.fecha) == año_actual
-    ).all()
-    ingresos_mes = sum(p.total for p in pedidos_mes if p.total)
-    ganancia_mes = ingresos_mes * 0.40
+    # Ingresos y proporciones por restaurante en columnas; el balance se calcula en bloque
+    restaurantes, matriz = columnas_finanzas(inicio_mes, fin_mes, inicio_año, fin_año)
+    balance, ganancia_mes, ganancia_año = calcular_balance(matriz)
+    ingresos_mes, ingresos_año = matriz[:, 1].sum(), matriz[:, 2].sum()
+    totales = totales_balance(balance)
+    reporte_restaurantes = filas_balance(restaurantes, balance)
 
-    pedidos_año = Pedido.query.filter(
-        extract('year', Pedido.fecha) == año_actual
-    ).all()
-    ingresos_año = sum(p.total for p in pedidos_año if p.total)
-    ganancia_año = ingresos_año * 0.40
+    # Negocio agrícola en la ventana pedida (?desde=&hasta=, hasta excluido)
+    try:
+        agricola_desde, agricola_hasta = leer_rango_fechas(AGRICOLA_DIAS_DEFECTO)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        agricola_hasta = date.today() + timedelta(days=1)
+        agricola_desde = agricola_hasta - timedelta(days=AGRICOLA_DIAS_DEFECTO)
+    productos_agricolas, totales_agricolas = resultados_agricolas(agricola_desde, agricola_hasta)
 
     # === ENVÍO AL TEMPLATE (TODAS LAS VARIABLES NECESARIAS) ===
     return render_template(
         'admin_finanzas.html',
         hoy=hoy,                                      # Para la fecha bonita
         reporte_restaurantes=reporte_restaurantes,
-        total_ingresos=round(total_ingresos, 2),
-        total_costos=round(total_costos, 2),
-        total_ganancia=round(total_ganancia, 2),
-        ingresos_mes=round(ingresos_mes, 2),
+        totales=totales,                              # Suma de cada columna del balance
+        total_ingresos=totales['ingresos'],
+        total_costos=totales['costo'],
+        total_ganancia=totales['ganancia'],
+        ingresos_mes=round(float(ingresos_mes), 2),
         ganancia_mes=round(ganancia_mes, 2),
-        ingresos_año=round(ingresos_año, 2),
+        ingresos_año=round(float(ingresos_año), 2),
         ganancia_año=round(ganancia_año, 2),
+        productos_agricolas=productos_agricolas,
+        totales_agricolas=totales_agricolas,
+        agricola_desde=agricola_desde,
+        agricola_hasta=agricola_hasta - timedelta(days=1),  # Inclusivo, como el formulario
         mes_actual=hoy.strftime('%B %Y'),             # Ej: "noviembre 2025"
         año_actual=año_actual
     )
@@ -970,32 +2876,44 @@ def admin_finanzas():
 
 
 # Ruta para eliminar un restaurante
-@app.route('/eliminar_restaurante/<int:restaurante_id>', methods=['POST'])
+@bp.route('/eliminar_restaurante/<int:restaurante_id>', methods=['POST'])
 def eliminar_restaurante(restaurante_id):
     if 'admin_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     restaurante = Restaurante.query.get_or_404(restaurante_id)  # Obtener restaurante o devolver 404
+    imagen = restaurante.imagen
+    # También en SQLite, que no aplica ON DELETE sin PRAGMA foreign_keys
+    CarritoItem.query.filter_by(restaurante_id=restaurante_id).delete(synchronize_session=False)
     db.session.delete(restaurante)
+    DocumentoBusqueda.query.filter_by(restaurante_id=restaurante_id).delete(synchronize_session=False)
+    invalidar_indice_memoria()
+    invalidar_catalogo(CATALOGO_RESTAURANTES)
     db.session.commit()
+    liberar_subidas([imagen])
     flash('Restaurante eliminado exitosamente.')
-    return redirect(url_for('admin'))
+    return redirect(url_for('main.admin'))
 
 # Ruta para eliminar un menú
-@app.route('/eliminar_menu/<int:menu_id>', methods=['POST'])
+@bp.route('/eliminar_menu/<int:menu_id>', methods=['POST'])
 def eliminar_menu(menu_id):
     if 'admin_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     menu = Menu.query.get_or_404(menu_id)  # Obtener menú o devolver 404
+    imagen = menu.imagen
+    CarritoItem.query.filter_by(menu_id=menu_id).delete(synchronize_session=False)
     db.session.delete(menu)
+    desindexar('menu', menu_id)
+    invalidar_catalogo(CATALOGO_RESTAURANTES)
     db.session.commit()
+    liberar_subidas([imagen])
     flash('Menú eliminado exitosamente.')
-    return redirect(url_for('admin'))
+    return redirect(url_for('main.admin'))
 
 # Ruta para actualizar un restaurante
-@app.route('/actualizar_restaurante/<int:restaurante_id>', methods=['GET', 'POST'])
+@bp.route('/actualizar_restaurante/<int:restaurante_id>', methods=['GET', 'POST'])
 def actualizar_restaurante(restaurante_id):
     if 'admin_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     restaurante = Restaurante.query.get_or_404(restaurante_id)  # Obtener restaurante o devolver 404
     if request.method == 'POST':
         restaurante.nombre = request.form['nombre']
@@ -1003,23 +2921,27 @@ def actualizar_restaurante(restaurante_id):
         restaurante.categoria = request.form['categoria']
         imagen_file = request.files.get('imagen')
         
-        if imagen_file and allowed_file(imagen_file.filename):
-            filename = secure_filename(imagen_file.filename)
-            imagen_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            imagen_file.save(imagen_path)
-            restaurante.imagen = imagen_path.replace('static/', '')  # Actualizar imagen
+        anterior = restaurante.imagen
+        nueva_imagen = guardar_subida(imagen_file)
+        if nueva_imagen:
+            restaurante.imagen = nueva_imagen  # Actualizar imagen
         
+        indexar_restaurante(restaurante)
+        invalidar_catalogo(CATALOGO_RESTAURANTES)
         db.session.commit()
+        encolar_imagen(nueva_imagen)
+        if nueva_imagen and nueva_imagen != anterior:
+            liberar_subidas([anterior])
         flash('Restaurante actualizado exitosamente.')
-        return redirect(url_for('admin'))
+        return redirect(url_for('main.admin'))
     
     return render_template('actualizar_restaurante.html', restaurante=restaurante)
 
 # Ruta para actualizar un menú
-@app.route('/actualizar_menu/<int:menu_id>', methods=['GET', 'POST'])
+@bp.route('/actualizar_menu/<int:menu_id>', methods=['GET', 'POST'])
 def actualizar_menu(menu_id):
     if 'admin_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     menu = Menu.query.get_or_404(menu_id)  # Obtener menú o devolver 404
     restaurantes = Restaurante.query.all()  # Obtener todos los restaurantes
     if request.method == 'POST':
@@ -1029,27 +2951,44 @@ def actualizar_menu(menu_id):
         menu.precio = float(request.form['precio'])
         menu.categoria = request.form['categoria']
         imagen_file = request.files.get('imagen')
+
+        # Si el menú cambia de restaurante, su popularidad lo acompaña
+        PopularidadMenu.query.filter_by(menu_id=menu.id).update({'restaurante_id': menu.restaurante_id})
         
-        if imagen_file and allowed_file(imagen_file.filename):
-            filename = secure_filename(imagen_file.filename)
-            imagen_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            imagen_file.save(imagen_path)
-            menu.imagen = imagen_path.replace('static/', '')  # Actualizar imagen
+        anterior = menu.imagen
+        nueva_imagen = guardar_subida(imagen_file)
+        if nueva_imagen:
+            menu.imagen = nueva_imagen  # Actualizar imagen
         
+        indexar_menu(menu)
+        invalidar_catalogo(CATALOGO_RESTAURANTES)
         db.session.commit()
+        encolar_imagen(nueva_imagen)
+        if nueva_imagen and nueva_imagen != anterior:
+            liberar_subidas([anterior])
         flash('Menú actualizado exitosamente.')
-        return redirect(url_for('admin'))
+        return redirect(url_for('main.admin'))
     
     return render_template('actualizar_menu.html', menu=menu, restaurantes=restaurantes)
 
 
 
 
+# Estadísticas de la caché del catálogo (por proceso)
+@bp.route('/admin/cache')
+def admin_cache():
+    if 'admin_id' not in session:
+        return redirect(url_for('main.login'))
+    versiones = {'restaurantes': version_catalogo(CATALOGO_RESTAURANTES), 'agricola': version_catalogo(CATALOGO_AGRICOLA),
+                 'imagenes': version_catalogo(CATALOGO_IMAGENES)}
+    return jsonify({'version_catalogo': versiones, **cache_catalogo.estadisticas()})
+
+
 # === PÁGINA GESTIÓN AGRÍCOLA ===
-@app.route('/admin/agricola', methods=['GET', 'POST'])
+@bp.route('/admin/agricola', methods=['GET', 'POST'])
 def admin_agricola():
     if 'admin_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     productos = ProductoAgricola.query.all()
 
@@ -1061,14 +3000,7 @@ def admin_agricola():
             precio_venta = float(request.form['precio_venta'])
             stock = int(request.form['stock'])
 
-            imagen_path = 'uploads/agricola_default.jpg'
-            if 'imagen' in request.files:
-                file = request.files['imagen']
-                if file and file.filename:
-                    filename = secure_filename(file.filename)
-                    path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(path)
-                    imagen_path = f'uploads/{filename}'
+            imagen_path = guardar_subida(request.files.get('imagen')) or 'uploads/agricola_default.jpg'
 
             nuevo = ProductoAgricola(
                 nombre=nombre,
@@ -1079,21 +3011,28 @@ def admin_agricola():
                 imagen=imagen_path
             )
             db.session.add(nuevo)
+            invalidar_catalogo(CATALOGO_AGRICOLA)
             db.session.commit()
+            encolar_imagen(imagen_path)
             flash(f'Producto agrícola "{nombre}" añadido.')
 
     return render_template('admin_agricola.html', productos=productos)
 
 # === ELIMINAR PRODUCTO AGRÍCOLA ===
-@app.route('/admin/agricola/eliminar/<int:id>', methods=['POST'])
+@bp.route('/admin/agricola/eliminar/<int:id>', methods=['POST'])
 def eliminar_agricola(id):
     if 'admin_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     producto = ProductoAgricola.query.get_or_404(id)
+    imagen = producto.imagen
+    # También en SQLite, que no aplica ON DELETE sin PRAGMA foreign_keys
+    ReservaAgricola.query.filter_by(producto_id=id).delete(synchronize_session=False)
     db.session.delete(producto)
+    invalidar_catalogo(CATALOGO_AGRICOLA)
     db.session.commit()
+    liberar_subidas([imagen])
     flash(f'Producto agrícola eliminado.')
-    return redirect(url_for('admin_agricola'))
+    return redirect(url_for('main.admin_agricola'))
 
 
 
@@ -1102,876 +3041,1196 @@ def eliminar_agricola(id):
 
 
 # Nuevas rutas API para el chatbot (JSON)
-@app.route('/api/restaurantes', methods=['GET'])
+API_LIMITE_DEFECTO = 50
+API_LIMITE_MAXIMO = 200
+
+
+def parametros_pagina(campos_validos):
+    """Lee `limit`, `after` y `fields` de la petición. Lanza ValueError si son inválidos."""
+    try:
+        limite = int(request.args.get('limit', API_LIMITE_DEFECTO))
+        despues = int(request.args.get('after', 0))
+    except ValueError:
+        raise ValueError('limit y after deben ser enteros')
+    limite = max(1, min(limite, API_LIMITE_MAXIMO))
+
+    campos = [c.strip() for c in request.args.get('fields', '').split(',') if c.strip()]
+    invalidos = [c for c in campos if c not in campos_validos]
+    if invalidos:
+        raise ValueError(f'Campos no válidos: {", ".join(invalidos)}')
+    campos = campos or list(campos_validos)
+    if 'id' not in campos:
+        campos.insert(0, 'id')  # Siempre se devuelve: es el cursor
+    return limite, despues, campos
+
+
+def parametro_float(nombre):
+    valor = request.args.get(nombre)
+    if valor in (None, ''):
+        return None
+    try:
+        return float(valor)
+    except ValueError:
+        raise ValueError(f'{nombre} debe ser numérico')
+
+
+def pagina_keyset(consulta, modelo, campos, limite, despues):
+    """Página ordenada por id a partir del cursor `despues`; devuelve (filas, siguiente_cursor)."""
+    filas = consulta.with_entities(*[getattr(modelo, c) for c in campos])\
+        .filter(modelo.id > despues)\
+        .order_by(modelo.id)\
+        .limit(limite + 1)\
+        .all()
+    siguiente = filas[limite - 1].id if len(filas) > limite else None
+    return [dict(zip(campos, fila)) for fila in filas[:limite]], siguiente
+
+
+def respuesta_catalogo(clave, parametros, generar):
+    """Respuesta JSON condicional y cacheada para datos del catálogo.
+
+    El ETag depende solo de la versión del catálogo y de los parámetros, así que si
+    el cliente ya tiene esa versión se responde 304 sin cuerpo y sin consultar la
+    base de datos. `generar()` devuelve (datos, siguiente_cursor).
+    """
+    version = version_catalogo()
+    huella = hashlib.sha1(repr(parametros).encode()).hexdigest()[:12]
+    etag = f'catalogo-{version}-{clave}-{huella}'
+    if request.if_none_match.contains(etag):
+        respuesta = current_app.response_class(status=304)
+    else:
+        datos, siguiente = cache_catalogo.obtener(('api', clave, parametros, version), generar)
+        respuesta = jsonify(datos)
+        if siguiente is not None:
+            args = request.args.to_dict()
+            args['after'] = siguiente
+            respuesta.headers['X-Siguiente-Cursor'] = str(siguiente)
+            respuesta.headers['Link'] = f'<{url_for(request.endpoint, **request.view_args, **args)}>; rel="next"'
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = 'public, no-cache'  # Guardar copia, pero revalidar siempre
+    return respuesta
+
+@bp.route('/api/restaurantes', methods=['GET'])
 def api_restaurantes():
-    restaurantes = Restaurante.query.all()
-    return jsonify([{
-        'id': r.id,
-        'nombre': r.nombre,
-        'descripcion': r.descripcion,
-        'categoria': r.categoria
-    } for r in restaurantes])
-
-@app.route('/api/menus/<int:restaurante_id>', methods=['GET'])
+    """Restaurantes paginados por cursor (?limit=&after=&fields=&categoria=)."""
+    try:
+        limite, despues, campos = parametros_pagina(('id', 'nombre', 'descripcion', 'categoria'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    categoria = request.args.get('categoria')
+
+    def generar():
+        consulta = Restaurante.query
+        if categoria:
+            consulta = consulta.filter(Restaurante.categoria == categoria)
+        return pagina_keyset(consulta, Restaurante, campos, limite, despues)
+
+    return respuesta_catalogo('restaurantes', (limite, despues, tuple(campos), categoria), generar)
+
+@bp.route('/api/menus/<int:restaurante_id>', methods=['GET'])
 def api_menus(restaurante_id):
-    menus = Menu.query.filter_by(restaurante_id=restaurante_id).all()
-    return jsonify([{
-        'id': m.id,
-        'nombre': m.nombre,
-        'descripcion': m.descripcion,
-        'precio': m.precio,
-        'categoria': m.categoria
-    } for m in menus])
-
-@app.route('/api/agregar_carrito', methods=['POST'])
+    """Menús paginados por cursor (?limit=&after=&fields=&categoria=&precio_min=&precio_max=)."""
+    try:
+        limite, despues, campos = parametros_pagina(('id', 'nombre', 'descripcion', 'precio', 'categoria'))
+        precio_min = parametro_float('precio_min')
+        precio_max = parametro_float('precio_max')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    categoria = request.args.get('categoria')
+
+    def generar():
+        consulta = Menu.query.filter(Menu.restaurante_id == restaurante_id)
+        if categoria:
+            consulta = consulta.filter(Menu.categoria == categoria)
+        if precio_min is not None:
+            consulta = consulta.filter(Menu.precio >= precio_min)
+        if precio_max is not None:
+            consulta = consulta.filter(Menu.precio <= precio_max)
+        return pagina_keyset(consulta, Menu, campos, limite, despues)
+
+    parametros = (limite, despues, tuple(campos), categoria, precio_min, precio_max)
+    return respuesta_catalogo(f'menus-{restaurante_id}', parametros, generar)
+
+@bp.route('/api/buscar', methods=['GET'])
+def api_buscar():
+    """Búsqueda unificada: restaurantes y platos ordenados por relevancia."""
+    q = request.args.get('q', '').strip()
+    limite = max(1, min(request.args.get('limite', 20, type=int), 100))
+    resultados = buscar_catalogo(q, limite=limite)
+
+    puntajes = {(tipo, ref_id): puntaje for tipo, ref_id, _, puntaje in resultados}
+    restaurantes = cargar_en_orden(Restaurante, [r for t, r, _, _ in resultados if t == 'restaurante'])
+    menus = cargar_en_orden(Menu, [r for t, r, _, _ in resultados if t == 'menu'])
+    return jsonify({
+        'consulta': q,
+        'restaurantes': [{
+            'id': r.id,
+            'nombre': r.nombre,
+            'categoria': r.categoria,
+            'puntaje': round(float(puntajes[('restaurante', r.id)]), 3)
+        } for r in restaurantes],
+        'menus': [{
+            'id': m.id,
+            'restaurante_id': m.restaurante_id,
+            'nombre': m.nombre,
+            'precio': m.precio,
+            'categoria': m.categoria,
+            'puntaje': round(float(puntajes[('menu', m.id)]), 3)
+        } for m in menus]
+    })
+
+@bp.route('/api/chatbot/query', methods=['POST'])
+def api_chatbot_query():
+    """Interpreta un pedido en texto libre y devuelve candidatos con su efecto en el carrito.
+
+    Con `agregar: true` (y sesión iniciada) añade el mejor candidato de cada pedido
+    al carrito en la misma petición.
+    """
+    data = request.get_json(silent=True) or {}
+    texto = str(data.get('texto', '')).strip()
+    restaurante_id = data.get('restaurante_id')
+    try:
+        restaurante_id = int(restaurante_id) if restaurante_id not in (None, '') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'restaurante_id inválido'}), 400
+    agregar = bool(data.get('agregar'))
+    if agregar and 'user_id' not in session:
+        return jsonify({'error': 'Debes iniciar sesión para agregar al carrito'}), 403
+
+    pedidos = [
+        (segmento, cantidad, candidatos_alias(tokens, restaurante_id))
+        for segmento, cantidad, tokens in interpretar_pedido(texto)
+    ]
+
+    # Estado actual del carrito para los candidatos: dos consultas en total
+    carrito = Carrito.actual(crear=agregar)
+    en_carrito = {}
+    totales = {}
+    ids = {menu['menu_id'] for _, _, candidatos in pedidos for _, menu in candidatos}
+    if carrito and ids:
+        en_carrito = dict(db.session.query(CarritoItem.menu_id, CarritoItem.cantidad)
+                          .filter(CarritoItem.carrito_id == carrito.id, CarritoItem.menu_id.in_(ids)))
+        totales = dict(db.session.query(CarritoItem.restaurante_id,
+                                        db.func.sum(CarritoItem.precio * CarritoItem.cantidad))
+                       .filter(CarritoItem.carrito_id == carrito.id)
+                       .group_by(CarritoItem.restaurante_id))
+
+    respuesta = []
+    for segmento, cantidad, candidatos in pedidos:
+        subtotales = []
+        for puntaje, menu in candidatos:
+            subtotal = round(menu['precio'] * cantidad, 2)
+            subtotales.append({
+                'menu_id': menu['menu_id'],
+                'nombre': menu['nombre'],
+                'restaurante_id': menu['restaurante_id'],
+                'restaurante': menu['restaurante'],
+                'precio': menu['precio'],
+                'puntaje': puntaje,
+                'subtotal': subtotal,
+                'en_carrito': en_carrito.get(menu['menu_id'], 0),
+                'cantidad_resultante': en_carrito.get(menu['menu_id'], 0) + cantidad,
+                'total_restaurante': round(float(totales.get(menu['restaurante_id'], 0)) + subtotal, 2)
+            })
+        agregado = None
+        if agregar and candidatos:
+            mejor = candidatos[0][1]
+            if carrito.agregar(mejor['restaurante_id'], mejor['menu_id'], cantidad):
+                agregado = subtotales[0]
+        respuesta.append({'texto': segmento, 'cantidad': cantidad, 'candidatos': subtotales, 'agregado': agregado})
+
+    if agregar:
+        db.session.commit()
+    return jsonify({
+        'consulta': texto,
+        'pedidos': respuesta,
+        'carrito': carrito.resumen() if carrito else []
+    })
+
+@bp.route('/api/agregar_carrito', methods=['POST'])
 def api_agregar_carrito():
     if 'user_id' not in session:
         return jsonify({'error': 'Debes iniciar sesión para agregar al carrito'}), 403
 
     data = request.json
-    restaurante_id = str(data.get('restaurante_id'))
-    menu_id = data.get('menu_id')
-    cantidad = data.get('cantidad', 1)
-
-    # Inicializar carrito como diccionario si no existe
-    if 'carrito' not in session or not isinstance(session['carrito'], dict):
-        session['carrito'] = {}
-
-    # Asegurar que el restaurante tenga una lista
-    if restaurante_id not in session['carrito']:
-        session['carrito'][restaurante_id] = []
-
-    carrito_restaurante = session['carrito'][restaurante_id]
-
-    # Buscar si el ítem ya existe
-    for item in carrito_restaurante:
-        if item['menu_id'] == menu_id:
-            item['cantidad'] += cantidad
-            session.modified = True
-            return jsonify({'success': True, 'message': f'{cantidad} ítem(s) agregado(s)'})
-
-    # Si no existe, obtener datos del menú
-    menu = Menu.query.get(menu_id)
-    if not menu:
+    try:
+        restaurante_id = int(data.get('restaurante_id'))
+        menu_id = int(data.get('menu_id'))
+        cantidad = int(data.get('cantidad', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Datos inválidos'}), 400
+
+    carrito = Carrito.actual(crear=True)
+    if not carrito.agregar(restaurante_id, menu_id, cantidad):
+        db.session.rollback()
         return jsonify({'error': 'Menú no encontrado'}), 404
-
-    # Agregar nuevo ítem
-    nuevo_item = {
-        'menu_id': menu_id,
-        'nombre': menu.nombre,
-        'precio': float(menu.precio),
-        'cantidad': cantidad,
-        'restaurante_id': int(restaurante_id)
-    }
-    carrito_restaurante.append(nuevo_item)
-    session['carrito'][restaurante_id] = carrito_restaurante
-    session.modified = True
+    db.session.commit()
 
     return jsonify({'success': True, 'message': 'Ítem agregado al carrito'})
     
 
-@app.route('/api/carrito_resumen')
+@bp.route('/api/carrito_resumen')
 def api_carrito_resumen():
-    if 'carrito' not in session or not isinstance(session['carrito'], dict):
-        return jsonify({'restaurantes': []})
-    
-    resumen = []
-    for rest_id, items in session['carrito'].items():
-        if items:
-            resumen.append({
-                'restaurante_id': int(rest_id),
-                'total_items': sum(i['cantidad'] for i in items)
-            })
-    return jsonify({'restaurantes': resumen})
+    carrito = Carrito.actual()
+    return jsonify({'restaurantes': carrito.resumen() if carrito else []})
+
+CARRITO_LOTE_MAXIMO = 100
+CARRITO_OPERACIONES = ('add', 'set', 'remove')
+
+@bp.route('/api/carrito/batch', methods=['POST'])
+def api_carrito_batch():
+    """Aplica varias operaciones al carrito (de uno o varios restaurantes) en una transacción.
+
+    Cuerpo: {"operaciones": [{"op": "add"|"set"|"remove", "menu_id": 1, "cantidad": 2,
+    "restaurante_id": 1 (opcional)}, ...]}. Si alguna falla no se aplica ninguna: 400 si
+    el cuerpo está mal formado, 404 si un menú o restaurante no existe y 422 si un menú
+    no pertenece al restaurante indicado.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Debes iniciar sesión para modificar el carrito'}), 403
+
+    data = request.get_json(silent=True) or {}
+    crudas = data.get('operaciones')
+    if not isinstance(crudas, list) or not crudas:
+        return jsonify({'error': 'Se requiere una lista de operaciones'}), 400
+    if len(crudas) > CARRITO_LOTE_MAXIMO:
+        return jsonify({'error': f'Máximo {CARRITO_LOTE_MAXIMO} operaciones por petición'}), 400
+
+    operaciones = []
+    errores = []
+    for indice, cruda in enumerate(crudas):
+        try:
+            op = cruda.get('op')
+            if op not in CARRITO_OPERACIONES:
+                raise ValueError
+            operacion = {
+                'op': op,
+                'menu_id': int(cruda['menu_id']),
+                'cantidad': int(cruda.get('cantidad', 1 if op == 'add' else 0)),
+            }
+            if cruda.get('restaurante_id') is not None:
+                operacion['restaurante_id'] = int(cruda['restaurante_id'])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            errores.append({'indice': indice, 'error': 'Operación inválida'})
+            continue
+        if op == 'add' and operacion['cantidad'] < 1:
+            errores.append({'indice': indice, 'error': 'La cantidad debe ser al menos 1'})
+            continue
+        if op == 'set' and operacion['cantidad'] < 0:
+            errores.append({'indice': indice, 'error': 'La cantidad no puede ser negativa'})
+            continue
+        operaciones.append(operacion)
+    if errores:
+        return jsonify({'error': 'Operaciones inválidas', 'errores': errores}), 400
+
+    carrito = Carrito.actual(crear=True)
+    errores = carrito.aplicar_lote(operaciones)
+    if errores:
+        db.session.rollback()
+        # 404 solo si todo lo que falla son ids inexistentes; si no, el lote es inválido
+        estado = 404 if all(codigo == 404 for _, _, codigo in errores) else 422
+        return jsonify({
+            'error': 'No se aplicó ninguna operación',
+            'errores': [{'indice': i, 'error': e} for i, e, _ in errores]
+        }), estado
+    db.session.commit()
+    return jsonify({'success': True, 'carrito': carrito.resumen()})
 
 
 
 
 
-@app.route('/editar_carrito/<int:restaurante_id>/<int:menu_id>', methods=['POST'])
+@bp.route('/editar_carrito/<int:restaurante_id>/<int:menu_id>', methods=['POST'])
 def editar_carrito(restaurante_id, menu_id):
     if 'user_id' not in session:
         flash('Debes iniciar sesión.')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     nueva_cantidad = int(request.form.get('cantidad', 1))
-    restaurante_id_str = str(restaurante_id)
 
-    if 'carrito' not in session or not isinstance(session['carrito'], dict):
-        session['carrito'] = {}
+    carrito = Carrito.actual()
+    if not carrito:
+        return redirect(url_for('main.menu', restaurante_id=restaurante_id))
 
-    if restaurante_id_str not in session['carrito']:
-        return redirect(url_for('menu', restaurante_id=restaurante_id))
+    # Actualizar (o eliminar si la cantidad es 0)
+    if carrito.establecer_cantidad(restaurante_id, menu_id, nueva_cantidad):
+        db.session.commit()
+        if nueva_cantidad <= 0:
+            flash('Ítem eliminado.')
+        else:
+            flash(f'Cantidad actualizada a {nueva_cantidad}.')
 
-    # Buscar y actualizar
-    for item in session['carrito'][restaurante_id_str]:
-        if item['menu_id'] == menu_id:
-            if nueva_cantidad <= 0:
-                session['carrito'][restaurante_id_str].remove(item)
-                flash('Ítem eliminado.')
-            else:
-                item['cantidad'] = nueva_cantidad
-                flash(f'Cantidad actualizada a {nueva_cantidad}.')
-            session.modified = True
-            break
+    return redirect(url_for('main.menu', restaurante_id=restaurante_id))
 
-    return redirect(url_for('menu', restaurante_id=restaurante_id))
-
-
-
-
-
-
-
-
-
-
-
-# Contexto de la aplicación para inicializar la base de datos y poblar datos iniciales
-with app.app_context():
-   # db.create_all()  # Crear todas las tablas definidas
-
-
-    # === DATOS INICIALES PARA PRODUCTOS AGRÍCOLAS ===
-    if not ProductoAgricola.query.first():
-        productos_agricolas = [
-            ProductoAgricola(
-                nombre='Papas Criollas',
-                descripcion='Papas criollas frescas, ideales para sancochos y guisos. Sabor auténtico y textura cremosa.',
-                precio_compra=2.50,
-                precio_venta=4.00,
-                stock=120,
-                imagen='uploads/papas.jfif'
-            ),
-            ProductoAgricola(
-                nombre='Tomates Maduros',
-                descripcion='Tomates rojos maduros, jugosos y dulces. Perfectos para salsas, ensaladas y guisos.',
-                precio_compra=3.20,
-                precio_venta=5.50,
-                stock=80,
-                imagen='uploads/tomates.jfif'
-            ),
-            ProductoAgricola(
-                nombre='Cebolla Cabezona',
-                descripcion='Cebolla cabezona blanca, esencial para sofritos, sopas y todo tipo de preparaciones.',
-                precio_compra=2.80,
-                precio_venta=4.20,
-                stock=95,
-                imagen='uploads/cebollas.jfif'
-            ),
-            ProductoAgricola(
-                nombre='Arveja Fresca',
-                descripcion='Arveja fresca y dulce, ideal para guisos, sopas y ensaladas. Alto valor nutricional.',
-                precio_compra=4.50,
-                precio_venta=6.80,
-                stock=60,
-                imagen='uploads/arvejas.jfif'
-            ),
-            ProductoAgricola(
-                nombre='Zanahoria Orgánica',
-                descripcion='Zanahorias orgánicas crujientes y dulces. Perfectas para jugos, ensaladas y guarniciones.',
-                precio_compra=2.20,
-                precio_venta=3.80,
-                stock=110,
-                imagen='uploads/zanahorias.jfif'
-            ),
-            ProductoAgricola(
-                nombre='Cilantro Fresco',
-                descripcion='Cilantro fresco recién cosechado. Aroma intenso para sopas, guisos y salsas.',
-                precio_compra=1.80,
-                precio_venta=3.00,
-                stock=75,
-                imagen='uploads/cilantro.jfif'
-            ),
-            ProductoAgricola(
-                nombre='Ajo Nacional',
-                descripcion='Ajo fresco nacional, esencial para dar sabor a todo tipo de preparaciones culinarias.',
-                precio_compra=3.50,
-                precio_venta=5.20,
-                stock=50,
-                imagen='uploads/ajos.jfif'
-            )
-        ]
-        
-        db.session.bulk_save_objects(productos_agricolas)
-        db.session.commit()
-        print("✅ Productos agrícolas básicos creados: Papas, Tomates, Cebollas, Arveja, Zanahoria")
 
 
 
 
 
-    if not Restaurante.query.first():  # Verificar si no hay restaurantes
-        restaurante_image_path = 'C:/Users/ASUS/Pictures/restaurante.jpg'  # Ruta de imagen predeterminada para restaurantes
-        menu_image_path = 'C:/Users/ASUS/Pictures/menu.jpg'  # Ruta de imagen predeterminada para menús
-        
-        # Lista de restaurantes iniciales
-        restaurantes = [
-            Restaurante(
-                nombre='Wabi Sabi Sushi Bar',
-                descripcion='Restaurante especializado en sushi y cocina japonesa auténtica',
-                categoria='Sushi',
-                imagen='uploads/wabisabisushibar.jpg'
-            ),
-            Restaurante(
-                nombre='PamDay',
-                descripcion='Sushi fresco y auténtico con un toque moderno',
-                categoria='Sushi',
-                imagen=copy_image_from_path(restaurante_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pamday.jpg'
-            )
-        ]
-        
-        # Agregar más restaurantes
-        restaurantes.extend([
-            Restaurante(
-                nombre='Pollo Broaster La Brasil',
-                descripcion='Especialistas en pollo broaster crujiente',
-                categoria='Pollo',
-                imagen=copy_image_from_path(restaurante_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pollobrosterlabrasil.jpg'
-            ),
-            Restaurante(
-                nombre='Kroky',
-                descripcion='Pollo broaster con un toque único',
-                categoria='Pollo',
-                imagen=copy_image_from_path(restaurante_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/kroky.jpg'
-            )
-        ])
-        
-        restaurantes.extend([
-            Restaurante(
-                nombre="Q'Riko!",
-                descripcion='Sabores auténticos de la cocina china',
-                categoria='Casa China',
-                imagen=copy_image_from_path(restaurante_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/qriko.jpg'
-            ),
-            Restaurante(
-                nombre="FORTUNA'Z",
-                descripcion='Tradición china en cada plato',
-                categoria='Casa China',
-                imagen=copy_image_from_path(restaurante_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/fortunaz.jpg'
-            ),
-            Restaurante(
-                nombre='Casa China Restaurante',
-                descripcion='Un clásico de la comida china',
-                categoria='Casa China',
-                imagen=copy_image_from_path(restaurante_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/casachinarestaurante.jpg'
-            )
-        ])
-        
-        restaurantes.extend([
-            Restaurante(
-                nombre='Alitas y algo más',
-                descripcion='Alitas y opciones rápidas para todos los gustos',
-                categoria='Comidas Rápidas',
-                imagen=copy_image_from_path(restaurante_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/alitasyalgomas.jpg'
-            ),
-            Restaurante(
-                nombre='Chervo Pizza',
-                descripcion='Pizzas rápidas y deliciosas',
-                categoria='Comidas Rápidas',
-                imagen=copy_image_from_path(restaurante_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/chervopizza.jpg'
-            ),
-            Restaurante(
-                nombre='Pizzeria LUWAK',
-                descripcion='Pizzas artesanales para llevar',
-                categoria='Comidas Rápidas',
-                imagen=copy_image_from_path(restaurante_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pizerialuwak.jpg'
-            ),
-            Restaurante(
-                nombre='Pizza Express',
-                descripcion='Entrega rápida de pizzas frescas',
-                categoria='Comidas Rápidas',
-                imagen=copy_image_from_path(restaurante_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pizzaexpress.jpg'
-            )
-        ])
-        
-        db.session.bulk_save_objects(restaurantes)  # Guardar restaurantes en la base de datos
-        db.session.commit()
 
-        # Menús para Wabi Sabi Sushi Bar
-        menus_wabi = [
-            Menu(
-                restaurante_id=1,
-                nombre='Edamame',
-                descripcion='Vainas de soja al vapor',
-                precio=4.50,
-                categoria='Entradas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Edamame.jpeg'
-            ),
-            Menu(
-                restaurante_id=1,
-                nombre='Vegetales Tempura',
-                descripcion='Mix de vegetales de tempura, rebosados en tempura, acompañados de salsa ponzu',
-                precio=5.00,
-                categoria='Entradas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/VegetalesTempura.jpeg'
-            ),
-            Menu(
-                restaurante_id=1,
-                nombre='Guozas de Cerdo',
-                descripcion='Tradicionales empanadillas japonesas rellenas de cerdo, cebolla, jengibre y col',
-                precio=5.00,
-                categoria='Entradas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/GuozasdeCerdo.jpeg'
-            ),
-            Menu(
-                restaurante_id=1,
-                nombre='Okonomiyaki de Cerdo',
-                descripcion='Tradicional tortilla japonesa cocida a la plancha rellena de cerdo y vegetales con una cobertura de salsa TonKatsu, mayonesa y katsuobushi',
-                precio=7.50,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/OkonomiyakideCerdo.jpeg'
-            ),
-            Menu(
-                restaurante_id=1,
-                nombre='Karaage',
-                descripcion='Pollo frito estilo japonés, guarnición de arroz furikake',
-                precio=9.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Karaage.jpeg'
-            ),
-            Menu(
-                restaurante_id=1,
-                nombre='Ramen Vegetariano',
-                descripcion='Sopa a base de fondo de vegetales y hongos shitake. Ajitama, huevo cocido marinado, maíz dulce, tofu al banco y vegetales de temporada',
-                precio=9.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/RamenVegetariano.jpeg'
-            )
-        ]
-        db.session.bulk_save_objects(menus_wabi)
-        db.session.commit()
 
-        # Menús para PamDay
-        menus_pamday = [
-            Menu(
-                restaurante_id=2,
-                nombre='Tokio Sushi',
-                descripcion='12 bocados de sushi, 1 tipo de rollito a elección acompañados con vegetales y s17.50',
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Kappuru.jpeg'
-            ),
-            Menu(
-                restaurante_id=2,
-                nombre='Kita Midori',
-                descripcion='Camarón furai, queso crema, vegetales tempura, cubierto de aguacate caramelizado',
-                precio=8.00,
-                categoria='Rollitos',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/KitaMidori.jpeg'
-            ),
-            Menu(
-                restaurante_id=2,
-                nombre='Ramen',
-                descripcion='Una perfecta combinación de sabores, viene acompañado por panceta, naruto (cangrejo), cebollín, champiñones, zanahoria y huevo cocido marinado en una salsa especial',
-                precio=5.50,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Ramen.jpeg'
-            ),
-            Menu(
-                restaurante_id=2,
-                nombre='Sushi Dog',
-                descripcion='Un rollo crocante, frito totalmente cubierto de panko y relleno de pollo especial bbq, lechuga y aguacate cubierto con una mayonesa especial y queso cheddar semipicante',
-                precio=6.75,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/SushiDog.jpeg'
-            ),
-            Menu(
-                restaurante_id=2,
-                nombre='Infusión Maracuyá',
-                descripcion='Bebida refrescante a base de maracuyá',
-                precio=1.50,
-                categoria='Bebidas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/InfusiónMaracuyá.jpeg'
-            )
-        ]
-        db.session.bulk_save_objects(menus_pamday)
-        db.session.commit()
 
-        # Menús para Pollo Broaster La Brasil
-        menus_pollobrasil = [
-            Menu(
-                restaurante_id=3,
-                nombre='Papas fritas + Presa de pollo',
-                descripcion='Porción de papas fritas acompañada de una presa de pollo',
-                precio=1.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/papas + presa.png'
-            ),
-            Menu(
-                restaurante_id=3,
-                nombre='Arroz + Papas fritas + Presa de pollo',
-                descripcion='Combinación de arroz, papas fritas y una presa de pollo',
-                precio=1.30,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/arroz + papas +presa.jpeg'
-            ),
-            Menu(
-                restaurante_id=3,
-                nombre='Arroz + Papas fritas + Pechuga',
-                descripcion='Combinación de arroz, papas fritas y una pechuga de pollo',
-                precio=1.50,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/arroz + papas + pechuga.jpeg'
-            ),
-            Menu(
-                restaurante_id=3,
-                nombre='Papas fritas + 2 Presas de pollo',
-                descripcion='Porción de papas fritas con dos presas de pollo',
-                precio=2.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/papas + 2 presas.jpeg'
-            ),
-            Menu(
-                restaurante_id=3,
-                nombre='Choripapa',
-                descripcion='Papas fritas con chorizo',
-                precio=1.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/choripapa.jpeg'
-            ),
-            Menu(
-                restaurante_id=3,
-                nombre='Salchipapa',
-                descripcion='Papas fritas con salchicha',
-                precio=0.70,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/salchipapa.jpeg'
-            )
-        ]
-        db.session.bulk_save_objects(menus_pollobrasil)
-        db.session.commit()
 
-        # Menús para Kroky
-        menus_kroky = [
-            Menu(
-                restaurante_id=4,
-                nombre='1/2 Porción: 1 Presa + Papas',
-                descripcion='Media porción con una presa de pollo y papas fritas',
-                precio=2.35,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/1-2Porción1Presa+Papas.jpeg'
-            ),
-            Menu(
-                restaurante_id=4,
-                nombre='1 Porción: 2 Presas + Papas',
-                descripcion='Porción completa con dos presas de pollo y papas fritas',
-                precio=3.90,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/1Porción2 Presas+Papas.jpeg'
-            ),
-            Menu(
-                restaurante_id=4,
-                nombre='1/2 Pollo: 4 Presas + Papas',
-                descripcion='Media pollo con cuatro presas y papas fritas',
-                precio=8.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/1-2Pollo4Presas+Papas.jpeg'
-            ),
-            Menu(
-                restaurante_id=4,
-                nombre='1 Pollo: 8 Presas + Papas',
-                descripcion='Pollo entero con ocho presas y papas fritas',
-                precio=15.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/1Pollo8Presas+Papas.jpeg'
-            ),
-            Menu(
-                restaurante_id=4,
-                nombre='Hamburguesa',
-                descripcion='Hamburguesa clásica',
-                precio=2.50,
-                categoria='Comidas Rápidas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Hamburguesa.jpeg'
-            ),
-            Menu(
-                restaurante_id=4,
-                nombre='Salchipapa',
-                descripcion='Papas fritas con salchicha',
-                precio=2.00,
-                categoria='Comidas Rápidas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Salchipapa.jpeg'
-            )
-        ]
-        db.session.bulk_save_objects(menus_kroky)
-        db.session.commit()
 
-        # Menús para Q'Riko!
-        menus_qriko = [
-            Menu(
-                restaurante_id=5,
-                nombre='Chaufa de Pollo',
-                descripcion='Arroz frito con pollo, verduras y salsa de soja',
-                precio=2.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/chaufa pollo.jpeg'
-            ),
-            Menu(
-                restaurante_id=5,
-                nombre='Chaufa de Carne',
-                descripcion='Arroz frito con carne, verduras y salsa de soja',
-                precio=2.20,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/chaulafan de carne.jpeg'
-            ),
-            Menu(
-                restaurante_id=5,
-                nombre='Chaufa Mixto',
-                descripcion='Arroz frito con pollo, carne, verduras y salsa de soja',
-                precio=2.50,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/chaulafan de mixto.jpeg'
-            ),
-            Menu(
-                restaurante_id=5,
-                nombre='Pollo Chi jau kai',
-                descripcion='Pollo apanado con salsa agridulce y verduras',
-                precio=2.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pollo chi.jpeg'
-            ),
-            Menu(
-                restaurante_id=5,
-                nombre='Tallarín Saltado de Pollo',
-                descripcion='Tallarines salteados con pollo y verduras',
-                precio=2.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/tallarin salteado de pollo.jpeg'
-            ),
-            Menu(
-                restaurante_id=5,
-                nombre='Tallarín Saltado Mixto',
-                descripcion='Tallarines salteados con pollo, carne y verduras',
-                precio=2.50,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/tallarin salteado mixto.jpeg'
-            )
-        ]
-        db.session.bulk_save_objects(menus_qriko)
-        db.session.commit()
+# === COMANDOS CLI ===
+@bp.cli.command('reconciliar-contadores')
+def reconciliar_contadores():
+    """Recalcula los contadores de restaurantes y la popularidad de menús desde los pedidos.
 
-        # Menús para FORTUNA'Z
-        menus_fortunaz = [
-            Menu(
-                restaurante_id=6,
-                nombre='Chaufa de Pollo',
-                descripcion='Arroz frito con pollo, verduras y salsa de soja',
-                precio=2.50,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/chaufa pollo 2.jpeg'
-            ),
-            Menu(
-                restaurante_id=6,
-                nombre='Taypa Especial',
-                descripcion='Combinación de carnes y verduras salteadas en salsa especial',
-                precio=8.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/taypa.jpeg'
-            ),
-            Menu(
-                restaurante_id=6,
-                nombre='Pollo Tipakay',
-                descripcion='Pollo apanado con salsa agridulce y acompañamiento',
-                precio=2.50,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/tipakay.jpeg'
-            ),
-            Menu(
-                restaurante_id=6,
-                nombre='Aeropuerto Especial',
-                descripcion='Arroz chaufa con tallarines, pollo, carne y verduras',
-                precio=4.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/aeropuerto especial.jpeg'
-            )
-        ]
-        db.session.bulk_save_objects(menus_fortunaz)
-        db.session.commit()
+    Los pedidos archivados (`flask archivar-pedidos`) ya no están en línea: cada contador
+    parte de su columna `archivados` y suma lo que queda en las tablas de pedidos.
+    """
+    contadores = {rid: {'restaurante_id': rid, 'archivados': n, 'total_pedidos': n}
+                  for rid, n in db.session.query(ContadorRestaurante.restaurante_id, ContadorRestaurante.archivados)
+                                          .filter(ContadorRestaurante.archivados > 0)}
+    conteos = db.session.query(Pedido.restaurante_id, db.func.count(Pedido.id))\
+        .group_by(Pedido.restaurante_id)\
+        .all()
+    for rid, total in conteos:
+        contadores.setdefault(rid, {'restaurante_id': rid, 'archivados': 0, 'total_pedidos': 0})['total_pedidos'] += total
+    ContadorRestaurante.query.delete()
+    db.session.bulk_insert_mappings(ContadorRestaurante, list(contadores.values()))
+
+    # Popularidad de menús: se recorre en bloques para no cargar todo el historial. El
+    # puntaje de lo archivado no se conserva: con meses de antigüedad ya pesaba ~0.
+    popularidad = {menu_id: {'menu_id': menu_id, 'restaurante_id': rid, 'archivados': n, 'total_pedidos': n, 'puntaje': 0.0}
+                   for menu_id, rid, n in db.session.query(PopularidadMenu.menu_id, PopularidadMenu.restaurante_id,
+                                                           PopularidadMenu.archivados)
+                                                    .filter(PopularidadMenu.archivados > 0)}
+    epoca = epoca_popularidad(bloquear=True)
+    filas = db.session.query(PedidoItem.menu_id, Menu.restaurante_id, Pedido.fecha)\
+        .join(Pedido, db.and_(PedidoItem.pedido_id == Pedido.id, PedidoItem.fecha == Pedido.fecha))\
+        .join(Menu, PedidoItem.menu_id == Menu.id)\
+        .execution_options(yield_per=10000)
+    for menu_id, restaurante_id, fecha in filas:
+        fila = popularidad.setdefault(menu_id, {
+            'menu_id': menu_id, 'restaurante_id': restaurante_id, 'archivados': 0, 'total_pedidos': 0, 'puntaje': 0.0
+        })
+        fila['total_pedidos'] += 1
+        fila['puntaje'] += peso_popularidad(fecha or epoca, epoca)
+    PopularidadMenu.query.delete()
+    db.session.bulk_insert_mappings(PopularidadMenu, list(popularidad.values()))
 
-        # Menús para Casa China Restaurante
-        menus_casachina = [
-            Menu(
-                restaurante_id=7,
-                nombre='Chaufa de Pollo',
-                descripcion='Arroz frito con pollo, verduras y salsa de soja',
-                precio=2.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/chaulafan de pollo.jpeg'
-            ),
-            Menu(
-                restaurante_id=7,
-                nombre='Pollo Chi Jau Kai',
-                descripcion='Pollo apanado con salsa agridulce y verduras',
-                precio=2.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pollo chi2.jpeg'
-            ),
-            Menu(
-                restaurante_id=7,
-                nombre='Chaufa de Pollo',
-                descripcion='Arroz frito con pollo, verduras y salsa de soja',
-                precio=2.50,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/chaufa pollo.jpeg'
-            ),
-            Menu(
-                restaurante_id=7,
-                nombre='Taypa Especial',
-                descripcion='Combinación de carnes y verduras salteadas en salsa especial',
-                precio=8.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/taypa.jpeg'
-            ),
-            Menu(
-                restaurante_id=7,
-                nombre='Pollo Tipakay',
-                descripcion='Pollo apanado con salsa agridulce y acompañamiento',
-                precio=2.50,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/tipakay.jpeg'
-            ),
-            Menu(
-                restaurante_id=7,
-                nombre='Aeropuerto Especial',
-                descripcion='Arroz chaufa con tallarines, pollo, carne y verduras',
-                precio=4.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/aeropuerto especial.jpeg'
-            )
-        ]
-        db.session.bulk_save_objects(menus_casachina)
-        db.session.commit()
+    db.session.commit()
+    click.echo(f'Contadores reconciliados para {len(contadores)} restaurantes y {len(popularidad)} menús.')
+
+
+@bp.cli.command('rebasar-popularidad')
+def rebasar_popularidad():
+    """Mueve la época de la popularidad a hoy y reescala los puntajes (cron, p. ej. semanal).
+
+    Sin esto el peso de cada venta, 2^(días desde la época / vida media), crece sin
+    límite hasta desbordar el float. El orden entre menús no cambia.
+    """
+    fila = db.session.query(EpocaPopularidad).filter_by(id=1).with_for_update().first()
+    if fila is None:
+        fila = EpocaPopularidad(id=1, epoca=POPULARIDAD_EPOCA)
+        db.session.add(fila)
+    nueva = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    dias = (nueva - fila.epoca).total_seconds() / 86400
+    if dias <= 0:
+        db.session.rollback()
+        click.echo('La época de popularidad ya está al día.')
+        return
+    # Los puntajes muy antiguos pueden quedar en 0.0: ya no pesaban frente a los recientes
+    factor = 2 ** (-dias / POPULARIDAD_VIDA_MEDIA_DIAS)
+    total = PopularidadMenu.query.update({PopularidadMenu.puntaje: PopularidadMenu.puntaje * factor},
+                                         synchronize_session=False)
+    fila.epoca = nueva
+    db.session.commit()
+    click.echo(f'Época de popularidad movida a {nueva:%Y-%m-%d}; {total} puntajes reescalados.')
 
-        # Menús para Alitas y algo más
-        menus_alitas = [
-            Menu(
-                restaurante_id=8,
-                nombre='Alitas BBQ (6 unidades)',
-                descripcion='Alitas de pollo con salsa BBQ, acompañadas de papas fritas',
-                precio=4.50,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Alitas BBQ (6 unidades).jpeg'
-            ),
-            Menu(
-                restaurante_id=8,
-                nombre='Alitas Picantes (6 unidades)',
-                descripcion='Alitas de pollo con salsa picante, acompañadas de papas fritas',
-                precio=4.50,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Alitas Picantes (6 unidades).jpeg'
-            ),
-            Menu(
-                restaurante_id=8,
-                nombre='Hamburguesa Clásica',
-                descripcion='Hamburguesa con carne, lechuga, tomate y salsa especial',
-                precio=3.00,
-                categoria='Comidas Rápidas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Hamburguesa Clásica.jpeg'
-            ),
-            Menu(
-                restaurante_id=8,
-                nombre='Salchipapa Grande',
-                descripcion='Papas fritas con salchicha y salsas',
-                precio=2.50,
-                categoria='Comidas Rápidas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Salchipapa Grande.jpeg'
-            ),
-            Menu(
-                restaurante_id=8,
-                nombre='Combo Familiar (12 alitas)',
-                descripcion='12 alitas (mezcla de BBQ y picantes) con papas fritas grandes',
-                precio=8.00,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Combo Familiar (12 alitas).jpeg'
-            ),
-            Menu(
-                restaurante_id=8,
-                nombre='Nuggets de Pollo (8 unidades)',
-                descripcion='Nuggets de pollo crujientes con salsa a elección',
-                precio=3.50,
-                categoria='Platos Fuertes',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Nuggets de Pollo (8 unidades).jpeg'
-            )
-        ]
-        db.session.bulk_save_objects(menus_alitas)
-        db.session.commit()
 
-        # Menús para Chervo Pizza
-        menus_chervo = [
-            Menu(
-                restaurante_id=9,
-                nombre='Pizza Hawaiana (Mediana)',
-                descripcion='Pizza con jamón, piña, queso mozzarella y salsa de tomate',
-                precio=6.00,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Pizza Hawaiana (Mediana).jpeg'
-            ),
-            Menu(
-                restaurante_id=9,
-                nombre='Pizza Pepperoni (Mediana)',
-                descripcion='Pizza con pepperoni, queso mozzarella y salsa de tomate',
-                precio=6.50,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pizza peperoni.jpeg'
-            ),
-            Menu(
-                restaurante_id=9,
-                nombre='Pizza Vegetariana (Mediana)',
-                descripcion='Pizza con vegetales frescos, queso mozzarella y salsa de tomate',
-                precio=5.50,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pizza vegetariana.jpeg'
-            ),
-            Menu(
-                restaurante_id=9,
-                nombre='Pizza Suprema (Grande)',
-                descripcion='Pizza con pepperoni, jamón, champiñones, pimientos y queso',
-                precio=9.00,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Pizza Suprema (Grande).jpeg'
-            ),
-            Menu(
-                restaurante_id=9,
-                nombre='Pizza Cuatro Quesos (Mediana)',
-                descripcion='Pizza con mozzarella, cheddar, parmesano y gorgonzola',
-                precio=7.00,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Pizza Cuatro Quesos (Mediana).jpeg'
-            ),
-            Menu(
-                restaurante_id=9,
-                nombre='Pizza Margarita (Pequeña)',
-                descripcion='Pizza clásica con tomate, mozzarella y albahaca',
-                precio=4.00,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Pizza Margarita (Pequeña).jpeg'
-            )
-        ]
-        db.session.bulk_save_objects(menus_chervo)
-        db.session.commit()
+@bp.cli.command('indexar-busqueda')
+def indexar_busqueda():
+    """Reconstruye el índice de búsqueda de restaurantes y menús."""
+    total = reindexar_busqueda()
+    db.session.commit()
+    click.echo(f'Índice de búsqueda reconstruido: {total} documentos.')
 
-        # Menús para Pizzeria LUWAK
-        menus_luwak = [
-            Menu(
-                restaurante_id=10,
-                nombre='Pizza Clásica de Jamón (Mediana)',
-                descripcion='Pizza con jamón, queso mozzarella y salsa de tomate',
-                precio=5.50,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pizza jamon.jpeg'
-            ),
-            Menu(
-                restaurante_id=10,
-                nombre='Pizza de Pepperoni (Mediana)',
-                descripcion='Pizza con pepperoni, queso mozzarella y salsa de tomate',
-                precio=6.00,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pizza peperoni.jpeg'
-            ),
-            Menu(
-                restaurante_id=10,
-                nombre='Pizza Vegetariana (Grande)',
-                descripcion='Pizza con vegetales frescos, queso y salsa de tomate',
-                precio=8.00,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pizza vegetariana.jpeg'
-            ),
-            Menu(
-                restaurante_id=10,
-                nombre='Pizza de Pollo BBQ (Mediana)',
-                descripcion='Pizza con pollo, salsa BBQ, queso y cebolla',
-                precio=6.50,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pizza bbq.jpeg'
-            ),
-            Menu(
-                restaurante_id=10,
-                nombre='Pizza de Champiñones (Pequeña)',
-                descripcion='Pizza con champiñones, queso mozzarella y salsa de tomate',
-                precio=4.50,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pizza champiñones.jpeg'
-            ),
-            Menu(
-                restaurante_id=10,
-                nombre='Pizza Mixta (Grande)',
-                descripcion='Pizza con jamón, pepperoni, vegetales y queso',
-                precio=9.50,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pizza mixta.jpeg'
-            )
-        ]
-        db.session.bulk_save_objects(menus_luwak)
-        db.session.commit()
 
-        # Menús para Pizza Express
-        menus_pizzaexpress = [
-            Menu(
-                restaurante_id=11,
-                nombre='Pizza de Jamón y Queso (Mediana)',
-                descripcion='Pizza con jamón, queso mozzarella y salsa de tomate',
-                precio=5.00,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pizza jamon.jpeg'
-            ),
-            Menu(
-                restaurante_id=11,
-                nombre='Pizza de Pepperoni (Grande)',
-                descripcion='Pizza con pepperoni, queso mozzarella y salsa de tomate',
-                precio=8.50,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/pizza peperoni.jpeg'
-            ),
-            Menu(
-                restaurante_id=11,
-                nombre='Pizza Hawaiana (Pequeña)',
-                descripcion='Pizza con jamón, piña, queso y salsa de tomate',
-                precio=4.00,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Pizza Hawaiana (Pequeña).jpeg'
-            ),
-            Menu(
-                restaurante_id=11,
-                nombre='Pizza de Pollo y Champiñones (Mediana)',
-                descripcion='Pizza con pollo, champiñones, queso y salsa de tomate',
-                precio=6.50,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Pizza de Pollo y Champiñones (Mediana).jpeg'
-            ),
-            Menu(
-                restaurante_id=11,
-                nombre='Pizza Cuatro Estaciones (Grande)',
-                descripcion='Pizza con jamón, champiñones, alcachofas y aceitunas',
-                precio=9.00,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Pizza Cuatro Estaciones (Grande).jpeg'
-            ),
-            Menu( 
-                restaurante_id=11,
-                nombre='Pizza Margarita (Mediana)',
-                descripcion='Pizza clásica con tomate, mozzarella y albahaca',
-                precio=5.00,
-                categoria='Pizzas',
-                imagen=copy_image_from_path(menu_image_path, app.config['UPLOAD_FOLDER']) or 'uploads/Pizza Margarita (Mediana).jpeg'
-            )
-        ]
-        db.session.bulk_save_objects(menus_pizzaexpress)
-        db.session.commit()
+@bp.cli.command('limpiar-carritos')
+@click.option('--dias', default=7, show_default=True, help='Antigüedad mínima de los carritos a borrar.')
+def limpiar_carritos(dias):
+    """Elimina carritos abandonados que no se modifican hace más de `--dias`."""
+    limite = datetime.utcnow() - timedelta(days=dias)
+    viejos = db.session.query(Carrito.id).filter(Carrito.actualizado < limite)
+    CarritoItem.query.filter(CarritoItem.carrito_id.in_(viejos.scalar_subquery())).delete(synchronize_session=False)
+    borrados = Carrito.query.filter(Carrito.actualizado < limite).delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Carritos eliminados: {borrados}.')
 
-    # Crear usuario administrador por defecto si no existe
-    if not Usuario.query.filter_by(email='admin@admin.saboresexpress.com').first():
-        admin = Usuario(nombre='Administrador', email='admin@admin.saboresexpress.com', password='admin123')
-        db.session.add(admin)
-        db.session.commit()
 
+@bp.cli.command('limpiar-claves')
+@click.option('--dias', default=2, show_default=True, help='Antigüedad mínima de las claves a borrar.')
+def limpiar_claves(dias):
+    """Elimina claves de idempotencia (y sus facturas guardadas) de más de `--dias`."""
+    limite = datetime.utcnow() - timedelta(days=dias)
+    borradas = ClaveIdempotencia.query.filter(ClaveIdempotencia.creada < limite).delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Claves eliminadas: {borradas}.')
+
+
+@bp.cli.command('reconstruir-ventas')
+def reconstruir_ventas():
+    """Reconstruye la tabla ventas_diarias agrupando los pedidos por restaurante y día.
+
+    Los días anteriores al primer pedido en línea (meses archivados) se conservan.
+    """
+    dia = db.func.date(Pedido.fecha)
+    filas = db.session.query(
+        Pedido.restaurante_id, dia, db.func.count(Pedido.id), db.func.coalesce(db.func.sum(Pedido.total), 0)
+    ).group_by(Pedido.restaurante_id, dia)\
+     .all()
+    primero = db.session.query(db.func.min(Pedido.fecha)).scalar()
+    if primero:
+        VentaDiaria.query.filter(VentaDiaria.dia >= primero.date()).delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(VentaDiaria, [
+        {
+            'restaurante_id': restaurante_id,
+            # SQLite devuelve date() como texto
+            'dia': date.fromisoformat(d) if isinstance(d, str) else d,
+            'pedidos': pedidos,
+            'ingresos': ingresos
+        }
+        for restaurante_id, d, pedidos, ingresos in filas
+    ])
+    db.session.commit()
+    click.echo(f'Ventas diarias reconstruidas: {len(filas)} filas.')
+
+
+@bp.cli.command('bench-checkout')
+@click.option('--repeticiones', default=20, show_default=True)
+@click.option('--lineas', default='1,10,50', show_default=True, help='Tamaños de carrito a medir.')
+def bench_checkout(repeticiones, lineas):
+    """Mide consultas y latencia de registrar_pedido para carritos de varios tamaños.
+
+    Trabaja con menús, usuario y carrito temporales dentro de una transacción que se
+    revierte al final; no deja datos.
+    """
+    restaurante = Restaurante.query.first()
+    if not restaurante:
+        raise click.ClickException('No hay restaurantes')
+    tamaños = [int(n) for n in lineas.split(',')]
+    usuario = Usuario(nombre='bench', email=f'bench-{uuid.uuid4().hex}@local', password='x')
+    menus = [Menu(restaurante_id=restaurante.id, nombre=f'bench {i}', precio=10.0 + i, categoria='bench')
+             for i in range(max(tamaños))]
+    db.session.add(usuario)
+    db.session.add_all(menus)
+    db.session.flush()
+
+    consultas = [0]
+    def contar(*args):
+        consultas[0] += 1
+    motor = db.session.get_bind()
+    db.event.listen(motor, 'before_cursor_execute', contar)
+    try:
+        for n in tamaños:
+            tiempos, conteos = [], []
+            for _ in range(repeticiones):
+                carrito = Carrito(id=uuid.uuid4().hex)
+                db.session.add(carrito)
+                db.session.add_all(CarritoItem(carrito_id=carrito.id, menu_id=m.id, restaurante_id=restaurante.id,
+                                               nombre=m.nombre, precio=m.precio, cantidad=2)
+                                   for m in menus[:n])
+                db.session.flush()
+                items = carrito.items_de(restaurante.id)
+                consultas[0] = 0
+                inicio = time.perf_counter()
+                pedido, _, errores = registrar_pedido(carrito, restaurante.id, items, {
+                    'usuario_id': usuario.id, 'metodo_pago': 'efectivo', 'tipo_entrega': 'domicilio'
+                })
+                db.session.flush()
+                tiempos.append(time.perf_counter() - inicio)
+                conteos.append(consultas[0])
+                if errores:
+                    raise click.ClickException('; '.join(errores))
+            tiempos.sort()
+            click.echo(f'{n:>3} líneas: {max(conteos)} consultas, '
+                       f'p50 {tiempos[len(tiempos) // 2] * 1000:.2f} ms, máx {tiempos[-1] * 1000:.2f} ms')
+    finally:
+        db.event.remove(motor, 'before_cursor_execute', contar)
+        db.session.rollback()
+
+
+@bp.cli.command('bench-finanzas')
+@click.option('--restaurantes', default=10000, show_default=True)
+@click.option('--dias', default=30, show_default=True, help='Días de ventas por restaurante.')
+@click.option('--repeticiones', default=5, show_default=True)
+def bench_finanzas(restaurantes, dias, repeticiones):
+    """Mide el cálculo de /admin/finanzas con `--restaurantes` restaurantes temporales.
+
+    Los restaurantes, sus ventas diarias y parámetros se insertan en una transacción
+    que se revierte al final; no deja datos.
+    """
+    hoy = date.today()
+    primero = (db.session.query(db.func.max(Restaurante.id)).scalar() or 0) + 1
+    ids = range(primero, primero + restaurantes)
+    db.session.execute(db.insert(Restaurante), [
+        {'id': i, 'nombre': f'bench {i}', 'categoria': 'bench'} for i in ids
+    ])
+    db.session.execute(db.insert(VentaDiaria), [
+        {'restaurante_id': i, 'dia': hoy - timedelta(days=d), 'pedidos': 1 + i % 7, 'ingresos': 10.0 + (i * d) % 90}
+        for i in ids for d in range(dias)
+    ])
+    # Un tercio con proporciones propias
+    db.session.execute(db.insert(ParametroFinanciero), [
+        {'restaurante_id': i, 'proporcion_costo': 0.55, 'proporcion_activo_corriente': 0.7,
+         'proporcion_pasivo_corriente': 0.9}
+        for i in ids[::3]
+    ])
+    db.session.flush()
+
+    inicio_mes, fin_mes = rango_mes(hoy.year, hoy.month)
+    inicio_año, fin_año = rango_año(hoy.year)
+    medidas = {'consulta': [], 'cálculo': [], 'filas': []}
+    try:
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            filas, matriz = columnas_finanzas(inicio_mes, fin_mes, inicio_año, fin_año)
+            t1 = time.perf_counter()
+            balance, _, _ = calcular_balance(matriz)
+            t2 = time.perf_counter()
+            filas_balance(filas, balance)
+            t3 = time.perf_counter()
+            for fase, segundos in zip(medidas, (t1 - t0, t2 - t1, t3 - t2)):
+                medidas[fase].append(segundos)
+        click.echo(f'{len(filas)} restaurantes, {restaurantes * dias} ventas diarias')
+        for fase, tiempos in medidas.items():
+            tiempos.sort()
+            click.echo(f'{fase:<9} p50 {tiempos[len(tiempos) // 2] * 1000:8.2f} ms, máx {tiempos[-1] * 1000:8.2f} ms')
+    finally:
+        db.session.rollback()
+
+
+@bp.cli.command('parametros-financieros')
+@click.argument('restaurante_id', type=int)
+@click.option('--costo', type=click.FloatRange(0, 1), help='Proporción de costo sobre ingresos.')
+@click.option('--activo-corriente', type=click.FloatRange(0, 1), help='Proporción corriente del activo.')
+@click.option('--pasivo-corriente', type=click.FloatRange(0, 1), help='Proporción corriente del pasivo.')
+@click.option('--restablecer', is_flag=True, help='Vuelve a las proporciones por defecto.')
+def parametros_financieros(restaurante_id, costo, activo_corriente, pasivo_corriente, restablecer):
+    """Muestra o cambia las proporciones del balance de un restaurante."""
+    restaurante = db.session.get(Restaurante, restaurante_id)
+    if not restaurante:
+        raise click.ClickException(f'No existe el restaurante {restaurante_id}')
+    parametros = restaurante.parametros_financieros
+    if restablecer:
+        restaurante.parametros_financieros = parametros = None
+    cambios = {
+        'proporcion_costo': costo,
+        'proporcion_activo_corriente': activo_corriente,
+        'proporcion_pasivo_corriente': pasivo_corriente,
+    }
+    if any(valor is not None for valor in cambios.values()):
+        if parametros is None:
+            parametros = ParametroFinanciero(restaurante=restaurante, **PARAMETROS_FINANCIEROS_DEFECTO)
+            db.session.add(parametros)
+        for columna, valor in cambios.items():
+            if valor is not None:
+                setattr(parametros, columna, valor)
+    db.session.commit()
+
+    click.echo(f'{restaurante.nombre}' + ('' if parametros else ' (por defecto)'))
+    for columna, valor in PARAMETROS_FINANCIEROS_DEFECTO.items():
+        click.echo(f'  {columna}: {getattr(parametros, columna) if parametros else valor:.2f}')
+
+
+@bp.cli.command('procesar-imagenes')
+@click.option('--todas', is_flag=True, help='Regenera también las imágenes ya procesadas.')
+def procesar_imagenes(todas):
+    """Genera miniaturas, WebP y dimensiones para las imágenes del catálogo."""
+    rutas = set()
+    for modelo in (Restaurante, Menu, ProductoAgricola):
+        rutas.update(r for (r,) in db.session.query(modelo.imagen).distinct() if r)
+    if not todas:
+        rutas -= {r for (r,) in db.session.query(Imagen.original).distinct()}
+    tareas = [encolar_imagen(ruta) for ruta in sorted(rutas)]
+    archivos = sum(tarea.result() for tarea in tareas)
+    click.echo(f'Imágenes procesadas: {len(tareas)} ({archivos} archivos registrados).')
+
+
+@bp.cli.command('migrar-subidas')
+def migrar_subidas():
+    """Pasa las imágenes guardadas por nombre al almacenamiento por hash (deduplica)."""
+    cambios = {}
+    for ruta in referencias_subidas():
+        nueva = importar_subida(ruta)
+        if nueva != ruta:
+            cambios[ruta] = nueva
+    for modelo in (Restaurante, Menu, ProductoAgricola):
+        for anterior, nueva in cambios.items():
+            modelo.query.filter_by(imagen=anterior).update({'imagen': nueva}, synchronize_session=False)
+    invalidar_catalogo(*CATALOGO_DOMINIOS)
+    db.session.commit()
+    procesadas = {r for (r,) in db.session.query(Imagen.original).distinct()}
+    tareas = [encolar_imagen(r) for r in sorted(set(cambios.values()) - procesadas)]
+    for tarea in tareas:
+        tarea.result()
+    click.echo(f'Rutas migradas: {len(cambios)} -> {len(set(cambios.values()))} archivos. '
+               'Los originales quedan para `flask limpiar-subidas --legado`.')
+
+
+@bp.cli.command('limpiar-subidas')
+@click.option('--legado', is_flag=True, help='Borra también los archivos sin hash que nadie referencia.')
+@click.option('--simular', is_flag=True, help='Solo muestra lo que se borraría.')
+def limpiar_subidas(legado, simular):
+    """Recolecta las subidas huérfanas, sus variantes y sus metadatos."""
+    usadas = set(referencias_subidas()) | SUBIDAS_PROTEGIDAS
+    carpeta = current_app.config['UPLOAD_FOLDER']
+    huerfanas = []
+    for entrada in os.scandir(carpeta):
+        ruta = f'uploads/{entrada.name}'
+        if not entrada.is_file() or ruta in usadas:
+            continue
+        if time.time() - entrada.stat().st_mtime <= SUBIDAS_GRACIA_SEGUNDOS:
+            continue
+        if SUBIDA_HASH.match(ruta) or entrada.name.startswith('.subida-') or legado:
+            huerfanas.append(ruta)
+    # Metadatos de originales que ya no existen o no se usan (p. ej. tras migrar-subidas)
+    sin_uso = {r for (r,) in db.session.query(Imagen.original).distinct()} - usadas
+    sin_uso = {r for r in sin_uso
+               if r in huerfanas or not os.path.exists(os.path.join(current_app.static_folder, r))}
+
+    # Variantes en disco sin fila en `imagenes` (procesamientos interrumpidos)
+    registradas = {r for (r,) in db.session.query(Imagen.ruta)}
+    sueltas = []
+    directorio = os.path.join(current_app.static_folder, IMAGEN_VARIANTES)
+    if os.path.isdir(directorio):
+        for entrada in os.scandir(directorio):
+            ruta = f'{IMAGEN_VARIANTES}/{entrada.name}'
+            if (entrada.is_file() and ruta not in registradas
+                    and time.time() - entrada.stat().st_mtime > SUBIDAS_GRACIA_SEGUNDOS):
+                sueltas.append(ruta)
+
+    for ruta in sorted(set(huerfanas) | sin_uso) + sorted(sueltas):
+        click.echo(f'{"borraría" if simular else "borrando"} {ruta}')
+    if simular:
+        return
+    borrar_subidas(set(huerfanas) | sin_uso)
+    for ruta in sueltas:
+        os.remove(os.path.join(current_app.static_folder, ruta))
+    click.echo(f'Subidas borradas: {len(huerfanas)}; metadatos sin uso: {len(sin_uso)}; '
+               f'variantes sueltas: {len(sueltas)}.')
+
+
+@bp.cli.command('construir-estaticos')
+def construir_estaticos():
+    """Genera static/dist: archivos con huella, versiones .gz/.br y el manifiesto."""
+    if not brotli:
+        click.echo('brotli no está instalado: solo se generan versiones .gz.')
+
+    static = current_app.static_folder
+    dist = os.path.join(static, ESTATICOS_DIST)
+    fuentes = []
+    for raiz, carpetas, archivos in os.walk(static):
+        carpetas[:] = [c for c in carpetas if os.path.join(raiz, c) != dist]
+        for nombre in archivos:
+            ruta = os.path.relpath(os.path.join(raiz, nombre), static).replace(os.sep, '/')
+            # Las subidas por hash ya tienen URL inmutable
+            if nombre.rsplit('.', 1)[-1].lower() in ESTATICOS_EXTENSIONES and not SUBIDA_HASH.match(ruta):
+                fuentes.append(ruta)
+    # Las hojas de estilo al final: sus url(/static/...) apuntan a las rutas ya construidas
+    fuentes.sort(key=lambda r: (r.endswith('.css'), r))
+
+    def con_huella(coincidencia):
+        destino = manifiesto.get(unquote(coincidencia.group(2)))
+        if not destino:
+            return coincidencia.group(0)
+        return f'url({coincidencia.group(1)}/static/{quote(destino)}{coincidencia.group(1)})'
+
+    manifiesto, generados = {}, set()
+    original = comprimido = 0
+    for ruta in fuentes:
+        with open(os.path.join(static, ruta), 'rb') as archivo:
+            contenido = archivo.read()
+        if ruta.endswith('.css'):
+            contenido = CSS_URL_ESTATICA.sub(con_huella, contenido.decode('utf-8')).encode('utf-8')
+        base, extension = os.path.splitext(ruta)
+        destino = f'{ESTATICOS_DIST}/{base}.{hashlib.sha256(contenido).hexdigest()[:12]}{extension}'
+        manifiesto[ruta] = destino
+
+        salidas = {destino: contenido}
+        if extension.lstrip('.').lower() in ESTATICOS_COMPRIMIBLES:
+            salidas[destino + '.gz'] = gzip.compress(contenido, 9, mtime=0)
+            if brotli:
+                salidas[destino + '.br'] = brotli.compress(contenido, quality=11)
+            original += len(contenido)
+            comprimido += min(len(d) for d in salidas.values())
+        for salida, datos in salidas.items():
+            if salida != destino and len(datos) >= len(contenido):
+                continue  # No compensa
+            generados.add(salida)
+            camino = os.path.join(static, salida)
+            if not os.path.exists(camino):  # Mismo nombre, mismo contenido
+                os.makedirs(os.path.dirname(camino), exist_ok=True)
+                with open(camino, 'wb') as archivo:
+                    archivo.write(datos)
+
+    camino = os.path.join(static, ESTATICOS_MANIFIESTO)
+    with open(camino + '.tmp', 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(camino + '.tmp', camino)
+
+    # Restos de construcciones anteriores
+    borrados = 0
+    for raiz, _, archivos in os.walk(dist):
+        for nombre in archivos:
+            ruta = os.path.relpath(os.path.join(raiz, nombre), static).replace(os.sep, '/')
+            if ruta not in generados and ruta != ESTATICOS_MANIFIESTO:
+                os.remove(os.path.join(raiz, nombre))
+                borrados += 1
+    click.echo(f'Archivos con huella: {len(manifiesto)}; texto {original // 1024} KB -> '
+               f'{comprimido // 1024} KB precomprimido; restos borrados: {borrados}.')
+
+
+TABLAS_GRANDES = {'pedidos', 'pedidos_items', 'menus', 'productos_agricolas', 'detalles_pedido_agricola',
+                  'ventas_diarias'}
+
+
+def consultas_frecuentes():
+    """(nombre, consulta) de las rutas calientes que deben resolverse por índice."""
+    hoy = date.today()
+    return [
+        ('menús de un restaurante',
+         db.select(Menu).where(Menu.restaurante_id == 1).order_by(Menu.id)),
+        ('productos agrícolas con stock',
+         db.select(ProductoAgricola).where(ProductoAgricola.stock > 0).order_by(ProductoAgricola.id)),
+        ('pedidos por fecha',
+         db.select(Pedido).where(en_rango(Pedido.fecha, hoy - timedelta(days=30), hoy))),
+        ('pedidos de un restaurante por fecha',
+         db.select(Pedido).where(Pedido.restaurante_id == 1,
+                                 en_rango(Pedido.fecha, hoy - timedelta(days=30), hoy))),
+        ('serie de ventas por rango',
+         db.select(VentaDiaria.dia, db.func.sum(VentaDiaria.ingresos))
+           .where(en_rango(VentaDiaria.dia, hoy - timedelta(days=30), hoy)).group_by(VentaDiaria.dia)),
+        ('últimos pedidos de un usuario',
+         db.select(Pedido).where(Pedido.usuario_id == 1).order_by(Pedido.fecha.desc()).limit(10)),
+        ('ítems de un pedido',
+         db.select(PedidoItem).where(PedidoItem.pedido_id == 1, PedidoItem.fecha == datetime(hoy.year, hoy.month, 1))),
+        ('ventas de un menú',
+         db.select(PedidoItem).where(PedidoItem.menu_id == 1)),
+        ('detalle de un pedido agrícola',
+         db.select(DetallePedidoAgricola).where(DetallePedidoAgricola.pedido_id == 1)),
+    ]
+
+
+def recorridos_secuenciales(consulta):
+    """(tablas grandes que el plan de `consulta` recorre completas, particiones que toca)."""
+    motor = db.session.get_bind()
+    sql = str(consulta.compile(motor, compile_kwargs={'literal_binds': True}))
+    if motor.dialect.name == 'postgresql':
+        # Con seqscan desactivado, un Seq Scan en el plan significa que no hay índice utilizable
+        db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+        plan = db.session.execute(db.text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        pendientes, tablas, particiones = [plan[0]['Plan']], set(), set()
+        while pendientes:
+            nodo = pendientes.pop()
+            relacion = nodo.get('Relation Name')
+            if relacion and tabla_base(relacion) != relacion:
+                particiones.add(relacion)
+            if nodo['Node Type'] == 'Seq Scan':
+                tablas.add(tabla_base(relacion))
+            pendientes.extend(nodo.get('Plans', []))
+        return tablas & TABLAS_GRANDES, particiones
+    # SQLite: "SCAN tabla" sin "USING ... INDEX" es un recorrido completo
+    tablas = set()
+    for fila in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')):
+        detalle = fila[-1].split()
+        if detalle[0] == 'SCAN' and 'INDEX' not in detalle:
+            tablas.add(detalle[1])
+    return tablas & TABLAS_GRANDES, set()
+
+
+@bp.cli.command('verificar-planes')
+def verificar_planes():
+    """Ejecuta EXPLAIN sobre las consultas frecuentes y falla si alguna recorre una tabla grande."""
+    fallos = []
+    for nombre, consulta in consultas_frecuentes():
+        tablas, particiones = recorridos_secuenciales(consulta)
+        db.session.rollback()
+        resultado = 'SEQ SCAN ' + ', '.join(sorted(tablas)) if tablas else 'índice'
+        if particiones:
+            resultado += f' ({len(particiones)} partición)' if len(particiones) == 1 else f' ({len(particiones)} particiones)'
+        click.echo(f'{resultado:<30} {nombre}')
+        if tablas:
+            fallos.append(nombre)
+    if fallos:
+        raise click.ClickException(f'Consultas sin índice: {", ".join(fallos)}')
+
+
+# === PARTICIONES MENSUALES DE PEDIDOS (POSTGRES) ===
+# pedidos y pedidos_items están particionadas por mes de `fecha` (ver migrations/). Cada
+# una tiene además una partición DEFAULT para lo que no tenga mes creado: un mantenimiento
+# atrasado nunca rompe un checkout, solo deja esas filas fuera de la poda.
+PARTICIONES_TABLAS = ('pedidos', 'pedidos_items')  # Padre antes que hija
+PARTICIONES_ADELANTO = 3  # Meses creados por adelantado
+PARTICION_MENSUAL = re.compile(r'^(?P<tabla>\w+?)_(?P<anio>\d{4})_(?P<mes>\d{2})$')
+ARCHIVO_CARPETA = 'archivo'
+
+
+def tabla_base(nombre):
+    """Tabla padre de una partición (`pedidos_2026_01` o `pedidos_default` -> `pedidos`)."""
+    coincidencia = PARTICION_MENSUAL.match(nombre)
+    if coincidencia:
+        return coincidencia['tabla']
+    return nombre[:-len('_default')] if nombre.endswith('_default') else nombre
+
+
+def particiones_mensuales(tabla):
+    """{primer día del mes: nombre} de las particiones mensuales de `tabla`."""
+    filas = db.session.execute(db.text(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = CAST(:tabla AS regclass)'
+    ), {'tabla': tabla})
+    resultado = {}
+    for (nombre,) in filas:
+        coincidencia = PARTICION_MENSUAL.match(nombre)
+        if coincidencia and coincidencia['tabla'] == tabla:
+            resultado[date(int(coincidencia['anio']), int(coincidencia['mes']), 1)] = nombre
+    return resultado
+
+
+def exigir_particiones():
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException('Las particiones solo existen en PostgreSQL')
+    particionadas = {nombre for (nombre,) in db.session.execute(db.text(
+        'SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid'))}
+    if not set(PARTICIONES_TABLAS) <= particionadas:
+        raise click.ClickException('pedidos no está particionada todavía: ejecuta `flask db upgrade`')
+
+
+def crear_particion(tabla, inicio):
+    """Crea la partición del mes de `inicio`. False si la DEFAULT ya tiene filas de ese mes."""
+    fin = rango_mes(inicio.year, inicio.month)[1]
+    ocupada = db.session.execute(db.text(
+        f'SELECT 1 FROM {tabla}_default WHERE fecha >= :desde AND fecha < :hasta LIMIT 1'
+    ), {'desde': inicio, 'hasta': fin}).first()
+    if ocupada:
+        return False
+    db.session.execute(db.text(
+        f"CREATE TABLE IF NOT EXISTS {tabla}_{inicio:%Y_%m} PARTITION OF {tabla} "
+        f"FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fin.isoformat()}')"
+    ))
+    return True
+
+
+@bp.cli.command('mantener-particiones')
+@click.option('--meses', default=PARTICIONES_ADELANTO, show_default=True,
+              help='Meses futuros que deben tener partición.')
+def mantener_particiones(meses):
+    """Crea las particiones de los próximos meses y congela los meses ya cerrados.
+
+    Pensado para ejecutarse a diario o al menos una vez al mes (cron).
+    """
+    exigir_particiones()
+    hoy = date.today()
+    objetivos = [date(hoy.year, hoy.month, 1)]
+    for _ in range(meses):
+        objetivos.append(rango_mes(objetivos[-1].year, objetivos[-1].month)[1])
+
+    creadas, ocupadas = [], []
+    for tabla in PARTICIONES_TABLAS:
+        existentes = particiones_mensuales(tabla)
+        for inicio in objetivos:
+            if inicio not in existentes:
+                (creadas if crear_particion(tabla, inicio) else ocupadas).append(f'{tabla}_{inicio:%Y_%m}')
+    db.session.commit()
+
+    # Un VACUUM FREEZE al cerrar cada mes: autovacuum ya no vuelve a recorrer esas particiones
+    # por antigüedad de transacciones, así su costo no crece con el historial.
+    congeladas = []
+    ayer = hoy - timedelta(days=1)
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conexion:
+        for tabla in PARTICIONES_TABLAS:
+            for inicio, nombre in sorted(particiones_mensuales(tabla).items()):
+                fin = rango_mes(inicio.year, inicio.month)[1]
+                if fin > ayer:
+                    continue  # Mes abierto (o cerrado hace menos de un día)
+                ultimo = conexion.execute(db.text(
+                    'SELECT greatest(last_vacuum, last_autovacuum) FROM pg_stat_user_tables WHERE relname = :n'
+                ), {'n': nombre}).scalar()
+                if ultimo is None or ultimo.date() <= fin:
+                    conexion.execute(db.text(f'VACUUM (FREEZE, ANALYZE) {nombre}'))
+                    congeladas.append(nombre)
+    db.session.rollback()
+
+    click.echo(f'Particiones creadas: {", ".join(creadas) or "ninguna"}.')
+    click.echo(f'Particiones congeladas: {", ".join(congeladas) or "ninguna"}.')
+    if ocupadas:
+        raise click.ClickException(
+            f'La partición DEFAULT tiene filas de {", ".join(ocupadas)}; '
+            'no se creó la partición de esos meses (siguen consultándose, sin poda).')
+
+
+def sumar_archivados(inicio, filas):
+    """Suma a `archivados` de los contadores los pedidos y líneas del mes que se archiva.
+
+    `filas` son las particiones que esta ejecución va a borrar; las ya borradas en una
+    ejecución interrumpida se sumaron entonces (misma transacción que el DROP).
+    """
+    pedidos, items = (f'{tabla}_{inicio:%Y_%m}' for tabla in PARTICIONES_TABLAS)
+    if pedidos in filas:
+        conteos = db.session.execute(db.text(
+            f'SELECT restaurante_id, count(*) FROM {pedidos} GROUP BY restaurante_id'
+        )).all()
+        incrementar_contadores(ContadorRestaurante, ['restaurante_id'], ['archivados'], [
+            {'restaurante_id': rid, 'archivados': total, 'total_pedidos': total} for rid, total in conteos
+        ])
+    if items in filas:
+        conteos = db.session.execute(db.text(
+            f'SELECT i.menu_id, m.restaurante_id, count(*) FROM {items} i '
+            f'JOIN menus m ON m.id = i.menu_id GROUP BY i.menu_id, m.restaurante_id'
+        )).all()
+        incrementar_contadores(PopularidadMenu, ['menu_id'], ['archivados'], [
+            {'menu_id': menu_id, 'restaurante_id': rid, 'archivados': total, 'total_pedidos': total, 'puntaje': 0.0}
+            for menu_id, rid, total in conteos
+        ])
 
 
+@bp.cli.command('archivar-pedidos')
+@click.option('--meses', default=24, show_default=True, help='Meses completos que se conservan en línea.')
+@click.option('--carpeta', default=ARCHIVO_CARPETA, show_default=True, type=click.Path(file_okay=False))
+@click.option('--simular', is_flag=True, help='Solo muestra qué meses se archivarían.')
+def archivar_pedidos(meses, carpeta, simular):
+    """Vuelca a CSV comprimido las particiones más antiguas que `--meses`, las separa y las borra.
+
+    ventas_diarias, contadores y popularidad no se tocan: los reportes conservan esos
+    meses. Lo archivado se suma a la columna `archivados` de los contadores, para que
+    `reconciliar-contadores` no lo pierda. Los archivos se cargan de vuelta con
+    COPY ... FROM si hiciera falta.
+    """
+    exigir_particiones()
+    limite = date.today().replace(day=1)
+    for _ in range(meses):
+        limite = (limite - timedelta(days=1)).replace(day=1)
+    viejos = sorted(inicio for inicio in particiones_mensuales('pedidos') if inicio < limite)
+    if not viejos:
+        click.echo(f'No hay particiones anteriores a {limite.isoformat()}.')
+        return
+    if simular:
+        for inicio in viejos:
+            click.echo(f'archivaría {inicio:%Y-%m}')
+        return
+
+    os.makedirs(carpeta, exist_ok=True)
+    for inicio in viejos:
+        nombres = [f'{tabla}_{inicio:%Y_%m}' for tabla in PARTICIONES_TABLAS]
+        cursor = db.session.connection().connection.cursor()
+        filas = {}
+        for nombre in nombres:
+            if not particiones_mensuales(tabla_base(nombre)).get(inicio):
+                continue  # Ya archivada en una ejecución interrumpida
+            esperadas = db.session.execute(db.text(f'SELECT count(*) FROM {nombre}')).scalar()
+            ruta = os.path.join(carpeta, f'{nombre}.csv.gz')
+            with gzip.open(ruta + '.tmp', 'wb') as archivo:
+                cursor.copy_expert(f'COPY {nombre} TO STDOUT WITH (FORMAT csv, HEADER)', archivo)
+            if cursor.rowcount not in (-1, esperadas):
+                db.session.rollback()
+                raise click.ClickException(f'{nombre}: se volcaron {cursor.rowcount} de {esperadas} filas')
+            os.replace(ruta + '.tmp', ruta)
+            filas[nombre] = esperadas
+        sumar_archivados(inicio, filas)
+        # La hija primero: su clave foránea impide separar antes la partición de pedidos
+        for nombre in reversed(nombres):
+            if nombre in filas:
+                db.session.execute(db.text(f'ALTER TABLE {tabla_base(nombre)} DETACH PARTITION {nombre}'))
+                db.session.execute(db.text(f'DROP TABLE {nombre}'))
+        db.session.commit()
+        click.echo(f'{inicio:%Y-%m}: ' + ', '.join(f'{n} ({f} filas)' for n, f in filas.items()))
 
-with app.app_context():
-    db.create_all()
 
+@bp.cli.command('liberar-reservas')
+def liberar_reservas_comando():
+    """Libera las reservas de stock agrícola vencidas (cron, por ejemplo cada pocos minutos)."""
+    liberadas = liberar_reservas_vencidas()
+    db.session.commit()
+    click.echo(f'Reservas liberadas: {liberadas}.')
+
+
+@bp.cli.command('simular-compras')
+@click.option('--stock', default=100, show_default=True, help='Stock del producto temporal.')
+@click.option('--compras', default=300, show_default=True, help='Checkouts concurrentes a lanzar.')
+@click.option('--hilos', default=20, show_default=True, help='Hilos en paralelo.')
+@click.option('--cantidad', default=1, show_default=True, help='Unidades por compra.')
+def simular_compras(stock, compras, hilos, cantidad):
+    """Lanza checkouts agrícolas concurrentes y comprueba que no haya sobreventa.
+
+    Cada compra pasa por la ruta real /agricola/confirmar con un carrito sin reserva
+    vigente, así todas compiten por el stock al confirmar. Usa un producto temporal que
+    se borra al terminar junto con sus pedidos y carritos; el stock real no se toca.
+    """
+    producto = ProductoAgricola(nombre=f'simulación {uuid.uuid4().hex[:8]}', descripcion='simular-compras',
+                                precio_compra=1.0, precio_venta=1.0, stock=stock)
+    db.session.add(producto)
+    db.session.commit()
+    producto_id = producto.id
+    linea = {'id': producto_id, 'nombre': producto.nombre, 'precio_venta': 1.0,
+             'cantidad': cantidad, 'subtotal': float(cantidad)}
+
+    app = current_app._get_current_object()
+    clientes = []
+    for _ in range(compras):
+        cliente = app.test_client()
+        with cliente.session_transaction() as sesion:
+            sesion['guest'] = True
+            sesion['carrito_agricola'] = [dict(linea)]
+        clientes.append(cliente)
+
+    def comprar(cliente):
+        inicio = time.perf_counter()
+        respuesta = cliente.post('/agricola/confirmar', data={'tipo_entrega': 'retiro'})
+        duracion = time.perf_counter() - inicio
+        with cliente.session_transaction() as sesion:
+            exito = 'carrito_agricola' not in sesion  # Se vacía solo al confirmar
+            carrito_id = sesion.get('carrito_id')
+        return respuesta.status_code, exito, duracion, carrito_id
+
+    resultados = []
+    try:
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            resultados = list(ejecutor.map(comprar, clientes))
+
+        db.session.expire_all()
+        final = db.session.get(ProductoAgricola, producto_id).stock
+        registradas = db.session.query(db.func.coalesce(db.func.sum(DetallePedidoAgricola.cantidad), 0))\
+            .filter(DetallePedidoAgricola.producto_id == producto_id).scalar()
+        vendidas = sum(1 for _, exito, _, _ in resultados if exito) * cantidad
+        errores = sum(1 for estado, _, _, _ in resultados if estado >= 500)
+        tiempos = sorted(t for _, _, t, _ in resultados)
+        click.echo(f'Stock inicial {stock}, vendidas {vendidas}, en pedidos {registradas}, stock final {final}.')
+        click.echo(f'Latencia p50 {tiempos[len(tiempos) // 2] * 1000:.1f} ms, '
+                   f'p99 {tiempos[int(len(tiempos) * 0.99)] * 1000:.1f} ms, '
+                   f'máx {tiempos[-1] * 1000:.1f} ms.')
+    finally:
+        db.session.rollback()
+        pedidos = [p for (p,) in db.session.query(DetallePedidoAgricola.pedido_id)
+                   .filter(DetallePedidoAgricola.producto_id == producto_id)]
+        carritos = [c for _, _, _, c in resultados if c]
+        DetallePedidoAgricola.query.filter_by(producto_id=producto_id).delete(synchronize_session=False)
+        PedidoAgricola.query.filter(PedidoAgricola.id.in_(pedidos)).delete(synchronize_session=False)
+        ReservaAgricola.query.filter_by(producto_id=producto_id).delete(synchronize_session=False)
+        Carrito.query.filter(Carrito.id.in_(carritos)).delete(synchronize_session=False)
+        ProductoAgricola.query.filter_by(id=producto_id).delete(synchronize_session=False)
+        db.session.commit()
 
+    if errores:
+        raise click.ClickException(f'{errores} checkouts terminaron con error')
+    if final < 0 or final != stock - vendidas or registradas != vendidas or vendidas > stock:
+        raise click.ClickException('Sobreventa detectada')
+    click.echo('Sin sobreventa.')
+
+
+def sembrar(modelo, claves, filas, actualizar=False, conservar=()):
+    """Inserta en bloque las `filas` cuya combinación de `claves` aún no existe.
+
+    Con `actualizar` también sobrescribe las existentes (salvo las columnas de
+    `conservar`, p. ej. el stock real). Devuelve (insertadas, actualizadas).
+    """
+    columnas = [getattr(modelo, c) for c in claves]
+    existentes = {tuple(fila[1:]): fila[0] for fila in db.session.query(modelo.id, *columnas)}
+    nuevas = [f for f in filas if tuple(f[c] for c in claves) not in existentes]
+    if nuevas:
+        db.session.execute(db.insert(modelo), nuevas)
+    cambios = []
+    if actualizar:
+        cambios = [
+            {'id': existentes[clave], **{k: v for k, v in f.items() if k not in conservar}}
+            for f in filas
+            for clave in [tuple(f[c] for c in claves)]
+            if clave in existentes
+        ]
+        if cambios:
+            db.session.execute(db.update(modelo), cambios)
+    return len(nuevas), len(cambios)
+
+
+@bp.cli.command('seed')
+@click.option('--actualizar', is_flag=True, help='Sobrescribe las filas existentes con los datos iniciales.')
+def seed(actualizar):
+    """Aplica las migraciones y carga los datos iniciales; puede ejecutarse varias veces."""
+    flask_migrate.upgrade()
+    datos = datos_iniciales
+
+    def con_imagen(filas):
+        # Las imágenes de los datos iniciales también se guardan por hash
+        return [dict(f, imagen=importar_subida(f['imagen'])) for f in filas]
+
+    resultados = {
+        'productos agrícolas': sembrar(ProductoAgricola, ['nombre'], con_imagen(datos.PRODUCTOS_AGRICOLAS),
+                                       actualizar, conservar=('stock',)),
+        'restaurantes': sembrar(Restaurante, ['nombre'], con_imagen(datos.RESTAURANTES), actualizar),
+    }
+    ids = dict(db.session.query(Restaurante.nombre, Restaurante.id)
+               .filter(Restaurante.nombre.in_(list(datos.MENUS))))
+    menus = [dict(menu, restaurante_id=ids[restaurante])
+             for restaurante, lista in datos.MENUS.items() for menu in con_imagen(lista)]
+    resultados['menús'] = sembrar(Menu, ['restaurante_id', 'nombre'], menus, actualizar)
+    resultados['administrador'] = sembrar(Usuario, ['email'], [datos.ADMINISTRADOR],
+                                          actualizar, conservar=('password',))
+
+    catalogo_cambiado = any(sum(r) for nombre, r in resultados.items() if nombre != 'administrador')
+    if catalogo_cambiado or not DocumentoBusqueda.query.first():
+        reindexar_busqueda()
+        invalidar_catalogo(*CATALOGO_DOMINIOS)
+    db.session.commit()
+    for nombre, (insertadas, actualizadas) in resultados.items():
+        click.echo(f'{nombre}: {insertadas} nuevas, {actualizadas} actualizadas.')
+
+
+@bp.cli.command('presupuesto-arranque')
+@click.option('--presupuesto-ms', default=1000, show_default=True,
+              help='Máximo aceptable (mediana) para importar el módulo y crear la aplicación.')
+@click.option('--repeticiones', default=5, show_default=True)
+def presupuesto_arranque(presupuesto_ms, repeticiones):
+    """Mide el arranque en frío de un worker en procesos nuevos.
+
+    Falla si la mediana supera el presupuesto o si el arranque abre alguna
+    conexión a la base de datos.
+    """
+    codigo = (
+        'import json, time\n'
+        'inicio = time.perf_counter()\n'
+        'from sqlalchemy import event\n'
+        'from sqlalchemy.pool import Pool\n'
+        'conexiones = []\n'
+        'event.listen(Pool, "connect", lambda *a: conexiones.append(1))\n'
+        f'import {__name__}\n'
+        f'{__name__}.create_app()\n'
+        'print(json.dumps({"ms": (time.perf_counter() - inicio) * 1000, "conexiones": len(conexiones)}))\n'
+    )
+    # Como un worker de gunicorn: fuera de la línea de comandos no se carga Flask-Migrate
+    entorno = {k: v for k, v in os.environ.items() if k != 'FLASK_RUN_FROM_CLI'}
+    mediciones = []
+    for _ in range(repeticiones):
+        salida = subprocess.run([sys.executable, '-c', codigo], cwd=current_app.root_path,
+                                capture_output=True, text=True, env=entorno)
+        if salida.returncode:
+            raise click.ClickException(f'El arranque falló:\n{salida.stderr}')
+        mediciones.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+
+    tiempos = sorted(m['ms'] for m in mediciones)
+    mediana = tiempos[len(tiempos) // 2]
+    conexiones = max(m['conexiones'] for m in mediciones)
+    click.echo(f'Arranque: mediana {mediana:.0f} ms, máx {tiempos[-1]:.0f} ms '
+               f'(presupuesto {presupuesto_ms} ms); conexiones a la BD: {conexiones}.')
+    if conexiones:
+        raise click.ClickException('El arranque no debe conectarse a la base de datos')
+    if mediana > presupuesto_ms:
+        raise click.ClickException('Arranque por encima del presupuesto')
+
+
+# Importar este módulo no crea la aplicación: `flask` usa la fábrica (FLASK_APP=app:create_app
+# en .flaskenv) y gunicorn la instancia de wsgi.py (`gunicorn wsgi:app`). `app.app` se crea
+# al pedirla, así `gunicorn app:app` sigue funcionando.
+def __getattr__(nombre):
+    if nombre == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {nombre!r}')
 
 
 # Iniciar la aplicación en modo debug
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
@@ -0,0 +1,609 @@
+"""Datos iniciales del catálogo, usados por el comando `flask seed`.
+
+Los restaurantes se identifican por su nombre y los menús por (restaurante, nombre),
+así el comando puede ejecutarse varias veces sin duplicar filas.
+"""
+
+# === PRODUCTOS AGRÍCOLAS ===
+PRODUCTOS_AGRICOLAS = [
+    {
+        'nombre': 'Papas Criollas',
+        'descripcion': 'Papas criollas frescas, ideales para sancochos y guisos. Sabor auténtico y textura cremosa.',
+        'precio_compra': 2.50,
+        'precio_venta': 4.00,
+        'stock': 120,
+        'imagen': 'uploads/papas.jfif'
+    },
+    {
+        'nombre': 'Tomates Maduros',
+        'descripcion': 'Tomates rojos maduros, jugosos y dulces. Perfectos para salsas, ensaladas y guisos.',
+        'precio_compra': 3.20,
+        'precio_venta': 5.50,
+        'stock': 80,
+        'imagen': 'uploads/tomates.jfif'
+    },
+    {
+        'nombre': 'Cebolla Cabezona',
+        'descripcion': 'Cebolla cabezona blanca, esencial para sofritos, sopas y todo tipo de preparaciones.',
+        'precio_compra': 2.80,
+        'precio_venta': 4.20,
+        'stock': 95,
+        'imagen': 'uploads/cebollas.jfif'
+    },
+    {
+        'nombre': 'Arveja Fresca',
+        'descripcion': 'Arveja fresca y dulce, ideal para guisos, sopas y ensaladas. Alto valor nutricional.',
+        'precio_compra': 4.50,
+        'precio_venta': 6.80,
+        'stock': 60,
+        'imagen': 'uploads/arvejas.jfif'
+    },
+    {
+        'nombre': 'Zanahoria Orgánica',
+        'descripcion': 'Zanahorias orgánicas crujientes y dulces. Perfectas para jugos, ensaladas y guarniciones.',
+        'precio_compra': 2.20,
+        'precio_venta': 3.80,
+        'stock': 110,
+        'imagen': 'uploads/zanahorias.jfif'
+    },
+    {
+        'nombre': 'Cilantro Fresco',
+        'descripcion': 'Cilantro fresco recién cosechado. Aroma intenso para sopas, guisos y salsas.',
+        'precio_compra': 1.80,
+        'precio_venta': 3.00,
+        'stock': 75,
+        'imagen': 'uploads/cilantro.jfif'
+    },
+    {
+        'nombre': 'Ajo Nacional',
+        'descripcion': 'Ajo fresco nacional, esencial para dar sabor a todo tipo de preparaciones culinarias.',
+        'precio_compra': 3.50,
+        'precio_venta': 5.20,
+        'stock': 50,
+        'imagen': 'uploads/ajos.jfif'
+    }
+]
+
+# === RESTAURANTES ===
+RESTAURANTES = [
+    {
+        'nombre': 'Wabi Sabi Sushi Bar',
+        'descripcion': 'Restaurante especializado en sushi y cocina japonesa auténtica',
+        'categoria': 'Sushi',
+        'imagen': 'uploads/wabisabisushibar.jpg'
+    },
+    {
+        'nombre': 'PamDay',
+        'descripcion': 'Sushi fresco y auténtico con un toque moderno',
+        'categoria': 'Sushi',
+        'imagen': 'uploads/pamday.jpg'
+    },
+    {
+        'nombre': 'Pollo Broaster La Brasil',
+        'descripcion': 'Especialistas en pollo broaster crujiente',
+        'categoria': 'Pollo',
+        'imagen': 'uploads/pollobrosterlabrasil.jpg'
+    },
+    {
+        'nombre': 'Kroky',
+        'descripcion': 'Pollo broaster con un toque único',
+        'categoria': 'Pollo',
+        'imagen': 'uploads/kroky.jpg'
+    },
+    {
+        'nombre': "Q'Riko!",
+        'descripcion': 'Sabores auténticos de la cocina china',
+        'categoria': 'Casa China',
+        'imagen': 'uploads/qriko.jpg'
+    },
+    {
+        'nombre': "FORTUNA'Z",
+        'descripcion': 'Tradición china en cada plato',
+        'categoria': 'Casa China',
+        'imagen': 'uploads/fortunaz.jpg'
+    },
+    {
+        'nombre': 'Casa China Restaurante',
+        'descripcion': 'Un clásico de la comida china',
+        'categoria': 'Casa China',
+        'imagen': 'uploads/casachinarestaurante.jpg'
+    },
+    {
+        'nombre': 'Alitas y algo más',
+        'descripcion': 'Alitas y opciones rápidas para todos los gustos',
+        'categoria': 'Comidas Rápidas',
+        'imagen': 'uploads/alitasyalgomas.jpg'
+    },
+    {
+        'nombre': 'Chervo Pizza',
+        'descripcion': 'Pizzas rápidas y deliciosas',
+        'categoria': 'Comidas Rápidas',
+        'imagen': 'uploads/chervopizza.jpg'
+    },
+    {
+        'nombre': 'Pizzeria LUWAK',
+        'descripcion': 'Pizzas artesanales para llevar',
+        'categoria': 'Comidas Rápidas',
+        'imagen': 'uploads/pizerialuwak.jpg'
+    },
+    {
+        'nombre': 'Pizza Express',
+        'descripcion': 'Entrega rápida de pizzas frescas',
+        'categoria': 'Comidas Rápidas',
+        'imagen': 'uploads/pizzaexpress.jpg'
+    }
+]
+
+# === MENÚS POR RESTAURANTE ===
+MENUS = {
+    'Wabi Sabi Sushi Bar': [
+        {
+            'nombre': 'Edamame',
+            'descripcion': 'Vainas de soja al vapor',
+            'precio': 4.50,
+            'categoria': 'Entradas',
+            'imagen': 'uploads/Edamame.jpeg'
+        },
+        {
+            'nombre': 'Vegetales Tempura',
+            'descripcion': 'Mix de vegetales de tempura, rebosados en tempura, acompañados de salsa ponzu',
+            'precio': 5.00,
+            'categoria': 'Entradas',
+            'imagen': 'uploads/VegetalesTempura.jpeg'
+        },
+        {
+            'nombre': 'Guozas de Cerdo',
+            'descripcion': 'Tradicionales empanadillas japonesas rellenas de cerdo, cebolla, jengibre y col',
+            'precio': 5.00,
+            'categoria': 'Entradas',
+            'imagen': 'uploads/GuozasdeCerdo.jpeg'
+        },
+        {
+            'nombre': 'Okonomiyaki de Cerdo',
+            'descripcion': 'Tradicional tortilla japonesa cocida a la plancha rellena de cerdo y vegetales con una cobertura de salsa TonKatsu, mayonesa y katsuobushi',
+            'precio': 7.50,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/OkonomiyakideCerdo.jpeg'
+        },
+        {
+            'nombre': 'Karaage',
+            'descripcion': 'Pollo frito estilo japonés, guarnición de arroz furikake',
+            'precio': 9.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/Karaage.jpeg'
+        },
+        {
+            'nombre': 'Ramen Vegetariano',
+            'descripcion': 'Sopa a base de fondo de vegetales y hongos shitake. Ajitama, huevo cocido marinado, maíz dulce, tofu al banco y vegetales de temporada',
+            'precio': 9.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/RamenVegetariano.jpeg'
+        }
+    ],
+    'PamDay': [
+        {
+            'nombre': 'Tokio Sushi',
+            'descripcion': '12 bocados de sushi, 1 tipo de rollito a elección acompañados con vegetales y salsa',
+            'precio': 17.50,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/Kappuru.jpeg'
+        },
+        {
+            'nombre': 'Kita Midori',
+            'descripcion': 'Camarón furai, queso crema, vegetales tempura, cubierto de aguacate caramelizado',
+            'precio': 8.00,
+            'categoria': 'Rollitos',
+            'imagen': 'uploads/KitaMidori.jpeg'
+        },
+        {
+            'nombre': 'Ramen',
+            'descripcion': 'Una perfecta combinación de sabores, viene acompañado por panceta, naruto (cangrejo), cebollín, champiñones, zanahoria y huevo cocido marinado en una salsa especial',
+            'precio': 5.50,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/Ramen.jpeg'
+        },
+        {
+            'nombre': 'Sushi Dog',
+            'descripcion': 'Un rollo crocante, frito totalmente cubierto de panko y relleno de pollo especial bbq, lechuga y aguacate cubierto con una mayonesa especial y queso cheddar semipicante',
+            'precio': 6.75,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/SushiDog.jpeg'
+        },
+        {
+            'nombre': 'Infusión Maracuyá',
+            'descripcion': 'Bebida refrescante a base de maracuyá',
+            'precio': 1.50,
+            'categoria': 'Bebidas',
+            'imagen': 'uploads/InfusiónMaracuyá.jpeg'
+        }
+    ],
+    'Pollo Broaster La Brasil': [
+        {
+            'nombre': 'Papas fritas + Presa de pollo',
+            'descripcion': 'Porción de papas fritas acompañada de una presa de pollo',
+            'precio': 1.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/papas + presa.png'
+        },
+        {
+            'nombre': 'Arroz + Papas fritas + Presa de pollo',
+            'descripcion': 'Combinación de arroz, papas fritas y una presa de pollo',
+            'precio': 1.30,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/arroz + papas +presa.jpeg'
+        },
+        {
+            'nombre': 'Arroz + Papas fritas + Pechuga',
+            'descripcion': 'Combinación de arroz, papas fritas y una pechuga de pollo',
+            'precio': 1.50,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/arroz + papas + pechuga.jpeg'
+        },
+        {
+            'nombre': 'Papas fritas + 2 Presas de pollo',
+            'descripcion': 'Porción de papas fritas con dos presas de pollo',
+            'precio': 2.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/papas + 2 presas.jpeg'
+        },
+        {
+            'nombre': 'Choripapa',
+            'descripcion': 'Papas fritas con chorizo',
+            'precio': 1.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/choripapa.jpeg'
+        },
+        {
+            'nombre': 'Salchipapa',
+            'descripcion': 'Papas fritas con salchicha',
+            'precio': 0.70,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/salchipapa.jpeg'
+        }
+    ],
+    'Kroky': [
+        {
+            'nombre': '1/2 Porción: 1 Presa + Papas',
+            'descripcion': 'Media porción con una presa de pollo y papas fritas',
+            'precio': 2.35,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/1-2Porción1Presa+Papas.jpeg'
+        },
+        {
+            'nombre': '1 Porción: 2 Presas + Papas',
+            'descripcion': 'Porción completa con dos presas de pollo y papas fritas',
+            'precio': 3.90,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/1Porción2 Presas+Papas.jpeg'
+        },
+        {
+            'nombre': '1/2 Pollo: 4 Presas + Papas',
+            'descripcion': 'Media pollo con cuatro presas y papas fritas',
+            'precio': 8.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/1-2Pollo4Presas+Papas.jpeg'
+        },
+        {
+            'nombre': '1 Pollo: 8 Presas + Papas',
+            'descripcion': 'Pollo entero con ocho presas y papas fritas',
+            'precio': 15.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/1Pollo8Presas+Papas.jpeg'
+        },
+        {
+            'nombre': 'Hamburguesa',
+            'descripcion': 'Hamburguesa clásica',
+            'precio': 2.50,
+            'categoria': 'Comidas Rápidas',
+            'imagen': 'uploads/Hamburguesa.jpeg'
+        },
+        {
+            'nombre': 'Salchipapa',
+            'descripcion': 'Papas fritas con salchicha',
+            'precio': 2.00,
+            'categoria': 'Comidas Rápidas',
+            'imagen': 'uploads/Salchipapa.jpeg'
+        }
+    ],
+    "Q'Riko!": [
+        {
+            'nombre': 'Chaufa de Pollo',
+            'descripcion': 'Arroz frito con pollo, verduras y salsa de soja',
+            'precio': 2.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/chaufa pollo.jpeg'
+        },
+        {
+            'nombre': 'Chaufa de Carne',
+            'descripcion': 'Arroz frito con carne, verduras y salsa de soja',
+            'precio': 2.20,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/chaulafan de carne.jpeg'
+        },
+        {
+            'nombre': 'Chaufa Mixto',
+            'descripcion': 'Arroz frito con pollo, carne, verduras y salsa de soja',
+            'precio': 2.50,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/chaulafan de mixto.jpeg'
+        },
+        {
+            'nombre': 'Pollo Chi jau kai',
+            'descripcion': 'Pollo apanado con salsa agridulce y verduras',
+            'precio': 2.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/pollo chi.jpeg'
+        },
+        {
+            'nombre': 'Tallarín Saltado de Pollo',
+            'descripcion': 'Tallarines salteados con pollo y verduras',
+            'precio': 2.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/tallarin salteado de pollo.jpeg'
+        },
+        {
+            'nombre': 'Tallarín Saltado Mixto',
+            'descripcion': 'Tallarines salteados con pollo, carne y verduras',
+            'precio': 2.50,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/tallarin salteado mixto.jpeg'
+        }
+    ],
+    "FORTUNA'Z": [
+        {
+            'nombre': 'Chaufa de Pollo',
+            'descripcion': 'Arroz frito con pollo, verduras y salsa de soja',
+            'precio': 2.50,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/chaufa pollo 2.jpeg'
+        },
+        {
+            'nombre': 'Taypa Especial',
+            'descripcion': 'Combinación de carnes y verduras salteadas en salsa especial',
+            'precio': 8.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/taypa.jpeg'
+        },
+        {
+            'nombre': 'Pollo Tipakay',
+            'descripcion': 'Pollo apanado con salsa agridulce y acompañamiento',
+            'precio': 2.50,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/tipakay.jpeg'
+        },
+        {
+            'nombre': 'Aeropuerto Especial',
+            'descripcion': 'Arroz chaufa con tallarines, pollo, carne y verduras',
+            'precio': 4.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/aeropuerto especial.jpeg'
+        }
+    ],
+    'Casa China Restaurante': [
+        {
+            'nombre': 'Chaufa de Pollo',
+            'descripcion': 'Arroz frito con pollo, verduras y salsa de soja',
+            'precio': 2.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/chaulafan de pollo.jpeg'
+        },
+        {
+            'nombre': 'Pollo Chi Jau Kai',
+            'descripcion': 'Pollo apanado con salsa agridulce y verduras',
+            'precio': 2.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/pollo chi2.jpeg'
+        },
+        {
+            'nombre': 'Chaufa de Pollo',
+            'descripcion': 'Arroz frito con pollo, verduras y salsa de soja',
+            'precio': 2.50,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/chaufa pollo.jpeg'
+        },
+        {
+            'nombre': 'Taypa Especial',
+            'descripcion': 'Combinación de carnes y verduras salteadas en salsa especial',
+            'precio': 8.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/taypa.jpeg'
+        },
+        {
+            'nombre': 'Pollo Tipakay',
+            'descripcion': 'Pollo apanado con salsa agridulce y acompañamiento',
+            'precio': 2.50,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/tipakay.jpeg'
+        },
+        {
+            'nombre': 'Aeropuerto Especial',
+            'descripcion': 'Arroz chaufa con tallarines, pollo, carne y verduras',
+            'precio': 4.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/aeropuerto especial.jpeg'
+        }
+    ],
+    'Alitas y algo más': [
+        {
+            'nombre': 'Alitas BBQ (6 unidades)',
+            'descripcion': 'Alitas de pollo con salsa BBQ, acompañadas de papas fritas',
+            'precio': 4.50,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/Alitas BBQ (6 unidades).jpeg'
+        },
+        {
+            'nombre': 'Alitas Picantes (6 unidades)',
+            'descripcion': 'Alitas de pollo con salsa picante, acompañadas de papas fritas',
+            'precio': 4.50,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/Alitas Picantes (6 unidades).jpeg'
+        },
+        {
+            'nombre': 'Hamburguesa Clásica',
+            'descripcion': 'Hamburguesa con carne, lechuga, tomate y salsa especial',
+            'precio': 3.00,
+            'categoria': 'Comidas Rápidas',
+            'imagen': 'uploads/Hamburguesa Clásica.jpeg'
+        },
+        {
+            'nombre': 'Salchipapa Grande',
+            'descripcion': 'Papas fritas con salchicha y salsas',
+            'precio': 2.50,
+            'categoria': 'Comidas Rápidas',
+            'imagen': 'uploads/Salchipapa Grande.jpeg'
+        },
+        {
+            'nombre': 'Combo Familiar (12 alitas)',
+            'descripcion': '12 alitas (mezcla de BBQ y picantes) con papas fritas grandes',
+            'precio': 8.00,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/Combo Familiar (12 alitas).jpeg'
+        },
+        {
+            'nombre': 'Nuggets de Pollo (8 unidades)',
+            'descripcion': 'Nuggets de pollo crujientes con salsa a elección',
+            'precio': 3.50,
+            'categoria': 'Platos Fuertes',
+            'imagen': 'uploads/Nuggets de Pollo (8 unidades).jpeg'
+        }
+    ],
+    'Chervo Pizza': [
+        {
+            'nombre': 'Pizza Hawaiana (Mediana)',
+            'descripcion': 'Pizza con jamón, piña, queso mozzarella y salsa de tomate',
+            'precio': 6.00,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/Pizza Hawaiana (Mediana).jpeg'
+        },
+        {
+            'nombre': 'Pizza Pepperoni (Mediana)',
+            'descripcion': 'Pizza con pepperoni, queso mozzarella y salsa de tomate',
+            'precio': 6.50,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/pizza peperoni.jpeg'
+        },
+        {
+            'nombre': 'Pizza Vegetariana (Mediana)',
+            'descripcion': 'Pizza con vegetales frescos, queso mozzarella y salsa de tomate',
+            'precio': 5.50,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/pizza vegetariana.jpeg'
+        },
+        {
+            'nombre': 'Pizza Suprema (Grande)',
+            'descripcion': 'Pizza con pepperoni, jamón, champiñones, pimientos y queso',
+            'precio': 9.00,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/Pizza Suprema (Grande).jpeg'
+        },
+        {
+            'nombre': 'Pizza Cuatro Quesos (Mediana)',
+            'descripcion': 'Pizza con mozzarella, cheddar, parmesano y gorgonzola',
+            'precio': 7.00,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/Pizza Cuatro Quesos (Mediana).jpeg'
+        },
+        {
+            'nombre': 'Pizza Margarita (Pequeña)',
+            'descripcion': 'Pizza clásica con tomate, mozzarella y albahaca',
+            'precio': 4.00,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/Pizza Margarita (Pequeña).jpeg'
+        }
+    ],
+    'Pizzeria LUWAK': [
+        {
+            'nombre': 'Pizza Clásica de Jamón (Mediana)',
+            'descripcion': 'Pizza con jamón, queso mozzarella y salsa de tomate',
+            'precio': 5.50,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/pizza jamon.jpeg'
+        },
+        {
+            'nombre': 'Pizza de Pepperoni (Mediana)',
+            'descripcion': 'Pizza con pepperoni, queso mozzarella y salsa de tomate',
+            'precio': 6.00,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/pizza peperoni.jpeg'
+        },
+        {
+            'nombre': 'Pizza Vegetariana (Grande)',
+            'descripcion': 'Pizza con vegetales frescos, queso y salsa de tomate',
+            'precio': 8.00,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/pizza vegetariana.jpeg'
+        },
+        {
+            'nombre': 'Pizza de Pollo BBQ (Mediana)',
+            'descripcion': 'Pizza con pollo, salsa BBQ, queso y cebolla',
+            'precio': 6.50,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/pizza bbq.jpeg'
+        },
+        {
+            'nombre': 'Pizza de Champiñones (Pequeña)',
+            'descripcion': 'Pizza con champiñones, queso mozzarella y salsa de tomate',
+            'precio': 4.50,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/pizza champiñones.jpeg'
+        },
+        {
+            'nombre': 'Pizza Mixta (Grande)',
+            'descripcion': 'Pizza con jamón, pepperoni, vegetales y queso',
+            'precio': 9.50,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/pizza mixta.jpeg'
+        }
+    ],
+    'Pizza Express': [
+        {
+            'nombre': 'Pizza de Jamón y Queso (Mediana)',
+            'descripcion': 'Pizza con jamón, queso mozzarella y salsa de tomate',
+            'precio': 5.00,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/pizza jamon.jpeg'
+        },
+        {
+            'nombre': 'Pizza de Pepperoni (Grande)',
+            'descripcion': 'Pizza con pepperoni, queso mozzarella y salsa de tomate',
+            'precio': 8.50,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/pizza peperoni.jpeg'
+        },
+        {
+            'nombre': 'Pizza Hawaiana (Pequeña)',
+            'descripcion': 'Pizza con jamón, piña, queso y salsa de tomate',
+            'precio': 4.00,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/Pizza Hawaiana (Pequeña).jpeg'
+        },
+        {
+            'nombre': 'Pizza de Pollo y Champiñones (Mediana)',
+            'descripcion': 'Pizza con pollo, champiñones, queso y salsa de tomate',
+            'precio': 6.50,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/Pizza de Pollo y Champiñones (Mediana).jpeg'
+        },
+        {
+            'nombre': 'Pizza Cuatro Estaciones (Grande)',
+            'descripcion': 'Pizza con jamón, champiñones, alcachofas y aceitunas',
+            'precio': 9.00,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/Pizza Cuatro Estaciones (Grande).jpeg'
+        },
+        {
+            'nombre': 'Pizza Margarita (Mediana)',
+            'descripcion': 'Pizza clásica con tomate, mozzarella y albahaca',
+            'precio': 5.00,
+            'categoria': 'Pizzas',
+            'imagen': 'uploads/Pizza Margarita (Mediana).jpeg'
+        }
+    ]
+}
+
+# === ADMINISTRADOR POR DEFECTO ===
+ADMINISTRADOR = {
+    'nombre': 'Administrador',
+    'email': 'admin@admin.saboresexpress.com',
+    'password': 'admin123'
+}
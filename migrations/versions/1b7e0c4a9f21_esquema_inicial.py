@@ -0,0 +1,109 @@
+"""Esquema inicial
+
+Las tablas que la aplicación creaba con db.create_all() antes de usar migraciones.
+En una base que ya las tiene no se toca nada: cada tabla solo se crea si falta, así
+una instalación existente y una vacía llegan al mismo punto con `flask db upgrade`.
+
+Revision ID: 1b7e0c4a9f21
+Revises:
+Create Date: 2026-10-18 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b7e0c4a9f21'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+TABLAS = {
+    'usuarios': lambda: [
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('nombre', sa.String(100), nullable=False),
+        sa.Column('email', sa.String(100), nullable=False, unique=True),
+        sa.Column('password', sa.String(100)),
+    ],
+    'restaurantes': lambda: [
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('nombre', sa.String(100), nullable=False),
+        sa.Column('descripcion', sa.Text()),
+        sa.Column('categoria', sa.String(100), nullable=False),
+        sa.Column('imagen', sa.String(255)),
+    ],
+    'menus': lambda: [
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('restaurante_id', sa.Integer(), sa.ForeignKey('restaurantes.id')),
+        sa.Column('nombre', sa.String(100), nullable=False),
+        sa.Column('descripcion', sa.Text()),
+        sa.Column('precio', sa.Float(), nullable=False),
+        sa.Column('categoria', sa.String(100), nullable=False),
+        sa.Column('imagen', sa.String(255)),
+    ],
+    'pedidos': lambda: [
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('usuario_id', sa.Integer(), sa.ForeignKey('usuarios.id'), nullable=False),
+        sa.Column('restaurante_id', sa.Integer(), sa.ForeignKey('restaurantes.id'), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('metodo_pago', sa.String(50), nullable=False),
+        sa.Column('metodo_pago_detalle', sa.String(200)),
+        sa.Column('direccion_entrega', sa.String(200)),
+        sa.Column('numero_celular', sa.String(20)),
+        sa.Column('nombre_cliente', sa.String(100)),
+        sa.Column('tipo_entrega', sa.String(20), nullable=False),
+        sa.Column('hora_reserva', sa.Time()),
+        sa.Column('fecha_reserva', sa.Date()),
+        sa.Column('estado', sa.String(20)),
+        sa.Column('fecha', sa.DateTime()),
+        sa.Column('codigo_pedido', sa.String(20), nullable=False, unique=True),
+    ],
+    'pedidos_items': lambda: [
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('pedido_id', sa.Integer(), sa.ForeignKey('pedidos.id'), nullable=False),
+        sa.Column('menu_id', sa.Integer(), sa.ForeignKey('menus.id'), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.Column('precio', sa.Float(), nullable=False),
+    ],
+    'productos_agricolas': lambda: [
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('nombre', sa.String(100), nullable=False),
+        sa.Column('descripcion', sa.Text()),
+        sa.Column('precio_compra', sa.Float(), nullable=False),
+        sa.Column('precio_venta', sa.Float(), nullable=False),
+        sa.Column('stock', sa.Integer()),
+        sa.Column('imagen', sa.String(255)),
+    ],
+    'pedidos_agricolas': lambda: [
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('usuarios.id')),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('tipo_entrega', sa.String(50), nullable=False),
+        sa.Column('direccion', sa.Text()),
+        sa.Column('telefono', sa.String(20)),
+        sa.Column('hora_recogida', sa.String(10)),
+        sa.Column('fecha', sa.DateTime(), server_default=sa.func.now()),
+        sa.Column('estado', sa.String(50)),
+    ],
+    'detalles_pedido_agricola': lambda: [
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('pedido_id', sa.Integer(), sa.ForeignKey('pedidos_agricolas.id')),
+        sa.Column('producto_id', sa.Integer(), sa.ForeignKey('productos_agricolas.id')),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.Column('precio_unitario', sa.Float(), nullable=False),
+    ],
+}
+
+
+def upgrade():
+    existentes = set(sa.inspect(op.get_bind()).get_table_names())
+    for tabla, columnas in TABLAS.items():  # En orden de dependencias
+        if tabla not in existentes:
+            op.create_table(tabla, *columnas())
+
+
+def downgrade():
+    for tabla in reversed(list(TABLAS)):
+        op.drop_table(tabla)
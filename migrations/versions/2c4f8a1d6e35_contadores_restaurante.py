@@ -0,0 +1,35 @@
+"""Contadores de pedidos por restaurante
+
+contadores_restaurante guarda el total de pedidos de cada restaurante, incrementado
+en la misma transacción que el pedido, para ordenar los restaurantes populares sin
+agregar pedidos. `flask reconciliar-contadores` la rellena desde los pedidos.
+
+Revision ID: 2c4f8a1d6e35
+Revises: 1b7e0c4a9f21
+Create Date: 2026-10-18 09:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c4f8a1d6e35'
+down_revision = '1b7e0c4a9f21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('contadores_restaurante'):
+        return
+    op.create_table(
+        'contadores_restaurante',
+        sa.Column('restaurante_id', sa.Integer(), sa.ForeignKey('restaurantes.id'), primary_key=True),
+        sa.Column('total_pedidos', sa.Integer(), nullable=False)
+    )
+    op.create_index('ix_contadores_restaurante_total_pedidos', 'contadores_restaurante', ['total_pedidos'])
+
+
+def downgrade():
+    op.drop_table('contadores_restaurante')
@@ -0,0 +1,55 @@
+"""Popularidad de menús por restaurante
+
+popularidad_menus lleva, por menú, las líneas de pedido históricas y un puntaje con
+decaimiento temporal: cada venta suma 2^(días desde la época / vida media). La época
+vive en epoca_popularidad para que `flask rebasar-popularidad` pueda moverla a hoy
+reescalando los puntajes; se siembra con POPULARIDAD_EPOCA de app.py.
+
+Revision ID: 3d9a5e7b1c48
+Revises: 2c4f8a1d6e35
+Create Date: 2026-10-18 09:20:00
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d9a5e7b1c48'
+down_revision = '2c4f8a1d6e35'
+branch_labels = None
+depends_on = None
+
+
+EPOCA_INICIAL = datetime(2025, 1, 1)  # POPULARIDAD_EPOCA en app.py
+epoca_popularidad = sa.table('epoca_popularidad', sa.column('id', sa.Integer), sa.column('epoca', sa.DateTime))
+
+
+def upgrade():
+    existentes = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'popularidad_menus' not in existentes:
+        op.create_table(
+            'popularidad_menus',
+            sa.Column('menu_id', sa.Integer(), sa.ForeignKey('menus.id'), primary_key=True),
+            sa.Column('restaurante_id', sa.Integer(), sa.ForeignKey('restaurantes.id'), nullable=False),
+            sa.Column('total_pedidos', sa.Integer(), nullable=False),
+            sa.Column('puntaje', sa.Float(), nullable=False)
+        )
+        op.create_index('ix_popularidad_menus_restaurante_total', 'popularidad_menus',
+                        ['restaurante_id', 'total_pedidos'])
+        op.create_index('ix_popularidad_menus_restaurante_puntaje', 'popularidad_menus',
+                        ['restaurante_id', 'puntaje'])
+    if 'epoca_popularidad' not in existentes:
+        op.create_table(
+            'epoca_popularidad',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('epoca', sa.DateTime(), nullable=False)
+        )
+        op.bulk_insert(epoca_popularidad, [{'id': 1, 'epoca': EPOCA_INICIAL}])
+
+
+def downgrade():
+    op.drop_table('epoca_popularidad')
+    op.drop_table('popularidad_menus')
@@ -0,0 +1,55 @@
+"""Índices para las consultas frecuentes
+
+No había índices secundarios en pedidos, ítems, menús ni productos agrícolas. Una
+base creada con db.create_all() con los modelos actuales ya los trae, por eso se
+crean con IF NOT EXISTS.
+
+En Postgres se construyen con CREATE INDEX CONCURRENTLY, sin bloquear escrituras.
+
+Revision ID: 3f1c2a9d7b10
+Revises: b6e2f8c4a917
+Create Date: 2026-10-18 15:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = 'b6e2f8c4a917'
+branch_labels = None
+depends_on = None
+
+
+# (nombre, tabla, columnas, condición del índice parcial)
+INDICES = [
+    ('ix_pedidos_fecha', 'pedidos', ['fecha'], None),
+    ('ix_pedidos_restaurante_fecha', 'pedidos', ['restaurante_id', 'fecha'], None),
+    ('ix_pedidos_usuario_fecha', 'pedidos', ['usuario_id', 'fecha'], None),
+    ('ix_pedidos_items_pedido_id', 'pedidos_items', ['pedido_id'], None),
+    ('ix_pedidos_items_menu_id', 'pedidos_items', ['menu_id'], None),
+    ('ix_menus_restaurante_id', 'menus', ['restaurante_id', 'id'], None),
+    ('ix_productos_agricolas_con_stock', 'productos_agricolas', ['id'], 'stock > 0'),
+    ('ix_detalles_pedido_agricola_pedido_id', 'detalles_pedido_agricola', ['pedido_id'], None),
+    ('ix_detalles_pedido_agricola_producto_id', 'detalles_pedido_agricola', ['producto_id'], None),
+]
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    # CONCURRENTLY no puede ejecutarse dentro de una transacción
+    with op.get_context().autocommit_block():
+        for nombre, tabla, columnas, condicion in INDICES:
+            parcial = sa.text(condicion) if condicion else None
+            op.create_index(nombre, tabla, columnas, if_not_exists=True,
+                            postgresql_concurrently=postgres,
+                            postgresql_where=parcial, sqlite_where=parcial)
+
+
+def downgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for nombre, tabla, _, _ in reversed(INDICES):
+            op.drop_index(nombre, table_name=tabla, if_exists=True,
+                          postgresql_concurrently=postgres)
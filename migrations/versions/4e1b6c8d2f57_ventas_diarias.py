@@ -0,0 +1,36 @@
+"""Ventas diarias por restaurante
+
+ventas_diarias acumula pedidos e ingresos por restaurante y día en la transacción
+de cada pedido; /admin/finanzas lee de aquí en vez de agregar pedidos.
+
+Revision ID: 4e1b6c8d2f57
+Revises: 3d9a5e7b1c48
+Create Date: 2026-10-18 09:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e1b6c8d2f57'
+down_revision = '3d9a5e7b1c48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('ventas_diarias'):
+        return
+    op.create_table(
+        'ventas_diarias',
+        sa.Column('restaurante_id', sa.Integer(), sa.ForeignKey('restaurantes.id'), primary_key=True),
+        sa.Column('dia', sa.Date(), primary_key=True),
+        sa.Column('pedidos', sa.Integer(), nullable=False),
+        sa.Column('ingresos', sa.Float(), nullable=False)
+    )
+    op.create_index('ix_ventas_diarias_dia', 'ventas_diarias', ['dia'])
+
+
+def downgrade():
+    op.drop_table('ventas_diarias')
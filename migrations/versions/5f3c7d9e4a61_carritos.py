@@ -0,0 +1,49 @@
+"""Carritos de restaurante en el servidor
+
+carritos (uno por sesión) y carrito_items (una línea por menú). Las líneas se borran
+en cascada con su menú o su restaurante, así retirar un plato no choca con los
+carritos que lo tienen.
+
+Revision ID: 5f3c7d9e4a61
+Revises: 4e1b6c8d2f57
+Create Date: 2026-10-18 09:40:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f3c7d9e4a61'
+down_revision = '4e1b6c8d2f57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existentes = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'carritos' not in existentes:
+        op.create_table(
+            'carritos',
+            sa.Column('id', sa.String(32), primary_key=True),
+            sa.Column('actualizado', sa.DateTime())
+        )
+        op.create_index('ix_carritos_actualizado', 'carritos', ['actualizado'])
+    if 'carrito_items' not in existentes:
+        op.create_table(
+            'carrito_items',
+            sa.Column('carrito_id', sa.String(32), sa.ForeignKey('carritos.id'), primary_key=True),
+            sa.Column('menu_id', sa.Integer(), sa.ForeignKey('menus.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('restaurante_id', sa.Integer(), sa.ForeignKey('restaurantes.id', ondelete='CASCADE'),
+                      nullable=False),
+            sa.Column('nombre', sa.String(100), nullable=False),
+            sa.Column('precio', sa.Float(), nullable=False),
+            sa.Column('cantidad', sa.Integer(), nullable=False),
+            sa.Column('agregado', sa.DateTime())
+        )
+        op.create_index('ix_carrito_items_carrito_restaurante', 'carrito_items', ['carrito_id', 'restaurante_id'])
+
+
+def downgrade():
+    op.drop_table('carrito_items')
+    op.drop_table('carritos')
@@ -0,0 +1,45 @@
+"""Índice de búsqueda del catálogo
+
+indice_busqueda guarda un documento normalizado (minúsculas, sin acentos) por
+restaurante y por menú. En Postgres el texto se indexa con trigramas (pg_trgm);
+`flask indexar-busqueda` lo llena desde el catálogo.
+
+Revision ID: 6a8d2e4f7b13
+Revises: 5f3c7d9e4a61
+Create Date: 2026-10-18 09:50:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a8d2e4f7b13'
+down_revision = '5f3c7d9e4a61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table('indice_busqueda'):
+        return
+    if bind.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_table(
+        'indice_busqueda',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('tipo', sa.String(20), nullable=False),
+        sa.Column('ref_id', sa.Integer(), nullable=False),
+        sa.Column('restaurante_id', sa.Integer()),
+        sa.Column('nombre', sa.String(200), nullable=False),
+        sa.Column('texto', sa.Text(), nullable=False),
+        sa.UniqueConstraint('tipo', 'ref_id', name='uq_indice_busqueda_tipo_ref')
+    )
+    op.create_index('ix_indice_busqueda_restaurante_id', 'indice_busqueda', ['restaurante_id'])
+    op.create_index('ix_indice_busqueda_texto_trgm', 'indice_busqueda', ['texto'],
+                    postgresql_using='gin', postgresql_ops={'texto': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_table('indice_busqueda')
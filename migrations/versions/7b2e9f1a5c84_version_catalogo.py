@@ -0,0 +1,34 @@
+"""Versiones del catálogo
+
+version_catalogo tiene una fila por dominio del catálogo (CATALOGO_DOMINIOS en
+app.py). Cada escritura incrementa su versión y los workers invalidan su caché
+local al verla cambiar. Las filas se crean al primer incremento.
+
+Revision ID: 7b2e9f1a5c84
+Revises: 6a8d2e4f7b13
+Create Date: 2026-10-18 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2e9f1a5c84'
+down_revision = '6a8d2e4f7b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('version_catalogo'):
+        return
+    op.create_table(
+        'version_catalogo',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('version', sa.Integer(), nullable=False)
+    )
+
+
+def downgrade():
+    op.drop_table('version_catalogo')
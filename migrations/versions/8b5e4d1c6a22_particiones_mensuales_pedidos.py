@@ -0,0 +1,196 @@
+"""Particiones mensuales de pedidos y pedidos_items
+
+pedidos pasa a estar particionada por rango mensual de `fecha` y pedidos_items la
+sigue con una copia de esa fecha (clave foránea compuesta (pedido_id, fecha)). Las
+consultas con rango de fechas solo leen los meses que cubren, los meses cerrados
+se congelan una vez y los antiguos se archivan con `flask archivar-pedidos`.
+
+Postgres no admite claves primarias ni únicas sin la clave de partición, así que
+la PK queda (id, fecha) y la restricción única de pedidos es (codigo_pedido, fecha).
+La unicidad global del código pasa a codigos_pedido, una tabla sin particionar con
+un código por fila.
+
+Los pedidos sin fecha reciben la más antigua conocida: no alteran los periodos
+recientes y se archivan primero.
+
+En otras bases no hay particiones: se agrega y rellena pedidos_items.fecha y pedidos
+queda con las mismas restricciones que en Postgres.
+
+Revision ID: 8b5e4d1c6a22
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 17:05:00
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b5e4d1c6a22'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+MESES_ADELANTO = 3  # Igual que PARTICIONES_ADELANTO en app.py
+# Nombre de la restricción única de codigo_pedido en SQLite, donde no tiene nombre
+CONVENCION = {'uq': '%(table_name)s_%(column_0_name)s_key'}
+
+
+def siguiente_mes(dia):
+    return date(dia.year + 1, 1, 1) if dia.month == 12 else date(dia.year, dia.month + 1, 1)
+
+
+def columnas(tabla):
+    return [c['name'] for c in sa.inspect(op.get_bind()).get_columns(tabla)]
+
+
+def apartar(tabla):
+    """Renombra `tabla`, sus índices y su secuencia queda libre para la tabla nueva."""
+    op.execute(f'ALTER TABLE {tabla} RENAME TO {tabla}_antigua')
+    op.execute(f"""
+        DO $$
+        DECLARE indice text;
+        BEGIN
+            FOR indice IN SELECT indexname FROM pg_indexes WHERE tablename = '{tabla}_antigua' LOOP
+                EXECUTE format('ALTER INDEX %I RENAME TO %I', indice, indice || '_antigua');
+            END LOOP;
+        END $$
+    """)
+    op.execute(f"ALTER SEQUENCE {tabla}_id_seq OWNED BY NONE")
+
+
+def crear_particiones(tabla, desde, hasta):
+    op.execute(f'CREATE TABLE {tabla}_default PARTITION OF {tabla} DEFAULT')
+    mes = desde
+    while mes < hasta:
+        fin = siguiente_mes(mes)
+        op.execute(f"CREATE TABLE {tabla}_{mes:%Y_%m} PARTITION OF {tabla} "
+                   f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{fin.isoformat()}')")
+        mes = fin
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table('codigos_pedido'):
+        op.create_table('codigos_pedido', sa.Column('codigo', sa.String(20), primary_key=True))
+        op.execute('INSERT INTO codigos_pedido (codigo) SELECT codigo_pedido FROM pedidos')
+    op.execute('UPDATE pedidos SET fecha = (SELECT coalesce(min(fecha), CURRENT_TIMESTAMP) FROM pedidos) '
+               'WHERE fecha IS NULL')
+    if 'fecha' not in columnas('pedidos_items'):
+        op.add_column('pedidos_items', sa.Column('fecha', sa.DateTime(), nullable=True))
+
+    if bind.dialect.name != 'postgresql':
+        op.execute('UPDATE pedidos_items SET fecha = '
+                   '(SELECT fecha FROM pedidos WHERE pedidos.id = pedidos_items.pedido_id)')
+        with op.batch_alter_table('pedidos_items') as tabla:
+            tabla.alter_column('fecha', existing_type=sa.DateTime(), nullable=False)
+        with op.batch_alter_table('pedidos', naming_convention=CONVENCION) as tabla:
+            tabla.alter_column('fecha', existing_type=sa.DateTime(), nullable=False)
+            tabla.drop_constraint('pedidos_codigo_pedido_key', type_='unique')
+            tabla.create_unique_constraint('pedidos_codigo_pedido_key', ['codigo_pedido', 'fecha'])
+        return
+
+    columnas_pedidos = columnas('pedidos')
+    columnas_items = [c for c in columnas('pedidos_items') if c != 'fecha']
+    apartar('pedidos_items')
+    apartar('pedidos')
+
+    # --- Tablas particionadas (mismas columnas y valores por defecto) ---
+    op.execute('CREATE TABLE pedidos (LIKE pedidos_antigua INCLUDING DEFAULTS) PARTITION BY RANGE (fecha)')
+    op.execute('ALTER TABLE pedidos ALTER COLUMN fecha SET NOT NULL')
+    op.execute('ALTER TABLE pedidos ADD CONSTRAINT pedidos_pkey PRIMARY KEY (id, fecha)')
+    op.execute('ALTER TABLE pedidos ADD CONSTRAINT pedidos_codigo_pedido_key UNIQUE (codigo_pedido, fecha)')
+    op.execute('ALTER TABLE pedidos ADD FOREIGN KEY (usuario_id) REFERENCES usuarios (id)')
+    op.execute('ALTER TABLE pedidos ADD FOREIGN KEY (restaurante_id) REFERENCES restaurantes (id)')
+    op.execute('CREATE INDEX ix_pedidos_fecha ON pedidos (fecha)')
+    op.execute('CREATE INDEX ix_pedidos_restaurante_fecha ON pedidos (restaurante_id, fecha)')
+    op.execute('CREATE INDEX ix_pedidos_usuario_fecha ON pedidos (usuario_id, fecha)')
+
+    op.execute('CREATE TABLE pedidos_items (LIKE pedidos_items_antigua INCLUDING DEFAULTS) '
+               'PARTITION BY RANGE (fecha)')
+    op.execute('ALTER TABLE pedidos_items ALTER COLUMN fecha SET NOT NULL')
+    op.execute('ALTER TABLE pedidos_items ADD CONSTRAINT pedidos_items_pkey PRIMARY KEY (id, fecha)')
+    op.execute('ALTER TABLE pedidos_items ADD FOREIGN KEY (pedido_id, fecha) REFERENCES pedidos (id, fecha)')
+    op.execute('ALTER TABLE pedidos_items ADD FOREIGN KEY (menu_id) REFERENCES menus (id)')
+    op.execute('CREATE INDEX ix_pedidos_items_pedido_id ON pedidos_items (pedido_id)')
+    op.execute('CREATE INDEX ix_pedidos_items_menu_id ON pedidos_items (menu_id)')
+
+    # --- Un mes por partición, desde el primer pedido hasta MESES_ADELANTO por delante ---
+    primero = bind.execute(sa.text('SELECT min(fecha) FROM pedidos_antigua')).scalar() or date.today()
+    desde = date(primero.year, primero.month, 1)
+    hasta = date.today().replace(day=1)
+    for _ in range(MESES_ADELANTO + 1):
+        hasta = siguiente_mes(hasta)
+    for tabla in ('pedidos', 'pedidos_items'):
+        crear_particiones(tabla, desde, hasta)
+
+    # --- Datos, secuencias y limpieza ---
+    lista = ', '.join(columnas_pedidos)
+    op.execute(f'INSERT INTO pedidos ({lista}) SELECT {lista} FROM pedidos_antigua')
+    lista = ', '.join(columnas_items)
+    op.execute(f'INSERT INTO pedidos_items ({lista}, fecha) '
+               f'SELECT {", ".join("i." + c for c in columnas_items)}, p.fecha '
+               f'FROM pedidos_items_antigua i JOIN pedidos_antigua p ON p.id = i.pedido_id')
+    op.execute('ALTER SEQUENCE pedidos_id_seq OWNED BY pedidos.id')
+    op.execute('ALTER SEQUENCE pedidos_items_id_seq OWNED BY pedidos_items.id')
+    op.execute('DROP TABLE pedidos_items_antigua')
+    op.execute('DROP TABLE pedidos_antigua')
+    op.execute('ANALYZE pedidos')
+    op.execute('ANALYZE pedidos_items')
+
+
+def downgrade():
+    bind = op.get_bind()
+    op.drop_table('codigos_pedido')
+    if bind.dialect.name != 'postgresql':
+        with op.batch_alter_table('pedidos', naming_convention=CONVENCION) as tabla:
+            tabla.drop_constraint('pedidos_codigo_pedido_key', type_='unique')
+            tabla.create_unique_constraint('pedidos_codigo_pedido_key', ['codigo_pedido'])
+            tabla.alter_column('fecha', existing_type=sa.DateTime(), nullable=True)
+        with op.batch_alter_table('pedidos_items') as tabla:
+            tabla.drop_column('fecha')
+        return
+
+    columnas_pedidos = columnas('pedidos')
+    columnas_items = columnas('pedidos_items')
+    for tabla in ('pedidos_items', 'pedidos'):
+        op.execute(f'ALTER TABLE {tabla} RENAME TO {tabla}_particionada')
+        op.execute(f"""
+            DO $$
+            DECLARE indice text;
+            BEGIN
+                FOR indice IN SELECT c.relname FROM pg_index i
+                              JOIN pg_class c ON c.oid = i.indexrelid
+                              WHERE i.indrelid = '{tabla}_particionada'::regclass LOOP
+                    EXECUTE format('ALTER INDEX %I RENAME TO %I', indice, indice || '_particionada');
+                END LOOP;
+            END $$
+        """)
+        op.execute(f'ALTER SEQUENCE {tabla}_id_seq OWNED BY NONE')
+
+    op.execute('CREATE TABLE pedidos (LIKE pedidos_particionada INCLUDING DEFAULTS)')
+    op.execute('ALTER TABLE pedidos ADD PRIMARY KEY (id)')
+    op.execute('ALTER TABLE pedidos ADD UNIQUE (codigo_pedido)')
+    op.execute('ALTER TABLE pedidos ADD FOREIGN KEY (usuario_id) REFERENCES usuarios (id)')
+    op.execute('ALTER TABLE pedidos ADD FOREIGN KEY (restaurante_id) REFERENCES restaurantes (id)')
+    op.execute('CREATE INDEX ix_pedidos_fecha ON pedidos (fecha)')
+    op.execute('CREATE INDEX ix_pedidos_restaurante_fecha ON pedidos (restaurante_id, fecha)')
+    op.execute('CREATE INDEX ix_pedidos_usuario_fecha ON pedidos (usuario_id, fecha)')
+    op.execute('CREATE TABLE pedidos_items (LIKE pedidos_items_particionada INCLUDING DEFAULTS)')
+    op.execute('ALTER TABLE pedidos_items ADD PRIMARY KEY (id)')
+    op.execute('ALTER TABLE pedidos_items ADD FOREIGN KEY (pedido_id) REFERENCES pedidos (id)')
+    op.execute('ALTER TABLE pedidos_items ADD FOREIGN KEY (menu_id) REFERENCES menus (id)')
+    op.execute('CREATE INDEX ix_pedidos_items_pedido_id ON pedidos_items (pedido_id)')
+    op.execute('CREATE INDEX ix_pedidos_items_menu_id ON pedidos_items (menu_id)')
+
+    lista = ', '.join(columnas_pedidos)
+    op.execute(f'INSERT INTO pedidos ({lista}) SELECT {lista} FROM pedidos_particionada')
+    lista = ', '.join(columnas_items)
+    op.execute(f'INSERT INTO pedidos_items ({lista}) SELECT {lista} FROM pedidos_items_particionada')
+    op.execute('ALTER SEQUENCE pedidos_id_seq OWNED BY pedidos.id')
+    op.execute('ALTER SEQUENCE pedidos_items_id_seq OWNED BY pedidos_items.id')
+    op.execute('DROP TABLE pedidos_items_particionada')
+    op.execute('DROP TABLE pedidos_particionada')
@@ -0,0 +1,38 @@
+"""Reservas de stock agrícola
+
+reservas_agricolas aparta stock por carrito hasta `expira`. Las reservas se borran en
+cascada con su producto.
+
+Revision ID: 9c5f3a7e2d16
+Revises: 7b2e9f1a5c84
+Create Date: 2026-10-18 10:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c5f3a7e2d16'
+down_revision = '7b2e9f1a5c84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('reservas_agricolas'):
+        return
+    op.create_table(
+        'reservas_agricolas',
+        sa.Column('carrito_id', sa.String(32), primary_key=True),
+        sa.Column('producto_id', sa.Integer(), sa.ForeignKey('productos_agricolas.id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.Column('expira', sa.DateTime(), nullable=False)
+    )
+    op.create_index('ix_reservas_agricolas_expira', 'reservas_agricolas', ['expira'])
+    op.create_index('ix_reservas_producto_expira', 'reservas_agricolas', ['producto_id', 'expira'])
+
+
+def downgrade():
+    op.drop_table('reservas_agricolas')
@@ -0,0 +1,38 @@
+"""Claves de idempotencia de la confirmación de pedidos
+
+claves_idempotencia guarda la clave de cada formulario de confirmación y la factura
+emitida, para que un reenvío la devuelva en vez de crear otro pedido.
+
+Revision ID: a1d7e3b9f452
+Revises: 9c5f3a7e2d16
+Create Date: 2026-10-18 10:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1d7e3b9f452'
+down_revision = '9c5f3a7e2d16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('claves_idempotencia'):
+        return
+    op.create_table(
+        'claves_idempotencia',
+        sa.Column('clave', sa.String(64), primary_key=True),
+        sa.Column('tipo', sa.String(20), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), sa.ForeignKey('usuarios.id')),
+        sa.Column('pedido_id', sa.Integer()),
+        sa.Column('respuesta', sa.Text()),
+        sa.Column('creada', sa.DateTime())
+    )
+    op.create_index('ix_claves_idempotencia_creada', 'claves_idempotencia', ['creada'])
+
+
+def downgrade():
+    op.drop_table('claves_idempotencia')
@@ -0,0 +1,37 @@
+"""Variantes de imágenes
+
+imagenes registra cada variante generada (miniaturas JPEG y WebP) de una imagen
+subida, con su tamaño, para armar srcset sin leer los archivos.
+
+Revision ID: b6e2f8c4a917
+Revises: a1d7e3b9f452
+Create Date: 2026-10-18 10:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e2f8c4a917'
+down_revision = 'a1d7e3b9f452'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('imagenes'):
+        return
+    op.create_table(
+        'imagenes',
+        sa.Column('ruta', sa.String(255), primary_key=True),
+        sa.Column('original', sa.String(255), nullable=False),
+        sa.Column('formato', sa.String(10), nullable=False),
+        sa.Column('ancho', sa.Integer(), nullable=False),
+        sa.Column('alto', sa.Integer(), nullable=False)
+    )
+    op.create_index('ix_imagenes_original', 'imagenes', ['original'])
+
+
+def downgrade():
+    op.drop_table('imagenes')
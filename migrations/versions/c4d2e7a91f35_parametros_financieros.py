@@ -0,0 +1,39 @@
+"""Parámetros financieros por restaurante
+
+Proporciones del balance de /admin/finanzas (costo, activo corriente y pasivo
+corriente). Un restaurante sin fila usa las de PARAMETROS_FINANCIEROS_DEFECTO en
+app.py, las mismas que el reporte tenía fijas.
+
+Revision ID: c4d2e7a91f35
+Revises: f6a2d8e4b9c3
+Create Date: 2026-10-18 18:40:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d2e7a91f35'
+down_revision = 'f6a2d8e4b9c3'
+branch_labels = None
+depends_on = None
+
+
+PROPORCIONES = ('proporcion_costo', 'proporcion_activo_corriente', 'proporcion_pasivo_corriente')
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('parametros_financieros'):
+        return
+    op.create_table(
+        'parametros_financieros',
+        sa.Column('restaurante_id', sa.Integer(), sa.ForeignKey('restaurantes.id'), primary_key=True),
+        *[sa.Column(columna, sa.Float(), nullable=False) for columna in PROPORCIONES],
+        *[sa.CheckConstraint(f'{columna} BETWEEN 0 AND 1', name=f'ck_parametros_financieros_{columna}')
+          for columna in PROPORCIONES]
+    )
+
+
+def downgrade():
+    op.drop_table('parametros_financieros')
@@ -0,0 +1,39 @@
+"""Columna `archivados` en los contadores
+
+`flask archivar-pedidos` borra las particiones viejas de pedidos, y
+`reconciliar-contadores` recalculaba los contadores solo con lo que quedaba en línea.
+La nueva columna guarda cuánto de cada contador corresponde a meses ya archivados.
+Las tablas creadas con db.create_all() con los modelos actuales ya la traen.
+
+Revision ID: f6a2d8e4b9c3
+Revises: 8b5e4d1c6a22
+Create Date: 2026-10-19 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6a2d8e4b9c3'
+down_revision = '8b5e4d1c6a22'
+branch_labels = None
+depends_on = None
+
+
+TABLAS = ('contadores_restaurante', 'popularidad_menus')
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for tabla in TABLAS:
+        if 'archivados' in [c['name'] for c in inspector.get_columns(tabla)]:
+            continue
+        with op.batch_alter_table(tabla) as t:
+            t.add_column(sa.Column('archivados', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    for tabla in TABLAS:
+        with op.batch_alter_table(tabla) as t:
+            t.drop_column('archivados')
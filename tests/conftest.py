@@ -0,0 +1,37 @@
+import os
+
+import flask_migrate
+import pytest
+
+from app import create_app, db, Menu, Restaurante, Usuario
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """Aplicación sobre una base desechable con el esquema de las migraciones.
+
+    Por defecto un archivo SQLite temporal; TEST_DATABASE_URL permite usar, por ejemplo,
+    una base PostgreSQL vacía. Al terminar se revierten todas las migraciones.
+    """
+    url = os.environ.get('TEST_DATABASE_URL') or f"sqlite:///{tmp_path_factory.mktemp('bd') / 'pruebas.db'}"
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'TESTING': True, 'MIGRACIONES': True})
+    with app.app_context():
+        flask_migrate.upgrade()
+        restaurante = Restaurante(nombre='Prueba', categoria='Pruebas')
+        db.session.add(restaurante)
+        db.session.flush()
+        db.session.add_all(Menu(restaurante_id=restaurante.id, nombre=f'Plato {i}', precio=10.0 + i,
+                                categoria='Pruebas') for i in range(20))
+        db.session.add(Usuario(nombre='Prueba', email='prueba@local', password='x'))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        flask_migrate.downgrade(revision='base')
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+        db.session.rollback()
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app import db, DetallePedidoAgricola, ProductoAgricola
+
+STOCK = 20
+COMPRAS = 60
+HILOS = 8
+
+
+def test_checkouts_concurrentes_sin_sobreventa(app):
+    """Más compras que stock a la vez por /agricola/confirmar: ninguna vende de más."""
+    with app.app_context():
+        producto = ProductoAgricola(nombre='Concurrencia', precio_compra=1.0, precio_venta=1.0, stock=STOCK)
+        db.session.add(producto)
+        db.session.commit()
+        producto_id = producto.id
+    linea = {'id': producto_id, 'nombre': 'Concurrencia', 'precio_venta': 1.0, 'cantidad': 1, 'subtotal': 1.0}
+
+    clientes = []
+    for _ in range(COMPRAS):
+        cliente = app.test_client()
+        with cliente.session_transaction() as sesion:
+            sesion['guest'] = True
+            sesion['carrito_agricola'] = [dict(linea)]
+        clientes.append(cliente)
+
+    def comprar(cliente):
+        respuesta = cliente.post('/agricola/confirmar', data={'tipo_entrega': 'retiro'})
+        with cliente.session_transaction() as sesion:
+            return respuesta.status_code, 'carrito_agricola' not in sesion  # Se vacía solo al confirmar
+
+    with ThreadPoolExecutor(max_workers=HILOS) as ejecutor:
+        resultados = list(ejecutor.map(comprar, clientes))
+
+    assert all(estado < 500 for estado, _ in resultados)
+    vendidas = sum(1 for _, exito in resultados if exito)
+    with app.app_context():
+        final = db.session.get(ProductoAgricola, producto_id).stock
+        en_pedidos = db.session.query(db.func.sum(DetallePedidoAgricola.cantidad))\
+            .filter(DetallePedidoAgricola.producto_id == producto_id).scalar()
+    assert vendidas == STOCK
+    assert final == 0
+    assert en_pedidos == STOCK
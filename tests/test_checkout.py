@@ -0,0 +1,62 @@
+import uuid
+
+import pytest
+
+import app as modulo
+from app import db, Carrito, CarritoItem, CodigoPedido, Menu, Pedido, Usuario, registrar_pedido
+
+# Consultas de registrar_pedido con cualquier número de líneas: precios del menú, códigos,
+# pedidos, líneas, época de popularidad, tres contadores y vaciado del carrito
+CONSULTAS_CHECKOUT = 9
+
+
+def checkout(lineas):
+    """registrar_pedido de un carrito con `lineas` menús; devuelve (pedido, consultas)."""
+    menus = Menu.query.order_by(Menu.id).limit(lineas).all()
+    usuario = Usuario.query.first()
+    carrito = Carrito(id=uuid.uuid4().hex)
+    db.session.add(carrito)
+    db.session.add_all(CarritoItem(carrito_id=carrito.id, menu_id=m.id, restaurante_id=m.restaurante_id,
+                                   nombre=m.nombre, precio=m.precio, cantidad=2) for m in menus)
+    db.session.flush()
+    items = carrito.items_de(menus[0].restaurante_id)
+
+    consultas = []
+    def contar(*args):
+        consultas.append(1)
+    motor = db.session.get_bind()
+    db.event.listen(motor, 'before_cursor_execute', contar)
+    try:
+        pedido, _, errores = registrar_pedido(carrito, menus[0].restaurante_id, items, {
+            'usuario_id': usuario.id, 'metodo_pago': 'efectivo', 'tipo_entrega': 'domicilio'
+        })
+        db.session.flush()
+    finally:
+        db.event.remove(motor, 'before_cursor_execute', contar)
+    assert not errores
+    return pedido, len(consultas)
+
+
+def test_consultas_constantes(ctx):
+    conteos = {lineas: checkout(lineas)[1] for lineas in (1, 5, 20)}
+    assert set(conteos.values()) == {CONSULTAS_CHECKOUT}, conteos
+
+
+def test_codigo_repetido_se_reintenta(ctx, monkeypatch):
+    previo, _ = checkout(1)
+    codigos = iter([previo.codigo_pedido, 'NUEVO001'])
+    monkeypatch.setattr(modulo, 'generar_codigo_pedido', lambda: next(codigos))
+
+    pedido, _ = checkout(1)
+
+    assert pedido.codigo_pedido == 'NUEVO001'
+    assert Pedido.query.filter_by(codigo_pedido=previo.codigo_pedido).count() == 1
+    assert db.session.get(CodigoPedido, 'NUEVO001')
+
+
+def test_sin_codigos_libres(ctx, monkeypatch):
+    previo, _ = checkout(1)
+    monkeypatch.setattr(modulo, 'generar_codigo_pedido', lambda: previo.codigo_pedido)
+
+    with pytest.raises(RuntimeError):
+        checkout(1)
@@ -0,0 +1,10 @@
+import pytest
+
+from app import db, consultas_frecuentes, recorridos_secuenciales
+
+
+@pytest.mark.parametrize('nombre, consulta', consultas_frecuentes(), ids=[n for n, _ in consultas_frecuentes()])
+def test_consulta_frecuente_usa_indice(ctx, nombre, consulta):
+    tablas, _ = recorridos_secuenciales(consulta)
+    db.session.rollback()
+    assert not tablas, f'{nombre}: recorre completa {", ".join(sorted(tablas))}'